@@ -0,0 +1,259 @@
+"""
+End to end benchmark of ReportDownloader.run() against the local mock of the analytics pages (tests/mock_site.py).
+
+Times the browser startup, the login and every date range for 1, 12 and 36 month periods, and samples the memory of
+the browser processes. Results can be appended to a history file and compared with the previous run of the same
+settings, to catch regressions before a release (exit status 1 when a metric got slower or bigger than the tolerance).
+
+    $ python benchmarks/bench_downloader.py --pacing none --record benchmarks/history.jsonl --compare
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tests.mock_site import MockAnalyticsSite, mock_downloader_class  # noqa: E402
+from twitter_analytics.instrumentation import Instrumentation  # noqa: E402
+from twitter_analytics.pacing import Pacer, get_pacer  # noqa: E402
+
+
+# Fixed calendar so the month navigation, hence the timings, do not drift with the real date.
+TODAY = date(2020, 1, 15)
+PERIOD_END = date(2019, 12, 31)
+
+# Metrics compared between runs: (key, minimal absolute increase counted as a regression)
+COMPARED_METRICS = (('seconds', 0.5), ('browser_start', 0.2), ('per_range_mean', 0.1), ('per_range_max', 0.2),
+                    ('round_trips_per_range', 2.0), ('browser_rss_mb', 10.0))
+
+
+def period(months):
+    """
+    :return: (from_date, to_date) of the `months` full months ending with PERIOD_END.
+    """
+    first = PERIOD_END.year * 12 + PERIOD_END.month - months
+    from_date = date(first // 12, first % 12 + 1, 1)
+    return from_date.strftime('%m/%d/%Y'), PERIOD_END.strftime('%m/%d/%Y')
+
+
+def make_pacer(name, skip_sleeps):
+    """
+    :param name: 'none' for no pause at all, or a pacing profile ('fast', 'human').
+    :param skip_sleeps: Keep the pauses decided by the profile in the counters, without sleeping them.
+    """
+    pacer = Pacer(jitter=(0, 0), small_jitter=(0, 0)) if name == 'none' else get_pacer(name)
+    if skip_sleeps:
+        pacer.sleep = lambda seconds: None
+    return pacer
+
+
+def process_tree_rss(pid):
+    """
+    :return: Resident memory in MB of the process and all its descendants (Linux only), or None.
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    children = dict()
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(entry)) as stat_file:
+                parent = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open('/proc/{}/status'.format(current)) as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024.0
+
+
+class MemorySampler(object):
+
+    """
+    Instrumentation hook sampling the memory of the browser processes at the end of every phase.
+    """
+
+    def __init__(self):
+        self.pid = None
+        self.peak_mb = None
+
+    def __call__(self, event):
+        if event['event'] != 'end' or self.pid is None:
+            return
+        rss = process_tree_rss(self.pid)
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+
+def run_scenario(site, months, args):
+    from_date, to_date = period(months)
+    folder = tempfile.mkdtemp(prefix='bench_downloader_')
+    metrics = Instrumentation()
+    sampler = MemorySampler()
+    metrics.add_hook(sampler)
+    try:
+        started = time.perf_counter()
+        downloader = mock_downloader_class(site)(
+            username='bench', password='bench', from_date=from_date, to_date=to_date, download_folder=folder,
+            pacing=make_pacer(args.pacing, args.skip_sleeps), calendar_strategy=args.calendar_strategy,
+            headless=not args.xvfb, lean=args.lean, instrumentation=metrics)
+        service = getattr(downloader.browser, 'service', None)
+        sampler.pid = service.process.pid if service is not None and service.process is not None else None
+        reports = downloader.run()
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    report = metrics.report()
+    per_range = dict()
+    trips_per_range = dict()
+    for phase in report['phases']:
+        if phase['phase'] in ('set_report_period', 'download_report'):
+            key = (phase.get('from_date'), phase.get('to_date'))
+            per_range[key] = per_range.get(key, 0.0) + phase['duration']
+            trips_per_range[key] = trips_per_range.get(key, 0) + phase['round_trips']
+    latencies = list(per_range.values()) or [0.0]
+    trips = list(trips_per_range.values()) or [0]
+    totals = report['totals']
+    counters = report['counters']
+    return {
+        'months': months,
+        'reports': len(reports),
+        'seconds': elapsed,
+        'browser_start': totals.get('browser_start', {}).get('seconds', 0.0),
+        'login': totals.get('login', {}).get('seconds', 0.0),
+        'per_range_mean': sum(latencies) / len(latencies),
+        'per_range_max': max(latencies),
+        'webdriver_round_trips': counters.get('webdriver_round_trips', 0),
+        'round_trips_per_range': sum(trips) / float(len(trips)),
+        'sleep_seconds': counters.get('sleep_seconds', 0.0),
+        'export_retries': counters.get('export_retries', 0),
+        'browser_rss_mb': sampler.peak_mb,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_record(history, settings):
+    """
+    :return: Last record of the history file run with the same settings, or None.
+    """
+    if not os.path.exists(history):
+        return None
+    previous = None
+    with open(history) as history_file:
+        for line in history_file:
+            if line.strip():
+                record = json.loads(line)
+                if record.get('settings') == settings:
+                    previous = record
+    return previous
+
+
+def regressions(previous, scenarios, tolerance):
+    """
+    :return: List of messages, one per metric which got worse by more than `tolerance` (a fraction).
+    """
+    messages = []
+    before = dict((scenario['months'], scenario) for scenario in previous['scenarios'])
+    for scenario in scenarios:
+        old = before.get(scenario['months'])
+        if old is None:
+            continue
+        for key, floor in COMPARED_METRICS:
+            if old.get(key) is None or scenario.get(key) is None:
+                continue
+            if scenario[key] > old[key] * (1 + tolerance) and scenario[key] - old[key] > floor:
+                messages.append('{} months: {} went from {:.2f} to {:.2f}'.format(
+                    scenario['months'], key, old[key], scenario[key]))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--months', type=int, nargs='+', default=[1, 12, 36])
+    parser.add_argument('--pacing', default='none', choices=['none', 'fast', 'human'],
+                        help="sleep policy: 'none' or a pacing profile")
+    parser.add_argument('--skip-sleeps', action='store_true', help='count the pauses of the profile without sleeping')
+    parser.add_argument('--calendar-strategy', default='auto', choices=['auto', 'script', 'click'])
+    parser.add_argument('--no-date-picker-api', action='store_true', help='force the calendar click fallback')
+    parser.add_argument('--export-delay', type=float, default=0.0, help='secs the mock server takes per export')
+    parser.add_argument('--export-failures', type=int, default=0, help='failed export clicks per page load')
+    parser.add_argument('--rows-per-day', type=int, default=3)
+    parser.add_argument('--lean', action='store_true')
+    parser.add_argument('--xvfb', action='store_true', help='run Chrome in a virtual display instead of headless')
+    parser.add_argument('--record', metavar='HISTORY', help='append the results to this JSON lines file')
+    parser.add_argument('--compare', action='store_true', help='compare with the last record of the same settings')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    settings = {
+        'pacing': args.pacing, 'skip_sleeps': args.skip_sleeps, 'calendar_strategy': args.calendar_strategy,
+        'date_picker_api': not args.no_date_picker_api, 'export_delay': args.export_delay,
+        'export_failures': args.export_failures, 'rows_per_day': args.rows_per_day, 'lean': args.lean,
+        'xvfb': args.xvfb,
+    }
+    with MockAnalyticsSite(today=TODAY, rows_per_day=args.rows_per_day, export_delay=args.export_delay,
+                           export_failures=args.export_failures,
+                           date_picker_api=not args.no_date_picker_api) as site:
+        scenarios = [run_scenario(site, months, args) for months in args.months]
+
+    print('{:>7}{:>9}{:>10}{:>10}{:>10}{:>11}{:>11}{:>13}{:>13}{:>12}'.format(
+        'months', 'reports', 'seconds', 'startup', 'login', 'range avg', 'range max', 'round trips', 'trips/range',
+        'browser MB'))
+    for scenario in scenarios:
+        print('{months:>7}{reports:>9}{seconds:>10.2f}{browser_start:>10.2f}{login:>10.2f}{per_range_mean:>11.2f}'
+              '{per_range_max:>11.2f}{webdriver_round_trips:>13}{round_trips_per_range:>13.1f}{rss:>12}'.format(
+                  rss='-' if scenario['browser_rss_mb'] is None else '{:.0f}'.format(scenario['browser_rss_mb']),
+                  **scenario))
+
+    status = 0
+    if args.record:
+        if args.compare:
+            previous = previous_record(args.record, settings)
+            if previous is None:
+                print('No previous record with the same settings in {}'.format(args.record))
+            else:
+                messages = regressions(previous, scenarios, args.tolerance)
+                for message in messages:
+                    print('REGRESSION ' + message)
+                status = 1 if messages else 0
+        record = {
+            'recorded': datetime.utcnow().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'settings': settings,
+            'scenarios': scenarios,
+        }
+        with open(args.record, 'a') as history_file:
+            history_file.write(json.dumps(record, sort_keys=True) + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
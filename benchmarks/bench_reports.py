@@ -0,0 +1,117 @@
+"""
+Memory and throughput benchmark of twitter_analytics.reports on synthetic tweet activity reports.
+
+Compares the list of csv.DictReader dicts suggested in the README with the streaming reader and the columnar table.
+
+    $ python benchmarks/bench_reports.py --files 36 --rows 5000
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from twitter_analytics.reports import ReportTable, read_rows  # noqa: E402
+
+
+COLUMNS = ['Tweet id', 'Tweet permalink', 'Tweet text', 'time', 'impressions', 'engagements', 'engagement rate',
+           'retweets', 'replies', 'likes', 'user profile clicks', 'url clicks', 'hashtag clicks', 'detail expands',
+           'permalink clicks', 'app opens', 'app installs', 'follows', 'email tweet', 'dial phone', 'media views',
+           'media engagements', 'promoted impressions', 'promoted engagements', 'promoted engagement rate']
+
+
+def generate_reports(folder, files, rows, overlap):
+    """
+    Write `files` monthly reports of `rows` tweets. Each report repeats `overlap` tweets of the previous one, as
+    happens with overlapping windows or re-downloads.
+    """
+    rng = random.Random(0)
+    paths = []
+    tweet_id = 800000000000000000
+    for month in range(files):
+        path = os.path.join(folder, 'tweet_activity_metrics_bench_{:02d}.csv'.format(month))
+        with open(path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(COLUMNS)
+            first_id = tweet_id - overlap if month else tweet_id
+            for i in range(rows):
+                current_id = first_id + i
+                impressions = rng.randint(0, 100000)
+                engagements = rng.randint(0, impressions // 10 + 1)
+                writer.writerow(
+                    [current_id, 'https://twitter.com/bench/status/{}'.format(current_id),
+                     'Synthetic tweet number {} with some text to look like a real one'.format(current_id),
+                     '2017-{:02d}-15 12:00 +0000'.format(month % 12 + 1), impressions, engagements,
+                     float(engagements) / (impressions or 1)]
+                    + [rng.randint(0, 500) for _ in range(15)]
+                    + ['-', '-', '-'])
+            tweet_id = first_id + rows
+        os.utime(path, (1000 + month, 1000 + month))
+        paths.append(path)
+    return paths
+
+
+def measure(name, function):
+    """
+    Time a reader, then run it again under tracemalloc for its peak memory (tracing slows it down too much to time it
+    in the same pass).
+    """
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'name': name, 'seconds': elapsed, 'peak_mb': peak / 1024.0 / 1024.0, 'rows': result}
+
+
+def dict_reader_list(paths):
+    tweets = list()
+    for report in paths:
+        with open(report, 'r') as csvfile:
+            tweets += [row for row in csv.DictReader(csvfile)]
+    return len(tweets)
+
+
+def streaming_sum(paths):
+    count = 0
+    for row in read_rows(paths, keep_text=False):
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=36)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--overlap', type=int, default=500)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='bench_reports_')
+    try:
+        paths = generate_reports(folder, args.files, args.rows, args.overlap)
+        results = [
+            measure('csv.DictReader list', lambda: dict_reader_list(paths)),
+            measure('read_rows (streaming)', lambda: streaming_sum(paths)),
+            measure('ReportTable', lambda: len(ReportTable.from_reports(paths))),
+        ]
+    finally:
+        shutil.rmtree(folder)
+
+    print('{} files x {} rows ({} overlapping)'.format(args.files, args.rows, args.overlap))
+    print('{:<24}{:>10}{:>12}{:>12}{:>14}'.format('reader', 'rows', 'seconds', 'peak MB', 'rows/sec'))
+    for result in results:
+        print('{name:<24}{rows:>10}{seconds:>12.2f}{peak_mb:>12.1f}{rate:>14.0f}'.format(
+            rate=result['rows'] / result['seconds'], **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,24 +16,24 @@ setup(
     keywords="twitter analytics reports downloader",
     url="https://github.com/philippe2803/twitter-analytics-wrapper",
     packages=['twitter_analytics'],
+    python_requires='>=3.7',
     install_requires=[
         'selenium',
-        'python-dateutil',
         'pyvirtualdisplay'
     ],
+    extras_require={
+        'columnar': ['pyarrow'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Web Environment',
         'Intended Audience :: Developers',
         'Operating System :: POSIX :: Linux',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         'Topic :: Software Development :: Libraries :: Python Modules'
     ]
 )
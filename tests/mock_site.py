@@ -0,0 +1,363 @@
+"""
+Local mock of the Twitter login and analytics pages, for offline end to end runs of ReportDownloader.
+
+The report page is tests/fixtures/report_page_dump.html with its external resources stripped and a small script
+emulating the parts the downloader drives: the daterange calendar (month navigation, day picking, 'Update'), the
+daterangepicker jQuery API used by the 'script' calendar strategy, and the export button, which downloads a generated
+CSV report of the selected range.
+
+    with MockAnalyticsSite() as site:
+        downloader = mock_downloader_class(site)('username', 'password', from_date=..., to_date=...)
+"""
+import csv
+import io
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'report_page_dump.html')
+
+SESSION_COOKIE = 'mock_session'
+
+REPORT_COLUMNS = ['Tweet id', 'Tweet permalink', 'Tweet text', 'time', 'impressions', 'engagements',
+                  'engagement rate', 'retweets', 'replies', 'likes', 'user profile clicks', 'url clicks']
+
+LOGIN_PAGE = '''<html>
+<head><title>Login on Twitter</title></head>
+<body>
+<form action="/sessions" method="post">
+  <input type="text" class="js-username-field email-input js-initial-focus" name="session[username_or_email]">
+  <input type="password" class="js-password-field" name="session[password]">
+  <button type="submit" class="submit EdgeButton EdgeButton--primary">Log in</button>
+</form>
+</body>
+</html>
+'''
+
+SIMPLE_PAGE = '<html><head><title>{title}</title></head><body><h1>{title}</h1></body></html>'
+
+# The stylesheets are not served: just enough style for Selenium to consider the icons and buttons clickable.
+PAGE_STYLE = '''<style type="text/css">
+.hidden { display: none; }
+.Icon { display: inline-block; width: 12px; height: 12px; }
+.daterangepicker td, .daterangepicker th { padding: 2px 4px; cursor: pointer; }
+</style>
+'''
+
+# Emulates the daterangepicker and the export button of the report page. The placeholders are filled per request.
+PAGE_SCRIPT = '''<script type="text/javascript">
+(function () {
+  var MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+  var exportFailures = __EXPORT_FAILURES__;
+  var today = new Date(__TODAY__);
+  var end = new Date(today.getFullYear(), today.getMonth(), today.getDate());
+  var start = new Date(end.getFullYear(), end.getMonth(), end.getDate() - 27);
+  var state = {start: start, end: end, shown: {}};
+  var applied = {start: start, end: end};
+
+  var picker = document.querySelector('.daterangepicker');
+  var button = document.querySelector('.daterange-button');
+  var label = button.querySelector('.daterange-selected');
+  var sides = {left: picker.querySelector('.calendar.left'), right: picker.querySelector('.calendar.right')};
+  var exportButton = document.querySelector('#export > button');
+  var callout = document.querySelector('#export .Callout');
+
+  function pad(n) { return (n < 10 ? '0' : '') + n; }
+  function mdy(d) { return pad(d.getMonth() + 1) + '/' + pad(d.getDate()) + '/' + d.getFullYear(); }
+  function pretty(d) { return MONTHS[d.getMonth()] + ' ' + d.getDate() + ', ' + d.getFullYear(); }
+  function parse(s) { var p = s.split('/'); return new Date(+p[2], +p[0] - 1, +p[1]); }
+  function firstOfMonth(d) { return new Date(d.getFullYear(), d.getMonth(), 1); }
+
+  function render(side) {
+    var shown = state.shown[side];
+    var calendar = sides[side];
+    calendar.querySelector('th.month').textContent = MONTHS[shown.getMonth()] + ' ' + shown.getFullYear();
+    calendar.querySelector('input').value = mdy(side === 'left' ? state.start : state.end);
+    var cursor = new Date(shown.getFullYear(), shown.getMonth(), 1 - shown.getDay());
+    var rows = [];
+    for (var row = 0; row < 6; row++) {
+      var cells = [];
+      for (var column = 0; column < 7; column++) {
+        var classes = ['available'];
+        var time = cursor.getTime();
+        if (cursor.getMonth() !== shown.getMonth()) { classes.push('off'); }
+        if (time === state.start.getTime()) { classes.push('active', 'start-date'); }
+        else if (time === state.end.getTime()) { classes.push('active', 'end-date'); }
+        else if (time > state.start.getTime() && time < state.end.getTime()) { classes.push('in-range'); }
+        cells.push('<td class="' + classes.join(' ') + '" data-date="' + mdy(cursor) + '">' + cursor.getDate() +
+                   '</td>');
+        cursor = new Date(cursor.getFullYear(), cursor.getMonth(), cursor.getDate() + 1);
+      }
+      rows.push('<tr>' + cells.join('') + '</tr>');
+    }
+    calendar.querySelector('tbody').innerHTML = rows.join('');
+  }
+
+  function show() {
+    state.start = applied.start;
+    state.end = applied.end;
+    state.shown = {left: firstOfMonth(state.start), right: firstOfMonth(state.end)};
+    render('left');
+    render('right');
+    picker.style.display = 'block';
+  }
+
+  function hide() { picker.style.display = 'none'; }
+
+  function apply() {
+    if (state.end < state.start) { var swap = state.start; state.start = state.end; state.end = swap; }
+    applied = {start: state.start, end: state.end};
+    label.textContent = pretty(applied.start) + ' - ' + pretty(applied.end);
+    hide();
+  }
+
+  button.addEventListener('click', function () {
+    if (picker.style.display === 'none') { show(); } else { hide(); }
+  });
+
+  picker.addEventListener('click', function (event) {
+    var target = event.target;
+    var side = sides.left.contains(target) ? 'left' : 'right';
+    var header = target.closest('th');
+    if (header && (header.classList.contains('prev') || header.classList.contains('next'))) {
+      var shown = state.shown[side];
+      state.shown[side] = new Date(shown.getFullYear(),
+                                   shown.getMonth() + (header.classList.contains('next') ? 1 : -1), 1);
+      render(side);
+    } else if (target.tagName === 'TD' && target.getAttribute('data-date')) {
+      state[side === 'left' ? 'start' : 'end'] = parse(target.getAttribute('data-date'));
+      render('left');
+      render('right');
+    } else if (target.classList.contains('applyBtn')) {
+      apply();
+    } else if (target.classList.contains('cancelBtn')) {
+      hide();
+    }
+  });
+
+  if (__DATE_PICKER_API__) {
+    var api = {
+      element: button,
+      setStartDate: function (value) { state.start = parse(value); },
+      setEndDate: function (value) { state.end = parse(value); },
+      clickApply: apply
+    };
+    Object.defineProperty(api, 'startDate', {get: function () {
+      return {format: function () { return mdy(state.start); }};
+    }});
+    Object.defineProperty(api, 'endDate', {get: function () {
+      return {format: function () { return mdy(state.end); }};
+    }});
+    window.jQuery = function (element) {
+      return {data: function (key) { return element === button && key === 'daterangepicker' ? api : undefined; }};
+    };
+  }
+
+  exportButton.addEventListener('click', function () {
+    if (exportFailures > 0) {
+      exportFailures -= 1;
+      callout.className = 'error server Callout Callout--danger';
+      return;
+    }
+    callout.className = 'hidden error server Callout Callout--danger';
+    window.location.href = window.location.pathname + '/export.csv?start_date=' +
+      encodeURIComponent(mdy(applied.start)) + '&end_date=' + encodeURIComponent(mdy(applied.end));
+  });
+})();
+</script>
+'''
+
+_EXTERNAL_RESOURCE = re.compile(
+    r'<script[^>]*\bsrc="(?:https?:)?//[^"]*"[^>]*>\s*</script>|<(?:link|img)[^>]*\b(?:src|href)="(?:https?:)?//[^"]*"'
+    r'[^>]*>')
+_PAGE_URL = re.compile(r'^/user/([^/]+)/(tweets|videos)(/export\.csv)?$')
+
+
+def load_report_page():
+    """
+    :return: The report page fixture, offline: no external script, stylesheet or pixel, calendar closed.
+    """
+    with open(FIXTURE_PAGE, 'r', encoding='utf-8') as page_file:
+        page = page_file.read()
+    page = _EXTERNAL_RESOURCE.sub('', page)
+    page = re.sub(r'(<div class="daterangepicker[^"]*" style=")', r'\1display: none; ', page, count=1)
+    return page
+
+
+def generate_report(account, from_date, to_date, rows_per_day=3):
+    """
+    :return: Content of a tweet activity report with `rows_per_day` tweets for every day of the range.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(REPORT_COLUMNS)
+    day = from_date
+    while day <= to_date:
+        for index in range(rows_per_day):
+            tweet_id = int(day.strftime('%Y%m%d')) * 1000 + index
+            impressions = (tweet_id * 7919) % 5000
+            engagements = impressions // 20
+            writer.writerow([tweet_id, 'https://twitter.com/{}/status/{}'.format(account, tweet_id),
+                             'Mock tweet {} of {}'.format(index, day.isoformat()),
+                             '{} 12:{:02d} +0000'.format(day.isoformat(), index), impressions, engagements,
+                             float(engagements) / (impressions or 1), index, index, index * 2, 1, 0])
+        day += timedelta(days=1)
+    return output.getvalue()
+
+
+class MockAnalyticsSite(object):
+
+    """
+    Mock analytics site served on localhost from a background thread.
+    """
+
+    def __init__(self, today=None, rows_per_day=3, export_delay=0.0, export_failures=0, date_picker_api=True,
+                 managed_accounts=(), host='127.0.0.1', port=0):
+        """
+        :param today (optional): date the calendar considers as today (it opens on the last 28 days). Default is the
+        real today.
+        :param rows_per_day: Tweets per day in the generated reports.
+        :param export_delay: Secs the server takes to answer an export.
+        :param export_failures: Number of export clicks showing the server error callout on every page load before
+        the export works.
+        :param date_picker_api: Expose the daterangepicker jQuery API. Set to False to force the click fallback.
+        :param managed_accounts: Handles whose analytics pages any logged-in user can open, like an agency login.
+        :param port: 0 picks a free port.
+        """
+        self.today = today or date.today()
+        self.rows_per_day = rows_per_day
+        self.export_delay = export_delay
+        self.export_failures = export_failures
+        self.date_picker_api = date_picker_api
+        self.managed_accounts = set(handle.lower() for handle in managed_accounts)
+        self.report_page = load_report_page()
+        self.exports = []       # (account, section, from_date, to_date) of every report served
+        self.logins = []
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.site = self
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path='/'):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}{}'.format(host, port, path)
+
+    def render_report_page(self):
+        script = PAGE_SCRIPT \
+            .replace('__EXPORT_FAILURES__', str(int(self.export_failures))) \
+            .replace('__TODAY__', '{}, {}, {}'.format(self.today.year, self.today.month - 1, self.today.day)) \
+            .replace('__DATE_PICKER_API__', 'true' if self.date_picker_api else 'false')
+        return self.report_page.replace('</head>', PAGE_STYLE + '</head>', 1).replace('</body>', script + '</body>', 1)
+
+    def export_filename(self, account, section, from_date, to_date):
+        prefix = 'tweet_activity_metrics' if section == 'tweets' else 'video_activity_metrics'
+        return '{}_{}_{:%Y%m%d}_{:%Y%m%d}_en.csv'.format(prefix, account, from_date, to_date)
+
+
+def mock_downloader_class(site, base=None):
+    """
+    :param site: running MockAnalyticsSite
+    :param base (optional): ReportDownloader subclass to point at the mock site. Default is ReportDownloader.
+    :return: Subclass of `base` whose login and analytics pages are the mock ones.
+    """
+    if base is None:
+        from twitter_analytics.downloader import ReportDownloader
+        base = ReportDownloader
+    return type('Mock' + base.__name__, (base,), {'login_url': site.url('/login'), 'analytics_url': site.url('/')})
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def site(self):
+        return self.server.site
+
+    def session_account(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+
+    def send_body(self, body, content_type='text/html; charset=utf-8', headers=None):
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, headers=None):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/sessions':
+            return self.send_error(404)
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        account = form.get('session[username_or_email]', [''])[0].lower()
+        if not account:
+            return self.redirect('/login')
+        self.site.logins.append(account)
+        self.redirect('/', {'Set-Cookie': '{}={}; Path=/'.format(SESSION_COOKIE, account)})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        account = self.session_account()
+        if url.path == '/login':
+            return self.send_body(LOGIN_PAGE)
+        if url.path == '/about':
+            return self.send_body(SIMPLE_PAGE.format(title='Twitter Analytics'))
+        if url.path == '/':
+            return self.redirect('/user/{}/home'.format(account) if account else '/about')
+        if account is None:
+            return self.redirect('/login')
+        if url.path == '/user/{}/home'.format(account):
+            return self.send_body(SIMPLE_PAGE.format(title='Account home'))
+
+        match = _PAGE_URL.match(url.path)
+        if match is None or match.group(1).lower() not in self.site.managed_accounts | {account}:
+            return self.send_error(404)
+        account, section = match.group(1).lower(), match.group(2)
+        if not match.group(3):
+            return self.send_body(self.site.render_report_page())
+
+        query = parse_qs(url.query)
+        try:
+            from_date = datetime.strptime(query['start_date'][0], '%m/%d/%Y').date()
+            to_date = datetime.strptime(query['end_date'][0], '%m/%d/%Y').date()
+        except (KeyError, ValueError):
+            return self.send_error(400)
+        if self.site.export_delay:
+            time.sleep(self.site.export_delay)
+        self.site.exports.append((account, section, from_date, to_date))
+        filename = self.site.export_filename(account, section, from_date, to_date)
+        self.send_body(generate_report(account, from_date, to_date, self.site.rows_per_day), 'text/csv',
+                       {'Content-Disposition': 'attachment; filename="{}"'.format(filename)})
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from twitter_analytics import downloader as downloader_module
+from twitter_analytics.aio import AsyncReportDownloader, DeferredSleep
+from twitter_analytics.instrumentation import Instrumentation
+from twitter_analytics.retry import RetryScheduler
+from twitter_analytics.watcher import report_matcher
+
+
+class FakeDownloader(object):
+
+    """ Stands for a ReportDownloader whose export button triggers a download 0.2 secs later. """
+
+    download_timeout = 5
+
+    def __init__(self, download_folder):
+        self.download_folder = download_folder
+        self.error_checks = 0
+        self.retry = RetryScheduler()
+
+    def expected_report(self, from_date, to_date, section):
+        return report_matcher('someuser', from_date, to_date), 'someuser_tweets_20170101_20170131.csv'
+
+    def click_export(self):
+        def download():
+            time.sleep(0.2)
+            with open(os.path.join(self.download_folder, 'tweet_activity_metrics_someuser_20170101_20170131_en.csv'),
+                      'w') as report:
+                report.write('Tweet id\n')
+        threading.Thread(target=download).start()
+
+    def report_error_occurred(self):
+        self.error_checks += 1
+        return False
+
+    def retry_export_on_error(self, attempt, download_button):
+        if self.report_error_occurred():
+            attempt.failed()
+
+
+def test_download_reports_concurrently_without_blocking_the_loop(tmpdir):
+    downloaders = []
+    for i in range(3):
+        folder = str(tmpdir.mkdir('job{}'.format(i)))
+        downloader = AsyncReportDownloader('someuser', 'password', pacing='fast')
+        downloader.downloader = FakeDownloader(folder)
+        downloaders.append(downloader)
+
+    async def download_all():
+        return await asyncio.gather(*[d.download_report('01/01/2017', '01/31/2017') for d in downloaders])
+
+    started = time.time()
+    reports = asyncio.run(download_all())
+    assert time.time() - started < 1.5
+    assert [os.path.basename(report) for report in reports] == ['someuser_tweets_20170101_20170131.csv'] * 3
+
+
+def test_quit_shuts_down_the_default_executor():
+    downloader = AsyncReportDownloader('someuser', 'password', pacing='fast')
+    asyncio.run(downloader.quit())
+    assert downloader.executor._shutdown
+
+    shared = ThreadPoolExecutor(max_workers=1)
+    downloader = AsyncReportDownloader('someuser', 'password', pacing='fast', executor=shared)
+    asyncio.run(downloader.quit())
+    assert not shared._shutdown
+    shared.shutdown()
+
+
+def test_deferred_sleeps_add_up_across_threads():
+    sleep = DeferredSleep()
+    threads = [threading.Thread(target=lambda: [sleep(0.5) for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sleep.take() == 2000.0 and sleep.take() == 0.0
+
+
+def test_retries_inside_a_step_really_sleep(monkeypatch):
+    class StartedDownloader(object):
+        def __init__(self, username, password, pacing=None, **options):
+            self.metrics = Instrumentation()
+            self.retry = RetryScheduler().bind(pacing.sleep, on_retry=lambda step: self.metrics.count('retries'))
+
+        def quit(self):
+            pass
+
+    monkeypatch.setattr(downloader_module, 'ReportDownloader', StartedDownloader)
+    downloader = AsyncReportDownloader('someuser', 'password', pacing='fast')
+    started = asyncio.run(downloader.start())
+    asyncio.run(downloader.quit())
+
+    assert started.retry.sleep.__wrapped__ is time.sleep
+    started.retry.on_retry('export')
+    assert started.metrics.counters['retries'] == 1
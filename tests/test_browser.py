@@ -0,0 +1,89 @@
+import os
+
+from twitter_analytics.browser import LEAN_BLOCKED_URLS, block_urls, chrome_options, enable_downloads
+
+
+class CdpBrowser(object):
+
+    """ Selenium 4 driver: DevTools commands through execute_cdp_cmd. """
+
+    def __init__(self):
+        self.commands = []
+
+    def execute_cdp_cmd(self, command, params):
+        self.commands.append((command, params))
+        return {}
+
+
+class CommandExecutor(object):
+
+    def __init__(self):
+        self._commands = dict()
+
+
+class LegacyBrowser(object):
+
+    """ Selenium 3 driver: DevTools commands through chromedriver's send_command endpoint. """
+
+    def __init__(self):
+        self.command_executor = CommandExecutor()
+        self.commands = []
+
+    def execute(self, driver_command, params=None):
+        self.commands.append((driver_command, params))
+        return {'value': None}
+
+
+def test_default_options_keep_the_browser_visible(tmpdir):
+    options = chrome_options(str(tmpdir))
+    assert options.arguments == []
+    assert options.experimental_options['prefs'] == {'download.default_directory': str(tmpdir)}
+
+
+def test_headless_lean_options_with_a_profile(tmpdir):
+    profile = os.path.join(str(tmpdir), 'profile')
+    options = chrome_options(str(tmpdir), proxy='10.0.0.1:3128', headless=True, lean=True, profile_dir=profile)
+
+    assert '--headless=new' in options.arguments and '--window-size=1200,1000' in options.arguments
+    assert '--user-data-dir={}'.format(profile) in options.arguments
+    assert '--proxy-server=10.0.0.1:3128' in options.arguments
+    for argument in ('--blink-settings=imagesEnabled=false', '--disable-extensions', '--disable-gpu',
+                     '--renderer-process-limit=1', '--disk-cache-size=1048576'):
+        assert argument in options.arguments
+    assert options.experimental_options['prefs'] == {
+        'download.default_directory': str(tmpdir),
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    }
+
+    visible = chrome_options(str(tmpdir), lean=True)
+    assert '--headless=new' not in visible.arguments and '--disable-gpu' in visible.arguments
+
+    tabs = chrome_options(str(tmpdir), lean=True, tabs=3)
+    assert '--renderer-process-limit=1' not in tabs.arguments and '--disable-gpu' in tabs.arguments
+
+
+def test_devtools_commands_for_downloads_and_blocked_urls(tmpdir):
+    browser = CdpBrowser()
+    enable_downloads(browser, str(tmpdir))
+    block_urls(browser)
+    block_urls(browser, ['*.png'])
+
+    assert browser.commands == [
+        ('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': os.path.abspath(str(tmpdir))}),
+        ('Network.enable', {}),
+        ('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS}),
+        ('Network.enable', {}),
+        ('Network.setBlockedURLs', {'urls': ['*.png']}),
+    ]
+
+
+def test_devtools_commands_without_execute_cdp_cmd(tmpdir):
+    browser = LegacyBrowser()
+    enable_downloads(browser, str(tmpdir))
+
+    assert browser.command_executor._commands['send_command'] == (
+        'POST', '/session/$sessionId/chromium/send_command')
+    assert browser.commands == [('send_command', {
+        'cmd': 'Page.setDownloadBehavior',
+        'params': {'behavior': 'allow', 'downloadPath': os.path.abspath(str(tmpdir))}})]
@@ -1,4 +1,5 @@
 from twitter_analytics.calendar import AnalyticsCalendar
+from twitter_analytics.pages import PROBE_SCRIPT
 from twitter_analytics import ReportDownloader
 from selenium import webdriver
 from pyvirtualdisplay import Display
@@ -31,5 +32,48 @@ def NOtest_calendar_date_picking():
     display.stop()
 
 
+class FakeBrowser(object):
+
+    def __init__(self, picked, label='Apr 4, 2017 - May 1, 2017', error=None):
+        self.picked = picked
+        self.label = label
+        self.error = error
+
+    def execute_script(self, script, *args):
+        if script == PROBE_SCRIPT:
+            return {'error': False, 'export_present': True, 'export_enabled': True, 'range': self.label,
+                    'calendar_visible': False, 'months': {'left': None, 'right': None}}
+        if self.error is not None:
+            raise self.error
+        return self.picked
+
+
+def make_calendar(browser):
+    calendar = AnalyticsCalendar(browser=browser, from_date='04/04/2017', to_date='05/01/2017', pacer='fast')
+    calendar.script_timeout = 0.2
+    return calendar
+
+
+def test_script_strategy_checks_the_displayed_range():
+    assert make_calendar(FakeBrowser(['04/04/2017', '05/01/2017'])).set_period_with_script() is True
+
+    # date picker plugin not reachable
+    assert make_calendar(FakeBrowser(None)).set_period_with_script() is False
+
+    # the page shows another range
+    browser = FakeBrowser(['04/04/2017', '05/01/2017'], label='Jan 1, 2010 - Jan 2, 2010')
+    assert make_calendar(browser).set_period_with_script() is False
+
+
+def test_script_error_falls_back_to_clicks():
+    from selenium.common.exceptions import JavascriptException
+
+    calendar = make_calendar(FakeBrowser(None, error=JavascriptException('picker.setStartDate is not a function')))
+    clicked = []
+    calendar.set_period_with_clicks = lambda: clicked.append(True) or 'completed'
+    assert calendar.set_report_period() == 'completed'
+    assert calendar.strategy_used == 'click' and clicked == [True]
+
+
 if __name__ == "__main__":
     NOtest_calendar_date_picking()
\ No newline at end of file
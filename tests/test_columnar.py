@@ -0,0 +1,82 @@
+import os
+from datetime import date
+
+import pytest
+
+from tests.mock_site import generate_report
+
+pa = pytest.importorskip('pyarrow')
+
+from twitter_analytics.columnar import ColumnarStore  # noqa: E402
+
+
+def write_report(folder, name, from_date, to_date, written_at):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as report:
+        report.write(generate_report('someuser', from_date, to_date, rows_per_day=2))
+    os.utime(path, (written_at, written_at))
+    return path
+
+
+@pytest.mark.parametrize('storage', ['ipc', 'parquet'])
+def test_reports_are_partitioned_by_month_and_read_by_column(tmpdir, storage):
+    folder = str(tmpdir)
+    older = write_report(folder, 'someuser_tweets_20170120_20170210.csv', date(2017, 1, 20), date(2017, 2, 10), 1000)
+    newer = write_report(folder, 'someuser_tweets_20170205_20170303.csv', date(2017, 2, 5), date(2017, 3, 3), 2000)
+    store = ColumnarStore(os.path.join(folder, 'store'), format=storage)
+
+    assert store.add_reports('SomeUser', 'tweets', [older]) == ['2017-01', '2017-02']
+    assert store.add_reports('SomeUser', 'tweets', [newer]) == ['2017-02', '2017-03']
+
+    store = ColumnarStore(os.path.join(folder, 'store'), format=storage)        # index reloaded from disk
+    assert [entry['month'] for entry in store.partitions(account='someuser')] == ['2017-01', '2017-02', '2017-03']
+    assert store.partitions(from_month='2017-02', to_month='2017-02')[0]['rows'] == 56
+    assert store.partitions(from_month='2017-02')[0]['sources'] == [os.path.basename(older), os.path.basename(newer)]
+
+    february = store.read(['Tweet id', 'impressions'], from_month='2017-02', to_month='2017-02')
+    assert february.schema.names == ['Tweet id', 'impressions']
+    assert february.num_rows == 56 and len(set(february.column('Tweet id').to_pylist())) == 56
+    assert store.column('impressions').length() == (12 + 28 + 3) * 2
+
+    table = store.read(['time'], with_partitions=True)
+    assert table.column('month').to_pylist()[0] == '2017-01'
+    assert table.column('time').to_pylist() == sorted(table.column('time').to_pylist())
+
+
+def test_missing_metrics_are_stored_as_nulls(tmpdir):
+    folder = str(tmpdir)
+    path = os.path.join(folder, 'someuser_tweets_20170101_20170131.csv')
+    with open(path, 'w') as report:
+        report.write('Tweet id,time,impressions,engagement rate,promoted impressions,source\n')
+        report.write('1,2017-01-02 10:00 +0000,100,0.05,-,Twitter Web App\n')
+        report.write('2,2017-01-03 10:00 +0000,50,-,20,Twitter for iPhone\n')
+    store = ColumnarStore(os.path.join(folder, 'store'))
+    store.add_reports('someuser', 'tweets', [path])
+
+    table = store.read()
+    assert table.column('promoted impressions').type == pa.int64()
+    assert table.column('promoted impressions').to_pylist() == [None, 20]
+    assert table.column('engagement rate').to_pylist() == [0.05, None]
+    assert table.column('source').to_pylist() == ['Twitter Web App', 'Twitter for iPhone']
+
+
+def test_video_reports_are_not_stored(tmpdir):
+    from twitter_analytics.downloader import ReportDownloader
+    from twitter_analytics.instrumentation import Instrumentation
+
+    folder = str(tmpdir)
+    path = os.path.join(folder, 'someuser_videos_20170101_20170131.csv')
+    with open(path, 'w') as report:
+        report.write('Date,Video title,Video views\n2017-01-02,Launch,12\n2017-01-03,Launch,7\n')
+    store = ColumnarStore(os.path.join(folder, 'store'))
+    with pytest.raises(Exception, match='Only tweet activity reports'):
+        store.add_reports('someuser', 'videos', [path])
+
+    downloader = ReportDownloader.__new__(ReportDownloader)
+    downloader.account = 'someuser'
+    downloader.labels = dict()
+    downloader.metrics = Instrumentation()
+    downloader.columnar_store = store
+    downloader.rollup = None
+    downloader.store_reports('videos', [path])
+    assert store.partitions() == []
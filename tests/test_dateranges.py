@@ -6,3 +6,25 @@ def test_split_date_ranges():
     to_date = '02/28/2015'
     date_ranges = ReportDownloader.split_date_range_into_91(from_date, to_date)
     assert len(date_ranges) == 1
+
+
+def test_split_date_range_into_months_keeps_last_partial_month():
+    date_ranges = ReportDownloader.split_date_range_into_months('01/31/2017', '04/10/2017')
+    assert date_ranges == [['01/31/2017', '01/31/2017'], ['02/01/2017', '02/28/2017'],
+                           ['03/01/2017', '03/31/2017'], ['04/01/2017', '04/10/2017']]
+
+
+def test_split_date_range_into_91_covers_every_day_once():
+    date_ranges = ReportDownloader.split_date_range_into_91('01/01/2015', '12/31/2015')
+    assert date_ranges == [['01/01/2015', '04/01/2015'], ['04/02/2015', '07/01/2015'],
+                           ['07/02/2015', '09/30/2015'], ['10/01/2015', '12/30/2015'], ['12/31/2015', '12/31/2015']]
+    assert ReportDownloader.split_date_range_into_91('03/05/2015', '03/05/2015') == [['03/05/2015', '03/05/2015']]
+
+
+def test_iso_dates_and_finality():
+    from datetime import date
+    from twitter_analytics.dateranges import from_iso, is_final, to_iso
+
+    assert to_iso('01/31/2017') == '2017-01-31' and from_iso('2017-01-31') == '01/31/2017'
+    assert not is_final(date(2017, 1, 31), date(2017, 2, 2), refresh_days=3)
+    assert is_final(date(2017, 1, 31), date(2017, 2, 3), refresh_days=3)
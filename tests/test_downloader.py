@@ -0,0 +1,225 @@
+import functools
+import os
+from datetime import datetime
+
+import pytest
+
+from twitter_analytics import downloader as downloader_module
+from twitter_analytics.downloader import ReportDownloader
+from twitter_analytics.pacing import Pacer
+from twitter_analytics.pages import LOCATE_SCRIPT, PROBE_SCRIPT
+from twitter_analytics.retry import DownloadFailed, RetryPolicy, RetryScheduler, StepFailed
+from twitter_analytics.utils import last_28_days, report_filename
+from twitter_analytics.watcher import EXPORT_PREFIXES, DownloadWatcher
+
+
+class FakeTab(object):
+
+    def __init__(self):
+        self.url = 'about:blank'
+        self.range = (None, None)
+        self.error = False
+
+
+class FakeExportButton(object):
+
+    def __init__(self, browser, handle):
+        self.browser = browser
+        self.handle = handle
+
+    def click(self):
+        self.browser.export(self.handle)
+
+
+class SwitchTo(object):
+
+    def __init__(self, browser):
+        self.browser = browser
+
+    def window(self, handle):
+        assert handle in self.browser.window_handles
+        self.browser.current_window_handle = handle
+
+
+class FakeChrome(object):
+
+    """
+    Chrome without Twitter: each tab shows the analytics page of an account and section, and its export button writes
+    the report of the range selected in the tab to the download folder, unless
+    `export_errors[(account, section, from_date)]` server errors are left for that range.
+    """
+
+    def __init__(self, download_folder):
+        self.download_folder = download_folder
+        self.export_errors = dict()
+        self.tabs = {'tab0': FakeTab()}
+        self.window_handles = ['tab0']
+        self.current_window_handle = 'tab0'
+        self.switch_to = SwitchTo(self)
+        self.visits = []            # (tab, url)
+        self.devtools = []          # (tab, DevTools command)
+        self.exports = []           # (tab, from date)
+        self.logins = 0
+        self.quits = 0
+
+    @property
+    def tab(self):
+        return self.tabs[self.current_window_handle]
+
+    def get(self, url):
+        self.visits.append((self.current_window_handle, url))
+        self.tab.url = url
+        self.tab.error = False
+
+    def execute_cdp_cmd(self, command, params):
+        self.devtools.append((self.current_window_handle, command))
+        return {}
+
+    def execute(self, driver_command, params=None):
+        script, args = params['script'], params['args']
+        if script == PROBE_SCRIPT:
+            on_page = '/user/' in self.tab.url
+            return {'value': {'error': self.tab.error, 'export_present': on_page, 'export_enabled': on_page,
+                              'range': None, 'calendar_visible': False, 'months': {}}}
+        if script == LOCATE_SCRIPT:
+            assert args == ['export']
+            return {'value': FakeExportButton(self, self.current_window_handle)}
+        assert script == 'window.open("about:blank", "_blank");'
+        handle = 'tab{}'.format(len(self.tabs))
+        self.tabs[handle] = FakeTab()
+        self.window_handles.append(handle)
+        return {'value': None}
+
+    def execute_script(self, script, *args):
+        return self.execute('executeScript', {'script': script, 'args': list(args)})['value']
+
+    def select(self, from_date, to_date):
+        self.tab.range = (from_date, to_date)
+
+    def export(self, handle):
+        tab = self.tabs[handle]
+        from_date, to_date = tab.range
+        account, section = tab.url.split('/')[-2:]
+        self.exports.append((handle, from_date))
+        if self.export_errors.get((account, section, from_date), 0):
+            self.export_errors[(account, section, from_date)] -= 1
+            tab.error = True
+            return
+        dates = [datetime.strptime(date, '%m/%d/%Y').strftime('%Y%m%d') for date in (from_date, to_date)
+                 if date is not None] or ['20170101', '20170128']
+        name = '{}_{}_{}_en.csv'.format(EXPORT_PREFIXES[section], account, '_'.join(dates))
+        with open(os.path.join(self.download_folder, name), 'w') as report:
+            report.write('Tweet id\n1\n')
+
+    def close(self):
+        del self.tabs[self.current_window_handle]
+        self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self.quits += 1
+
+
+class OfflineDownloader(ReportDownloader):
+
+    """
+    ReportDownloader driving a FakeChrome: the login form is skipped and the range is selected in the tab instead of
+    through the calendar.
+    """
+
+    def login(self):
+        self.browser.logins += 1
+
+    def set_report_period(self, from_date, to_date):
+        self.browser.select(from_date, to_date)
+
+
+@pytest.fixture
+def offline_downloader(tmpdir, monkeypatch):
+    """
+    :return: Function building an OfflineDownloader downloading to tmpdir, with no pauses and quick retries.
+    """
+    # Check the download folder every 50 ms instead of every second
+    monkeypatch.setattr(downloader_module, 'DownloadWatcher', functools.partial(DownloadWatcher, poll_frequency=0.05))
+    monkeypatch.setattr(downloader_module, 'create_browser', lambda options: FakeChrome(str(tmpdir)))
+
+    def build(**options):
+        retry = RetryScheduler({'export': RetryPolicy(attempts=2, base_delay=0, jitter=0)}, max_requeues=1)
+        return OfflineDownloader('someuser', 'password', download_folder=str(tmpdir), headless=True, retry=retry,
+                                 pacing=Pacer(jitter=(0, 0), small_jitter=(0, 0), poll_frequency=0.01), **options)
+    return build
+
+
+MONTHS = [['01/01/2017', '01/31/2017'], ['02/01/2017', '02/28/2017'], ['03/01/2017', '03/31/2017'],
+          ['04/01/2017', '04/30/2017'], ['05/01/2017', '05/31/2017']]
+
+
+def test_tabs_set_their_range_while_the_others_download(tmpdir, offline_downloader):
+    downloader = offline_downloader(tabs=3, lean=True)
+    browser = downloader.browser
+
+    reports = downloader.download_in_tabs('tweets', MONTHS)
+    assert reports == [os.path.join(str(tmpdir), report_filename('someuser', 'tweets', *rng)) for rng in MONTHS]
+    # every tab clicks its export before the reports are claimed, then the idle tabs get the next ranges
+    assert browser.exports == [('tab0', '01/01/2017'), ('tab1', '02/01/2017'), ('tab2', '03/01/2017'),
+                               ('tab0', '04/01/2017'), ('tab1', '05/01/2017')]
+    for handle in ('tab0', 'tab1', 'tab2'):
+        assert [url for tab, url in browser.visits if tab == handle][-1:] == [
+            'https://analytics.twitter.com/user/someuser/tweets']
+        assert [command for tab, command in browser.devtools if tab == handle][-3:] == [
+            'Page.setDownloadBehavior', 'Network.enable', 'Network.setBlockedURLs']
+    assert browser.window_handles == ['tab0'] and browser.current_window_handle == 'tab0'
+    assert downloader.failures == [] and sorted(os.listdir(str(tmpdir))) == sorted(map(os.path.basename, reports))
+
+
+def test_failed_range_of_a_tab_is_requeued(tmpdir, offline_downloader):
+    downloader = offline_downloader(tabs=2)
+    browser = downloader.browser
+    browser.export_errors = {('someuser', 'tweets', '01/01/2017'): 2}
+
+    reports = downloader.download_in_tabs('tweets', MONTHS[:4])
+    assert reports == [os.path.join(str(tmpdir), report_filename('someuser', 'tweets', *rng)) for rng in MONTHS[:4]]
+    # tab0 clicks January again after the error, then gives it up; the range goes back to the queue and tab0 loads
+    # the page again before downloading it
+    assert browser.exports == [('tab0', '01/01/2017'), ('tab1', '02/01/2017'), ('tab1', '03/01/2017'),
+                               ('tab1', '04/01/2017'), ('tab0', '01/01/2017'), ('tab0', '01/01/2017')]
+    assert [url for tab, url in browser.visits if tab == 'tab0'].count(
+        'https://analytics.twitter.com/user/someuser/tweets') == 2
+    assert [url for tab, url in browser.visits if tab == 'tab1'].count(
+        'https://analytics.twitter.com/user/someuser/tweets') == 1
+    assert downloader.metrics.counters['export_retries'] == 1
+    assert downloader.metrics.counters['requeued_ranges'] == 1
+    assert downloader.failures == []
+
+
+def test_run_downloads_every_section_in_one_session(tmpdir, offline_downloader):
+    downloader = offline_downloader(section=['tweets', 'videos'], from_date='01/01/2017', to_date='02/28/2017')
+    browser = downloader.browser
+
+    reports = downloader.run()
+    assert reports == [os.path.join(str(tmpdir), section, report_filename('someuser', section, *rng))
+                       for section in ('tweets', 'videos') for rng in MONTHS[:2]]
+    assert [url for tab, url in browser.visits] == [
+        downloader.login_url, downloader.analytics_url, 'https://analytics.twitter.com/user/someuser/tweets',
+        'https://analytics.twitter.com/user/someuser/videos']
+    assert browser.logins == 1 and browser.quits == 1
+    assert sorted(os.listdir(str(tmpdir))) == ['tweets', 'videos']
+
+
+def test_run_attributes_the_reports_and_failures_to_each_managed_account(tmpdir, offline_downloader):
+    downloader = offline_downloader(accounts=['ClientA', 'ClientB'], section=['tweets', 'videos'])
+    browser = downloader.browser
+    browser.export_errors = {('clienta', 'videos', None): 10}
+
+    with pytest.raises(DownloadFailed) as failed:
+        downloader.run()
+    # the videos of clienta are given up, the run goes on with clientb
+    assert failed.value.reports == [
+        os.path.join(str(tmpdir), account, section, report_filename(account, section, *last_28_days()))
+        for account, section in [('clienta', 'tweets'), ('clientb', 'tweets'), ('clientb', 'videos')]]
+    assert [(failure.account, failure.section, failure.from_date, type(failure.error))
+            for failure in failed.value.failures] == [('clienta', 'videos', None, StepFailed)]
+    assert [url for tab, url in browser.visits][2:] == [
+        'https://analytics.twitter.com/user/clienta/tweets', 'https://analytics.twitter.com/user/clienta/videos',
+        'https://analytics.twitter.com/user/clienta/videos', 'https://analytics.twitter.com/user/clientb/tweets',
+        'https://analytics.twitter.com/user/clientb/videos']
+    assert browser.logins == 1 and browser.quits == 1
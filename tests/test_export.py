@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+from twitter_analytics.export import HttpExporter
+
+
+class StubAnalyticsHandler(BaseHTTPRequestHandler):
+
+    """ Serves canned CSVs: each report is 'Pending' on the first export request, then 'Available'. """
+
+    protocol_version = 'HTTP/1.1'
+    requested = set()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if self.headers.get('Cookie') != 'auth_token=secret' or not url.path.endswith('/export.json'):
+            return self.reply(403, b'{}')
+        status = 'Available' if url.query in self.requested else 'Pending'
+        self.requested.add(url.query)
+        self.reply(200, json.dumps({'status': status}).encode('utf-8'))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        body = 'Tweet id,path,start_time,end_time\n1,{},{},{}\n'.format(
+            url.path, query['start_time'][0], query['end_time'][0])
+        self.reply(200, body.encode('utf-8'))
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def test_export_many_from_stub_server(tmpdir):
+    server = StubServer(('127.0.0.1', 0), StubAnalyticsHandler)
+    threading.Thread(target=server.serve_forever).start()
+    try:
+        exporter = HttpExporter('SomeUser', [{'name': 'auth_token', 'value': 'secret'}],
+                                base_url='http://127.0.0.1:{}'.format(server.server_port), workers=3,
+                                poll_interval=0)
+        opened = []
+
+        def connect(host, timeout):
+            opened.append(HTTPConnection(host, timeout=timeout))
+            return opened[-1]
+
+        exporter._connection_class = connect
+        ranges = [['01/01/2017', '01/31/2017'], ['02/01/2017', '02/28/2017'], ['03/01/2017', '03/15/2017']]
+        reports = exporter.export_many('tweets', ranges, str(tmpdir))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [os.path.basename(report) for report in reports] == [
+        'someuser_tweets_20170101_20170131.csv',
+        'someuser_tweets_20170201_20170228.csv',
+        'someuser_tweets_20170301_20170315.csv',
+    ]
+    with open(reports[1]) as csvfile:
+        row = csvfile.read().splitlines()[1].split(',')
+    assert row == ['1', '/user/someuser/tweets/bundle', '1485907200000', '1488326400000']
+    # the keep-alive connections of the worker threads are closed with the pool
+    assert opened and all(connection.sock is None for connection in opened)
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+
+# Cold import of the package and use of the pure helpers, in a fresh interpreter.
+IMPORT_SCRIPT = '''
+import sys
+import time
+started = time.perf_counter()
+import twitter_analytics
+from twitter_analytics import ReportDownloader
+ReportDownloader.split_date_range_into_months('01/01/2015', '12/31/2017')
+elapsed = time.perf_counter() - started
+heavy = sorted(set(name.split('.')[0] for name in sys.modules) & set(sys.argv[1:]))
+print(elapsed)
+print(','.join(heavy))
+'''
+
+HEAVY_MODULES = ['selenium', 'pyvirtualdisplay', 'dateutil', 'multiprocessing', 'sqlite3', 'concurrent', 'http']
+
+# Generous budget: the import itself takes a few milliseconds. Going over it means a module now does real work at
+# import time.
+IMPORT_BUDGET_SECONDS = 0.25
+
+
+def test_import_is_cheap_and_does_not_load_browser_dependencies():
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT] + HEAVY_MODULES, universal_newlines=True)
+    elapsed, heavy = output.splitlines()
+    assert heavy == ''
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
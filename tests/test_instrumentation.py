@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from twitter_analytics.instrumentation import Instrumentation
+
+
+class FakeBrowser(object):
+
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, driver_command, params=None):
+        self.commands.append(driver_command)
+        return {'value': None}
+
+
+def test_phases_emit_events_and_add_up():
+    now = [0.0]
+    events = []
+    metrics = Instrumentation(hooks=[events.append], clock=lambda: now[0])
+    with metrics.phase('login', account='someone'):
+        now[0] = 2.5
+    with pytest.raises(ValueError):
+        with metrics.phase('login', account='someone'):
+            now[0] = 3.0
+            raise ValueError()
+
+    assert [(event['event'], event['phase']) for event in events] == [
+        ('start', 'login'), ('end', 'login'), ('start', 'login'), ('end', 'login')]
+    assert events[1]['account'] == 'someone' and events[1]['duration'] == 2.5
+    report = json.loads(metrics.to_json())
+    assert report['totals'] == {'login': {'count': 2, 'seconds': 3.0, 'errors': 1, 'round_trips': 0}}
+    assert report['phases'][1]['error'] == 'ValueError'
+
+
+def test_counts_round_trips_and_sleeps():
+    metrics = Instrumentation()
+    browser = metrics.instrument_browser(FakeBrowser())
+    browser.execute('get', {'url': 'https://analytics.twitter.com/'})
+    browser.execute('findElement')
+    slept = []
+    sleep = metrics.wrap_sleep(slept.append)
+    sleep(1.5)
+    sleep(0.5)
+
+    assert browser.commands == ['get', 'findElement']
+    assert slept == [1.5, 0.5]
+    assert metrics.report()['counters'] == {'webdriver_round_trips': 2, 'sleeps': 2, 'sleep_seconds': 2.0}
+    text = metrics.prometheus_text(labels={'account': 'someone'})
+    assert 'twitter_analytics_webdriver_round_trips_total{account="someone"} 2' in text
@@ -0,0 +1,21 @@
+from datetime import date
+
+from twitter_analytics import ReportDownloader
+from twitter_analytics.manifest import SyncManifest
+
+
+def test_pending_skips_final_windows_and_refetches_changing_ones(tmpdir):
+    manifest = SyncManifest(str(tmpdir.join('manifest.sqlite')), refresh_days=3)
+    ranges = ReportDownloader.split_date_range_into_months('01/15/2017', '04/10/2017')
+
+    # January downloaded long after it closed, February downloaded on its last day, March never downloaded.
+    manifest.record('SomeUser', 'tweets', '01/15/2017', '01/31/2017', 'jan.csv', downloaded_on=date(2017, 3, 1))
+    manifest.record('someuser', 'tweets', '02/01/2017', '02/28/2017', 'feb.csv', downloaded_on=date(2017, 2, 28))
+    manifest.record('someuser', 'videos', '03/01/2017', '03/31/2017', 'mar.csv', downloaded_on=date(2017, 5, 1))
+
+    assert manifest.pending('someuser', 'tweets', ranges) == [
+        ['02/01/2017', '02/28/2017'], ['03/01/2017', '03/31/2017'], ['04/01/2017', '04/10/2017']]
+
+    manifest.record('someuser', 'tweets', '02/01/2017', '02/28/2017', 'feb.csv', downloaded_on=date(2017, 3, 3))
+    assert manifest.pending('someuser', 'tweets', ranges)[0] == ['03/01/2017', '03/31/2017']
+    assert [row[2] for row in manifest.downloaded('someuser', 'tweets')] == ['jan.csv', 'feb.csv']
@@ -0,0 +1,99 @@
+import csv
+import http.client
+import io
+import os
+import platform
+from datetime import date
+from urllib.parse import urlsplit
+
+import pytest
+
+from tests.mock_site import MockAnalyticsSite, mock_downloader_class
+
+
+def request(site, method, path, body=None, cookie=None):
+    connection = http.client.HTTPConnection(*urlsplit(site.url()).netloc.split(':'))
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    if cookie:
+        headers['Cookie'] = cookie
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response, response.read().decode('utf-8')
+
+
+def chromedriver_available():
+    if platform.system().lower() == 'darwin':
+        return os.path.exists('/usr/local/bin/chromedriver')
+    return os.path.exists('/usr/lib/chromium-browser/chromedriver')
+
+
+def test_login_then_export_generated_report():
+    with MockAnalyticsSite(today=date(2020, 1, 15), rows_per_day=2) as site:
+        response, _ = request(site, 'GET', '/user/someone/tweets')
+        assert response.status == 302 and response.getheader('Location') == '/login'
+
+        form = 'session%5Busername_or_email%5D=SomeOne&session%5Bpassword%5D=secret'
+        response, _ = request(site, 'POST', '/sessions', form)
+        cookie = response.getheader('Set-Cookie').split(';')[0]
+        response, _ = request(site, 'GET', '/', cookie=cookie)
+        assert response.getheader('Location') == '/user/someone/home'
+
+        response, page = request(site, 'GET', '/user/someone/tweets', cookie=cookie)
+        assert 'class="btn btn-default ladda-button"' in page
+        assert 'https://ton.twimg.com' not in page and 'display: none; ' in page
+        assert 'new Date(2020, 0, 15)' in page
+
+        response, content = request(site, 'GET', '/user/someone/tweets/export.csv?start_date=01%2F01%2F2019'
+                                                  '&end_date=01%2F31%2F2019', cookie=cookie)
+        assert response.getheader('Content-Disposition') == \
+            'attachment; filename="tweet_activity_metrics_someone_20190101_20190131_en.csv"'
+        assert len(list(csv.DictReader(io.StringIO(content)))) == 62
+        assert site.exports == [('someone', 'tweets', date(2019, 1, 1), date(2019, 1, 31))]
+
+
+@pytest.mark.skipif(not chromedriver_available(), reason='chromedriver is not installed')
+def test_report_downloader_against_mock_site(tmpdir):
+    from twitter_analytics.pacing import Pacer
+
+    with MockAnalyticsSite(today=date(2020, 1, 15), export_failures=1) as site:
+        downloader = mock_downloader_class(site)(
+            'someone', 'password', from_date='11/01/2019', to_date='12/31/2019', download_folder=str(tmpdir),
+            headless=True, pacing=Pacer(jitter=(0, 0), small_jitter=(0, 0)))
+        reports = downloader.run()
+
+    assert [os.path.basename(report) for report in reports] == [
+        'someone_tweets_20191101_20191130.csv', 'someone_tweets_20191201_20191231.csv']
+    assert downloader.metrics.report()['counters']['export_retries'] == 1
+
+
+@pytest.mark.skipif(not chromedriver_available(), reason='chromedriver is not installed')
+def test_sections_and_managed_accounts_in_one_session(tmpdir):
+    from twitter_analytics.pacing import Pacer
+
+    with MockAnalyticsSite(today=date(2020, 1, 15), managed_accounts=['client']) as site:
+        downloader = mock_downloader_class(site)(
+            'agency', 'password', from_date='12/01/2019', to_date='12/31/2019', download_folder=str(tmpdir),
+            section=['tweets', 'videos'], accounts=['agency', 'client'], headless=True,
+            pacing=Pacer(jitter=(0, 0), small_jitter=(0, 0)))
+        reports = downloader.run()
+
+    assert site.logins == ['agency']
+    assert [os.path.relpath(report, str(tmpdir)) for report in reports] == [
+        os.path.join(account, section, '{}_{}_20191201_20191231.csv'.format(account, section))
+        for account in ('agency', 'client') for section in ('tweets', 'videos')]
+
+
+@pytest.mark.skipif(not chromedriver_available(), reason='chromedriver is not installed')
+def test_date_ranges_in_parallel_tabs(tmpdir):
+    from twitter_analytics.pacing import Pacer
+
+    with MockAnalyticsSite(today=date(2020, 1, 15), export_delay=0.5) as site:
+        downloader = mock_downloader_class(site)(
+            'someone', 'password', from_date='09/01/2019', to_date='12/31/2019', download_folder=str(tmpdir),
+            tabs=3, headless=True, pacing=Pacer(jitter=(0, 0), small_jitter=(0, 0)))
+        reports = downloader.run()
+
+    assert [os.path.basename(report) for report in reports] == [
+        'someone_tweets_20190901_20190930.csv', 'someone_tweets_20191001_20191031.csv',
+        'someone_tweets_20191101_20191130.csv', 'someone_tweets_20191201_20191231.csv']
+    assert sorted(export[2].month for export in site.exports) == [9, 10, 11, 12]
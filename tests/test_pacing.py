@@ -0,0 +1,21 @@
+from twitter_analytics.pacing import TokenBucket, get_pacer
+
+
+def test_token_bucket_allows_burst_then_spaces_steps():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+
+
+def test_fast_profile_has_no_jitter():
+    slept = []
+    pacer = get_pacer('fast', account='test_fast_profile')
+    pacer.sleep = slept.append
+    for _ in range(5):
+        pacer.pause()
+    assert slept == []
+    assert 0 < pacer.delay() <= 0.5
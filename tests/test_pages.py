@@ -0,0 +1,127 @@
+from datetime import date
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+from twitter_analytics.calendar import DatePicker
+from twitter_analytics.instrumentation import Instrumentation
+from twitter_analytics.pages import LOCATE_SCRIPT, PROBE_SCRIPT, ReportPage
+
+
+class FakeElement(object):
+
+    def __init__(self, browser, name, args):
+        self.browser = browser
+        self.name = name
+        self.args = args
+        self.generation = browser.generation
+
+    def click(self):
+        if self.generation != self.browser.generation:
+            raise StaleElementReferenceException('redrawn')
+        self.browser.clicks.append(self.name)
+        if self.name in ('prev', 'next'):
+            step = 1 if self.name == 'next' else -1
+            year, month = divmod(self.browser.month.year * 12 + self.browser.month.month - 1 + step, 12)
+            self.browser.month = date(year, month + 1, 1)
+            self.browser.generation += 1        # the calendar is redrawn
+
+
+class FakeBrowser(object):
+
+    """ Report page with a calendar, answering the scripts of the page object. """
+
+    def __init__(self, month=date(2017, 4, 1), error=False):
+        self.month = month
+        self.error = error
+        self.generation = 0
+        self.clicks = []
+        self.commands = []
+
+    def execute(self, driver_command, params=None):
+        self.commands.append(driver_command)
+        script, args = params['script'], params['args']
+        if script == PROBE_SCRIPT:
+            return {'value': {'error': self.error, 'export_present': True, 'export_enabled': True,
+                              'range': 'Last 28 Days', 'calendar_visible': True,
+                              'months': {'left': self.month.strftime('%b %Y'), 'right': None}}}
+        assert script == LOCATE_SCRIPT
+        if args[0] == 'missing':
+            return {'value': None}
+        return {'value': FakeElement(self, args[0], args[1:])}
+
+    def execute_script(self, script, *args):
+        return self.execute('executeScript', {'script': script, 'args': list(args)})['value']
+
+
+def test_probe_answers_the_checks_in_one_round_trip():
+    browser = FakeBrowser(error=True)
+    page = ReportPage(browser, pacer='fast')
+
+    assert page.error_occurred() is True
+    assert page.displayed_month('left') == 'Apr 2017'
+    assert page.wait_for(lambda state: state['export_enabled'])['range'] == 'Last 28 Days'
+    assert browser.commands == ['executeScript'] * 3
+
+
+def test_elements_are_cached_until_the_page_changes():
+    browser = FakeBrowser()
+    page = ReportPage(browser, pacer='fast')
+
+    page.element('export')
+    page.element('export')
+    page.element('next', 'left')
+    assert len(browser.commands) == 2
+
+    page.calendar_changed()
+    page.element('export')
+    page.element('next', 'left')
+    assert len(browser.commands) == 3
+
+    page.reset()
+    page.element('export')
+    assert len(browser.commands) == 4
+
+    try:
+        page.element('missing')
+    except NoSuchElementException:
+        pass
+    else:
+        raise AssertionError('missing element located')
+
+
+def test_click_locates_a_redrawn_element_again():
+    browser = FakeBrowser()
+    page = ReportPage(browser, pacer='fast')
+
+    page.click('next', 'left')
+    page.click('next', 'left')          # cached element is stale after the first click
+
+    assert browser.clicks == ['next', 'next']
+    assert browser.month == date(2017, 6, 1)
+    assert len(browser.commands) == 2
+
+
+def test_date_picker_reads_each_month_once():
+    browser = FakeBrowser(month=date(2017, 1, 1))
+    page = ReportPage(browser, pacer='fast')
+    DatePicker(browser, 'div[@class="calendar left"]', '04/12/2017', pacer='fast', page=page).select_date()
+
+    assert browser.clicks == ['next', 'next', 'next', 'day']
+    # 2 reads of the start month, then a locate and a probe per month, then the day
+    assert len(browser.commands) == 2 + 3 * 2 + 1
+
+
+def test_phases_report_their_round_trips():
+    metrics = Instrumentation()
+    browser = metrics.instrument_browser(FakeBrowser())
+    page = ReportPage(browser, pacer='fast')
+    with metrics.phase('set_report_period'):
+        page.probe()
+        page.click('next', 'left')
+    with metrics.phase('download_report'):
+        page.error_occurred()
+
+    report = metrics.report()
+    assert [phase['round_trips'] for phase in report['phases']] == [2, 1]
+    assert report['totals']['set_report_period']['round_trips'] == 2
+    assert 'twitter_analytics_phase_round_trips_total{phase="download_report"} 1' in metrics.prometheus_text()
@@ -0,0 +1,43 @@
+import os
+import time
+
+from twitter_analytics.planner import RangePlanner, local_report_ranges
+
+
+def test_largest_policy_needs_fewer_exports_than_months():
+    months = RangePlanner('months').plan('01/01/2015', '12/31/2017')
+    largest = RangePlanner('largest').plan('01/01/2015', '12/31/2017')
+    assert len(months) == 36
+    assert len(largest) == 13
+    assert largest.ranges()[0] == ['01/01/2015', '04/01/2015'] and largest.ranges()[-1][1] == '12/31/2017'
+    assert largest.downloaded_days == largest.requested_days == 1096
+    assert largest.estimated_seconds < months.estimated_seconds
+
+
+def test_covered_ranges_are_subtracted_and_small_gaps_merged():
+    planner = RangePlanner('largest', max_redownload_days=7)
+    plan = planner.plan('01/01/2017', '06/30/2017', covered=[['01/01/2017', '01/31/2017'],
+                                                             ['03/01/2017', '03/05/2017']])
+    # February and March 6th onwards are separated by 5 downloaded days: one export instead of two
+    assert plan.ranges() == [['02/01/2017', '05/02/2017'], ['05/03/2017', '06/30/2017']]
+    assert plan.covered_days == 36
+
+    plan = RangePlanner('largest', max_redownload_days=3).plan(
+        '01/01/2017', '06/30/2017', covered=[['01/01/2017', '01/31/2017'], ['03/01/2017', '03/05/2017']])
+    assert plan.ranges() == [['02/01/2017', '02/28/2017'], ['03/06/2017', '06/04/2017'], ['06/05/2017', '06/30/2017']]
+
+
+def test_months_policy_skips_covered_months():
+    plan = RangePlanner('months').plan('01/01/2017', '03/31/2017', covered=[['02/01/2017', '02/28/2017']])
+    assert plan.ranges() == [['01/01/2017', '01/31/2017'], ['03/01/2017', '03/31/2017']]
+
+
+def test_local_report_ranges_only_counts_final_reports(tmpdir):
+    folder = str(tmpdir)
+    for name in ('someuser_tweets_20170101_20170131.csv', 'someuser_tweets_20170201_20170228.csv',
+                 'someuser_videos_20170101_20170131.csv', 'other_tweets_20170101_20170131.csv'):
+        open(os.path.join(folder, name), 'w').close()
+    written_early = time.mktime((2017, 3, 1, 12, 0, 0, 0, 0, -1))
+    os.utime(os.path.join(folder, 'someuser_tweets_20170201_20170228.csv'), (written_early, written_early))
+
+    assert local_report_ranges(folder, 'SomeUser', 'tweets') == [['01/01/2017', '01/31/2017']]
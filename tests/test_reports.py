@@ -0,0 +1,61 @@
+import os
+
+from twitter_analytics.reports import ReportTable, read_rows
+
+
+HEADER = 'Tweet id,Tweet permalink,Tweet text,time,impressions,engagements,engagement rate,promoted impressions\n'
+
+
+def write_report(folder, name, rows, mtime):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as report:
+        report.write(HEADER)
+        for row in rows:
+            report.write(row + '\n')
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_rows_are_typed_and_deduplicated_keeping_newest_snapshot(tmpdir):
+    old = write_report(str(tmpdir), 'old.csv', [
+        '1,https://twitter.com/u/status/1,"hello, world",2017-01-31 10:00 +0000,100,5,0.05,-',
+        '2,https://twitter.com/u/status/2,second,2017-02-01 12:30 +0000,10,0,0.0,-',
+    ], mtime=1000)
+    new = write_report(str(tmpdir), 'new.csv', [
+        '1,https://twitter.com/u/status/1,"hello, world",2017-01-31 10:00 +0000,150,6,0.04,20',
+    ], mtime=2000)
+
+    rows = list(read_rows([old, new]))
+    assert [row['Tweet id'] for row in rows] == [1, 2]
+    assert rows[0]['impressions'] == 150
+    assert rows[0]['promoted impressions'] == 20
+    assert rows[0]['time'] == 1485856800
+    assert rows[1]['promoted impressions'] is None
+
+    table = ReportTable.from_reports([old, new])
+    assert len(table) == 2
+    assert table.total('impressions') == 160
+    assert table.column('engagement rate').typecode == 'd'
+    assert 'Tweet text' not in table.text
+    # the promoted impressions of the organic tweet are missing, not 0
+    promoted = table.column('promoted impressions')
+    assert promoted.typecode == 'd' and promoted[0] == 20 and promoted[1] != promoted[1]
+    assert table.total('promoted impressions') == 20
+
+
+def test_only_the_known_metrics_are_parsed_into_numbers(tmpdir):
+    path = os.path.join(str(tmpdir), 'report.csv')
+    with open(path, 'w') as report:
+        report.write('Tweet id,time,impressions,engagement rate,Promoted likes,source,campaign\n')
+        report.write('1,2017-01-31 10:00 +0000,,-,3,Twitter Web App,0012\n')
+
+    row, = read_rows([path])
+    assert row['impressions'] is None and row['engagement rate'] != row['engagement rate']
+    assert row['Promoted likes'] == 3
+    assert row['source'] == 'Twitter Web App' and row['campaign'] == '0012'
+    assert 'source' not in next(read_rows([path], keep_text=False))
+
+    table = ReportTable.from_reports([path], keep_text=True)
+    assert table.text['campaign'] == ['0012']
+    assert sorted(table.columns) == ['Promoted likes', 'Tweet id', 'engagement rate', 'impressions', 'time']
+    assert table.column('impressions').typecode == 'd'
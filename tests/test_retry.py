@@ -0,0 +1,223 @@
+import os
+
+import pytest
+
+from twitter_analytics.downloader import ReportDownloader
+from twitter_analytics.instrumentation import Instrumentation
+from twitter_analytics.pacing import Pacer
+from twitter_analytics.retry import CircuitBreaker, CircuitOpen, RangeQueue, RetryPolicy, RetryScheduler, StepFailed
+from twitter_analytics.watcher import DownloadTimeout
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_policy_delays_grow_exponentially_with_jitter_and_a_cap():
+    policy = RetryPolicy(base_delay=1.0, factor=2.0, max_delay=5.0, jitter=0.5)
+    for retry, full in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+        assert full / 2 <= policy.delay(retry) <= full
+    assert RetryPolicy(base_delay=3.0, jitter=0).delay(2) == 6.0
+
+
+def test_call_retries_with_backoff_then_gives_up():
+    clock = FakeClock()
+    retried = []
+    scheduler = RetryScheduler({'calendar': RetryPolicy(attempts=3, base_delay=1.0, jitter=0)}, sleep=clock.sleep,
+                               clock=clock, on_retry=retried.append)
+    calls = []
+
+    def flaky():
+        calls.append(clock.now)
+        if len(calls) < 3:
+            raise ValueError('calendar not ready')
+        return 'selected'
+
+    assert scheduler.call('calendar', flaky) == 'selected'
+    assert calls == [0.0, 1.0, 3.0] and retried == ['calendar', 'calendar']
+
+    def broken():
+        raise ValueError('calendar gone')
+
+    with pytest.raises(StepFailed) as failure:
+        scheduler.call('calendar', broken)
+    assert isinstance(failure.value.__cause__, ValueError)
+
+
+def test_call_stops_at_the_deadline_of_the_step():
+    clock = FakeClock()
+    scheduler = RetryScheduler({'navigation': RetryPolicy(attempts=10, base_delay=4.0, jitter=0, deadline=10)},
+                               sleep=clock.sleep, clock=clock)
+
+    def broken():
+        raise ValueError('page not loaded')
+
+    with pytest.raises(StepFailed):
+        scheduler.call('navigation', broken)
+    assert clock.slept == [4.0]       # the second retry would end after the deadline
+
+
+def test_export_attempt_spaces_the_clicks_and_gives_up():
+    clock = FakeClock()
+    scheduler = RetryScheduler({'export': RetryPolicy(attempts=3, base_delay=2.0, jitter=0)}, clock=clock)
+    attempt = scheduler.start('export', deadline=60)
+    assert attempt.remaining() == 60 and not attempt.waiting
+
+    attempt.failed()
+    assert attempt.waiting and not attempt.ready()
+    clock.now = 2.0
+    assert attempt.ready()
+    attempt.retrying()
+    assert not attempt.waiting
+
+    attempt.failed()
+    with pytest.raises(StepFailed):
+        attempt.failed()
+    clock.now = 60.0
+    assert attempt.expired()
+
+
+def test_circuit_breaker_opens_after_consecutive_failures_then_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=2, cooldown=100, clock=clock)
+    breaker.record_failure('bad')
+    breaker.record_success('bad')
+    breaker.record_failure('bad')
+    assert breaker.allows('bad')
+    breaker.record_failure('bad')
+    assert breaker.is_open('bad') and breaker.allows('good')
+    clock.now = 100.0
+    assert breaker.allows('bad')        # one more try
+    breaker.record_failure('bad')
+    assert breaker.is_open('bad')
+
+
+def test_range_queue_requeues_failed_ranges_after_the_others():
+    clock = FakeClock()
+    queue = RangeQueue(['a', 'b', 'c'], max_requeues=1, policy=RetryPolicy(base_delay=5.0, jitter=0), clock=clock)
+    assert queue.pop() == (0, 'a')
+    assert queue.requeue(0, 'a', ValueError())
+    assert [queue.pop(), queue.pop(), queue.pop()] == [(1, 'b'), (2, 'c'), None]
+    assert queue.wait_time() == 5.0
+    clock.now = 5.0
+    assert queue.pop() == (0, 'a')
+    assert not queue.requeue(0, 'a', ValueError())
+    assert len(queue) == 0 and [failed[:2] for failed in queue.failed] == [(0, 'a')]
+
+
+class OfflineDownloader(ReportDownloader):
+
+    """ ReportDownloader without browser, whose exports fail `failures[from_date]` times. """
+
+    def __init__(self, failures, breaker=None):
+        self.clock = FakeClock()
+        self.account = 'someuser'
+        self.section = 'tweets'
+        self.manifest = None
+        self.download_timeout = 300
+        self.metrics = Instrumentation()
+        self.failures = list()
+        self.pacer = Pacer(jitter=(0, 0), small_jitter=(0, 0), sleep=self.clock.sleep)
+        self.retry = RetryScheduler({'export': RetryPolicy(attempts=5, base_delay=2.0, jitter=0)},
+                                    breaker=breaker or CircuitBreaker(clock=self.clock), sleep=self.clock.sleep,
+                                    clock=self.clock).bind(self.clock.sleep)
+        self.export_failures = dict(failures)
+        self.pages = 0
+        self.exports = []
+
+    def go_to_section_page(self, section):
+        self.pages += 1
+
+    def set_report_period(self, from_date, to_date):
+        pass
+
+    def download_report(self, from_date=None, to_date=None, section=None):
+        self.exports.append(from_date)
+        if self.export_failures.get(from_date, 0):
+            self.export_failures[from_date] -= 1
+            raise DownloadTimeout('No report for {}'.format(from_date))
+        return '{}.csv'.format(from_date)
+
+
+def test_failed_ranges_are_requeued_then_given_up_without_blocking_the_run():
+    downloader = OfflineDownloader({'02': 1, '03': 5})
+    ranges = [['01', '01'], ['02', '02'], ['03', '03'], ['04', '04']]
+    assert downloader.download_ranges('tweets', ranges) == ['01.csv', '02.csv', '04.csv']
+    assert downloader.exports == ['01', '02', '03', '04', '02', '03', '03']
+    assert [(failure.from_date, type(failure.error)) for failure in downloader.failures] == [('03', DownloadTimeout)]
+    assert downloader.pages == 4      # the page is loaded again after every failure
+    assert downloader.metrics.counters['requeued_ranges'] == 3
+    assert downloader.metrics.counters['failed_ranges'] == 1
+
+
+def test_open_circuit_stops_the_exports_of_an_account():
+    breaker = CircuitBreaker(threshold=2, clock=lambda: 0.0)
+    downloader = OfflineDownloader({'01': 5, '02': 5}, breaker=breaker)
+    ranges = [['01', '01'], ['02', '02'], ['03', '03']]
+    assert downloader.download_ranges('tweets', ranges) == []
+    assert downloader.exports == ['01', '02']
+    assert all(isinstance(failure.error, CircuitOpen) for failure in downloader.failures[1:])
+    assert len(downloader.failures) == 3
+
+
+class CookieBrowser(object):
+
+    def execute_script(self, script):
+        return 'test agent'
+
+    def get_cookies(self):
+        return [{'name': 'auth_token', 'value': 'secret'}]
+
+
+def test_http_export_failures_are_given_up_with_the_other_reports(tmpdir, monkeypatch):
+    from twitter_analytics.export import ExportError, HttpExporter
+
+    calls = []
+
+    def export(exporter, section, from_date, to_date):
+        calls.append(from_date)
+        if from_date == '02/01/2017':
+            raise ExportError('Export of {} - {} failed with HTTP 500'.format(from_date, to_date))
+        return b'Tweet id\n1\n'
+
+    monkeypatch.setattr(HttpExporter, 'export', export)
+    downloader = OfflineDownloader({})
+    downloader.browser = CookieBrowser()
+    downloader.download_folder = str(tmpdir)
+    downloader.accounts = ['someuser']
+    downloader.sections = ['tweets']
+    downloader.http_workers = 2
+    downloader.labels = dict()
+    ranges = [['01/01/2017', '01/31/2017'], ['02/01/2017', '02/28/2017'], ['03/01/2017', '03/31/2017']]
+
+    reports = downloader.download_http_export('tweets', ranges)
+    assert [os.path.basename(report) for report in reports] == [
+        'someuser_tweets_20170101_20170131.csv', 'someuser_tweets_20170301_20170331.csv']
+    assert calls.count('02/01/2017') == 5       # attempts of the export policy
+    assert [(failure.from_date, type(failure.error)) for failure in downloader.failures] == [
+        ('02/01/2017', StepFailed)]
+
+
+def test_run_quits_the_browser_when_it_fails():
+    downloader = OfflineDownloader({})
+    downloader.has_date_range = False
+    quit = []
+    downloader.quit = lambda: quit.append(True)
+
+    def start_session():
+        raise ValueError('login form not found')
+
+    downloader.start_session = start_session
+    with pytest.raises(ValueError):
+        downloader.run()
+    assert quit == [True]
@@ -0,0 +1,74 @@
+import csv
+import io
+import os
+import shutil
+import time
+from datetime import date
+
+from tests.mock_site import generate_report
+from twitter_analytics.reports import read_rows
+from twitter_analytics.rollup import DailyRollup
+
+
+def write_report(folder, name, from_date, to_date, written_at, extra_impressions=0):
+    rows = list(csv.reader(io.StringIO(generate_report('someuser', from_date, to_date, rows_per_day=2))))
+    for row in rows[1:]:
+        row[4] = str(int(row[4]) + extra_impressions)
+    path = os.path.join(folder, name)
+    with open(path, 'w', newline='') as report:
+        csv.writer(report).writerows(rows)
+    os.utime(path, (written_at, written_at))
+    return path
+
+
+def expected_total(paths, metric, first_day, last_day):
+    """ Brute force: newest snapshot of every tweet, summed over the days. """
+    return sum(row[metric] for row in read_rows(paths, keep_text=False)
+               if first_day <= time.strftime('%Y-%m-%d', time.gmtime(row['time'])) <= last_day)
+
+
+def test_rollup_sums_the_newest_snapshots_incrementally(tmpdir):
+    folder = str(tmpdir)
+    january = write_report(folder, 'someuser_tweets_20170120_20170210.csv', date(2017, 1, 20), date(2017, 2, 10), 1000)
+    rollup = DailyRollup(os.path.join(folder, 'rollup.sqlite'))
+    assert rollup.add_reports('SomeUser', [january]) == 1
+    assert rollup.total('someuser', 'impressions', '01/01/2017', '01/31/2017') == \
+        expected_total([january], 'impressions', '2017-01-01', '2017-01-31')
+    assert rollup.daily('someuser', 'tweets', '01/30/2017', '02/01/2017') == [
+        ('01/30/2017', 2), ('01/31/2017', 2), ('02/01/2017', 2)]
+
+    copy = os.path.join(folder, 'copy.csv')
+    shutil.copy(january, copy)
+    assert rollup.add_reports('someuser', [january, copy]) == 0
+
+    # Newer snapshot of some tweets, with more impressions, and an older one which must not win.
+    february = write_report(folder, 'someuser_tweets_20170205_20170215.csv', date(2017, 2, 5), date(2017, 2, 15), 2000,
+                            extra_impressions=10)
+    stale = write_report(folder, 'someuser_tweets_20170201_20170207.csv', date(2017, 2, 1), date(2017, 2, 7), 500,
+                         extra_impressions=-5)
+    assert rollup.add_reports('someuser', [stale, february]) == 2
+    assert rollup.is_indexed(stale)
+
+    everything = [january, february, stale]
+    for metric in ('impressions', 'engagements', 'retweets'):
+        assert rollup.total('someuser', metric) == expected_total(everything, metric, '2017-01-01', '2017-12-31')
+    assert rollup.total('someuser', 'impressions', '02/05/2017', '02/10/2017') == \
+        expected_total([january], 'impressions', '2017-02-05', '2017-02-10') + 6 * 2 * 10
+    assert rollup.total('someuser', 'tweets') == (12 + 15) * 2
+    assert rollup.total('otheruser', 'impressions') == 0
+    assert 'engagement rate' not in rollup.metrics('someuser')
+    rollup.close()
+
+
+def test_missing_metrics_and_text_columns_are_not_summed(tmpdir):
+    path = os.path.join(str(tmpdir), 'someuser_tweets_20170101_20170131.csv')
+    with open(path, 'w') as report:
+        report.write('Tweet id,time,impressions,promoted impressions,source\n')
+        report.write('1,2017-01-31 10:00 +0000,100,-,Twitter Web App\n')
+        report.write('2,2017-01-31 11:00 +0000,50,10,Twitter for iPhone\n')
+    rollup = DailyRollup(os.path.join(str(tmpdir), 'rollup.sqlite'))
+    rollup.add_reports('someuser', [path])
+
+    assert rollup.metrics('someuser') == ['impressions', 'promoted impressions', 'tweets']
+    assert rollup.total('someuser', 'impressions') == 150
+    assert rollup.total('someuser', 'promoted impressions') == 10
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from twitter_analytics import downloader as downloader_module
+from twitter_analytics.instrumentation import Instrumentation
+from twitter_analytics.retry import DownloadFailed, FailedRange
+from twitter_analytics.runner import DownloadJob, run_job, run_many
+
+
+class FakeDownloader(object):
+
+    """ Stands for ReportDownloader: 'broken' accounts fail, 'partial' accounts lose a date range. """
+
+    instances = []
+
+    def __init__(self, username, password, from_date=None, to_date=None, download_folder=None, section='tweets',
+                 **options):
+        if username == 'nobrowser':
+            raise OSError('chromedriver not found')
+        self.username = username
+        self.download_folder = download_folder
+        self.options = options
+        self.metrics = Instrumentation()
+        self.quits = 0
+        self.instances.append(self)
+
+    def run(self):
+        report = os.path.join(self.download_folder, '{}_tweets.csv'.format(self.username))
+        try:
+            if self.username == 'broken':
+                raise ValueError('login failed')
+            if self.username == 'partial':
+                raise DownloadFailed([FailedRange('partial', 'tweets', '02/01/2017', '02/28/2017', ValueError())],
+                                     [report])
+            return [report]
+        finally:
+            self.quit()
+
+    def quit(self):
+        self.quits += 1
+
+
+@pytest.fixture
+def fake_downloader(monkeypatch):
+    FakeDownloader.instances = []
+    monkeypatch.setattr(downloader_module, 'ReportDownloader', FakeDownloader)
+    return FakeDownloader
+
+
+def test_coerce_accepts_jobs_dicts_and_tuples():
+    job = DownloadJob('someuser', 'password', 'videos', options={'lean': True})
+    assert DownloadJob.coerce(job) is job
+    assert DownloadJob.coerce({'username': 'someuser', 'password': 'password', 'section': 'videos',
+                               'options': {'lean': True}}) == job
+    assert DownloadJob.coerce(('someuser', 'password', 'videos', None, None, {'lean': True})) == job
+    assert DownloadJob('someuser', 'password').options == {}
+
+
+def test_folder_names_are_unique_per_job():
+    assert DownloadJob('SomeUser', 'password', from_date='01/01/2017', to_date='01/31/2017').folder_name(3) == \
+        '0003_someuser_tweets_20170101_20170131'
+    assert DownloadJob('someuser', 'password', ['tweets', 'videos']).folder_name(12) == \
+        '0012_someuser_tweets-videos_last28days'
+
+
+def test_errors_are_reported_in_the_results_in_job_order(tmpdir, fake_downloader):
+    jobs = [('good', 'password'), ('broken', 'password'), ('partial', 'password'), ('nobrowser', 'password')]
+    results = run_many(jobs, workers=1, download_folder=str(tmpdir))
+
+    assert [result.username for result in results] == ['good', 'broken', 'partial', 'nobrowser']
+    good, broken, partial, nobrowser = results
+    assert good.error is None and good.reports == [os.path.join(good.download_folder, 'good_tweets.csv')]
+    assert good.download_folder == os.path.join(str(tmpdir), '0000_good_tweets_last28days')
+    assert os.path.isdir(good.download_folder)
+    assert 'ValueError: login failed' in broken.error and broken.reports == []
+    assert 'DownloadFailed' in partial.error and len(partial.reports) == 1
+    assert 'chromedriver not found' in nobrowser.error and nobrowser.metrics is None
+    assert good.metrics['counters'] == {}
+
+    # run() quits the browser itself, even when it fails: it is not quit a second time
+    assert [instance.quits for instance in fake_downloader.instances] == [1, 1, 1]
+
+
+def test_jobs_run_in_worker_processes(tmpdir):
+    # The jobs fail in the downloader constructor, before any display or browser is started.
+    jobs = [DownloadJob('user{}'.format(i), 'password', options={'headless': True, 'export_mode': 'ftp'})
+            for i in range(3)]
+    results = run_many(jobs, workers=2, download_folder=str(tmpdir))
+
+    assert [result.username for result in results] == ['user0', 'user1', 'user2']
+    for index, result in enumerate(results):
+        assert 'Unknown export mode' in result.error and result.reports == [] and result.metrics is None
+        assert result.download_folder == os.path.join(str(tmpdir), jobs[index].folder_name(index))
+        assert os.path.isdir(result.download_folder)
+
+
+def test_run_job_passes_the_options(tmpdir, fake_downloader):
+    result = run_job(DownloadJob('good', 'password', options={'lean': True}), str(tmpdir))
+    assert result.error is None
+    assert fake_downloader.instances[0].options == {'lean': True}
@@ -0,0 +1,75 @@
+import os
+import stat
+
+import pytest
+
+from twitter_analytics.retry import DownloadFailed, FailedRange
+from twitter_analytics.session import SessionStore, WarmBrowser
+
+
+class FakeBrowser(object):
+
+    def __init__(self, current_url, cookies):
+        self.current_url = current_url
+        self.cookies = cookies
+        self.added = []
+
+    def get_cookies(self):
+        return self.cookies
+
+    def add_cookie(self, cookie):
+        self.added.append(cookie)
+
+
+def test_cookies_are_merged_and_restored_per_domain(tmpdir):
+    store = SessionStore(str(tmpdir))
+    store.save_cookies('SomeUser', FakeBrowser('https://twitter.com/home', [
+        {'domain': '.twitter.com', 'name': 'auth_token', 'value': 'old', 'expiry': 1.5e9},
+        {'domain': 'twitter.com', 'name': 'lang', 'value': 'en'},
+    ]))
+    store.save_cookies('someuser', FakeBrowser('https://analytics.twitter.com/user/someuser/home', [
+        {'domain': '.twitter.com', 'name': 'auth_token', 'value': 'new', 'sameSite': 'None'},
+        {'domain': 'analytics.twitter.com', 'name': 'csrf', 'value': 'x'},
+    ]))
+    assert len(store.load_cookies('someuser')) == 3
+
+    browser = FakeBrowser('https://analytics.twitter.com/about', [])
+    assert store.restore_cookies('someuser', browser) == 2
+    assert {'domain': '.twitter.com', 'name': 'auth_token', 'value': 'new'} in browser.added
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX file modes')
+def test_cookies_are_only_readable_by_the_user(tmpdir):
+    store = SessionStore(str(tmpdir))
+    store.save_cookies('someuser', FakeBrowser('https://twitter.com/home', [{'name': 'auth_token', 'value': 'x'}]))
+
+    assert stat.S_IMODE(os.stat(store.account_dir('someuser')).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(store.cookies_path('someuser')).st_mode) == 0o600
+
+
+class FailingDownloader(object):
+
+    username = 'someuser'
+
+    def __init__(self):
+        self.failures = []
+
+    def start_session(self):
+        pass
+
+    def download(self, section, from_date, to_date, account):
+        if section == 'videos':
+            self.failures.append(FailedRange(account, section, from_date, to_date, ValueError('export failed')))
+            return []
+        return ['someuser_tweets_20170101_20170131.csv']
+
+
+def test_warm_browser_raises_the_failures_of_each_run():
+    browser = WarmBrowser.__new__(WarmBrowser)
+    browser.downloader = FailingDownloader()
+    browser.started = False
+
+    with pytest.raises(DownloadFailed) as failure:
+        browser.run('videos', '01/01/2017', '01/31/2017')
+    assert [(failed.section, failed.from_date) for failed in failure.value.failures] == [('videos', '01/01/2017')]
+    assert browser.run('tweets') == ['someuser_tweets_20170101_20170131.csv']     # earlier failures not raised again
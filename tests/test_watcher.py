@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+import pytest
+
+from twitter_analytics.watcher import DownloadTimeout, DownloadWatcher, report_matcher
+
+
+def write_download(folder, name, delay=0.1):
+    time.sleep(delay)
+    partial = os.path.join(folder, name + '.crdownload')
+    with open(partial, 'w') as report:
+        report.write('Tweet id\n1\n')
+    os.rename(partial, os.path.join(folder, name))
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_wait_for_file_attributes_and_renames_report(tmpdir, use_inotify):
+    folder = str(tmpdir)
+    open(os.path.join(folder, 'tweet_activity_metrics_someuser_20170101_20170131_en.csv'), 'w').close()
+
+    with DownloadWatcher(folder, timeout=5, poll_frequency=0.05, use_inotify=use_inotify) as watcher:
+        threading.Thread(target=write_download,
+                         args=(folder, 'tweet_activity_metrics_other_20170201_20170228_en.csv')).start()
+        threading.Thread(target=write_download,
+                         args=(folder, 'tweet_activity_metrics_someuser_20170201_20170228_en.csv', 0.2)).start()
+        path = watcher.wait_for_file(match=report_matcher('SomeUser', '02/01/2017', '02/28/2017'),
+                                     rename_to='someuser_tweets_20170201_20170228.csv')
+
+    assert path == os.path.join(folder, 'someuser_tweets_20170201_20170228.csv')
+    assert 'tweet_activity_metrics_other_20170201_20170228_en.csv' in os.listdir(folder)
+
+
+def test_wait_for_file_times_out(tmpdir):
+    calls = []
+    with DownloadWatcher(str(tmpdir), timeout=0.2, poll_frequency=0.05) as watcher:
+        with pytest.raises(DownloadTimeout):
+            watcher.wait_for_file(on_idle=lambda: calls.append(1))
+    assert calls
+
+
+def test_claim_file_moves_report_to_subfolder(tmpdir):
+    folder = str(tmpdir)
+    with DownloadWatcher(folder, use_inotify=False) as watcher:
+        write_download(folder, 'video_activity_metrics_client_20170201_20170228_en.csv', delay=0)
+        path = watcher.claim_file(match=report_matcher('client'),
+                                  rename_to=os.path.join('client', 'videos', 'client_videos_20170201_20170228.csv'))
+        assert watcher.claim_file() is None
+
+    assert path == os.path.join(folder, 'client', 'videos', 'client_videos_20170201_20170228.csv')
+    assert os.path.exists(path)
+
+
+def test_new_folders_are_not_claimed(tmpdir):
+    folder = str(tmpdir)
+    with DownloadWatcher(folder, use_inotify=False) as watcher:
+        os.makedirs(os.path.join(folder, 'otheruser', 'tweets'))
+        assert watcher.claim_file() is None
+        write_download(folder, 'tweet_activity_metrics_someuser_20170201_20170228_en.csv', delay=0)
+        assert watcher.claim_file() == os.path.join(folder, 'tweet_activity_metrics_someuser_20170201_20170228_en.csv')
+
+
+def test_claim_any_attributes_reports_by_start_date(tmpdir):
+    folder = str(tmpdir)
+    expected = {
+        'january': (report_matcher('someuser', '01/01/2017', '01/31/2017'), 'someuser_tweets_20170101_20170131.csv'),
+        'february': (report_matcher('someuser', '02/01/2017', '02/28/2017'), 'someuser_tweets_20170201_20170228.csv'),
+    }
+    with DownloadWatcher(folder, use_inotify=False) as watcher:
+        write_download(folder, 'tweet_activity_metrics_someuser_20170201_20170301_en.csv', delay=0)
+        assert watcher.claim_any(expected) == {
+            'february': os.path.join(folder, 'someuser_tweets_20170201_20170228.csv')}
+        write_download(folder, 'tweet_activity_metrics_someuser_20170101_20170201_en.csv', delay=0)
+        assert watcher.claim_any(expected) == {
+            'january': os.path.join(folder, 'someuser_tweets_20170101_20170131.csv')}
+
+
+def test_report_matcher_checks_section_account_and_renamed_reports():
+    match = report_matcher('bob', '01/01/2017', '01/31/2017', 'tweets')
+    assert match('tweet_activity_metrics_bob_20170101_20170131_en.csv')
+    assert match('tweet_activity_metrics_BOB_20170101_20170131_en (1).csv')
+    assert not match('tweet_activity_metrics_bobby_20170101_20170131_en.csv')
+    assert not match('tweet_activity_metrics_bob_smith_20170101_20170131_en.csv')
+    assert not match('video_activity_metrics_bob_20170101_20170131_en.csv')
+    assert not match('tweet_activity_metrics_bob_20170201_20170228_en.csv')
+    assert not report_matcher('bob')('bob_tweets_20170101_20170131.csv')
+
+
+def test_watchers_of_two_sections_share_a_folder(tmpdir):
+    folder = str(tmpdir)
+    with DownloadWatcher(folder, use_inotify=False) as tweets, DownloadWatcher(folder, use_inotify=False) as videos:
+        write_download(folder, 'tweet_activity_metrics_someuser_20170101_20170131_en.csv', delay=0)
+        assert videos.claim_file(match=report_matcher('someuser', '01/01/2017', '01/31/2017', 'videos'),
+                                 rename_to='someuser_videos_20170101_20170131.csv') is None
+        tweets_path = tweets.claim_file(match=report_matcher('someuser', '01/01/2017', '01/31/2017', 'tweets'),
+                                        rename_to='someuser_tweets_20170101_20170131.csv')
+
+        write_download(folder, 'video_activity_metrics_someuser_20170101_20170131_en.csv', delay=0)
+        assert tweets.claim_file(match=report_matcher('someuser', section='tweets'),
+                                 rename_to='someuser_tweets_20170101_20170131.csv') is None
+        videos_path = videos.claim_file(match=report_matcher('someuser', '01/01/2017', '01/31/2017', 'videos'),
+                                        rename_to='someuser_videos_20170101_20170131.csv')
+
+    assert tweets_path == os.path.join(folder, 'someuser_tweets_20170101_20170131.csv')
+    assert videos_path == os.path.join(folder, 'someuser_videos_20170101_20170131.csv')
+    assert sorted(os.listdir(folder)) == ['someuser_tweets_20170101_20170131.csv',
+                                          'someuser_videos_20170101_20170131.csv']
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from twitter_analytics import workqueue
+from twitter_analytics.runner import DownloadJob, JobResult
+from twitter_analytics.workqueue import Coordinator, FileQueue, SQLiteQueue, Worker
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1500040000.0     # 07/14/2017 around noon, whatever the time zone
+
+    def __call__(self):
+        return self.now
+
+
+def make_queue(kind, folder, clock):
+    if kind == 'sqlite':
+        return SQLiteQueue(os.path.join(folder, 'queue.sqlite'), clock=clock)
+    return FileQueue(os.path.join(folder, 'queue'), clock=clock)
+
+
+def item(from_date, to_date, account='someuser'):
+    return {'username': 'someuser', 'account': account, 'section': 'tweets', 'from_date': from_date,
+            'to_date': to_date, 'options': {}}
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'file'])
+def test_leases_renewals_and_expired_leases(tmpdir, kind):
+    clock = FakeClock()
+    queue = make_queue(kind, str(tmpdir), clock)
+    assert queue.put([item('01/01/2017', '01/31/2017'), item('02/01/2017', '02/28/2017')], max_attempts=2) == 2
+    assert queue.put([item('01/01/2017', '01/31/2017')]) == 0      # already pending
+
+    first = queue.lease('host-a', 60)
+    second = queue.lease('host-b', 60)
+    assert (first.from_date, second.from_date, first.attempts) == ('01/01/2017', '02/01/2017', 1)
+    assert queue.lease('host-c', 60) is None
+
+    clock.now += 50
+    assert queue.renew(first.job_id, 'host-a', 60)
+    assert not queue.renew(first.job_id, 'host-b', 60)
+    clock.now += 20                 # the lease of host-b expired, host-a renewed its own
+    again = queue.lease('host-c', 60)
+    assert (again.job_id, again.attempts) == (second.job_id, 2)
+    assert not queue.complete(second.job_id, 'host-b', {})
+    assert queue.complete(first.job_id, 'host-a', {'reports': ['january.csv']})
+
+    assert queue.fail(again.job_id, 'host-c', 'Traceback...')
+    assert queue.counts() == {'done': 1, 'failed': 1}
+    assert queue.completed('someuser', 'tweets') == [('01/01/2017', '01/31/2017', '2017-07-14')]
+
+    assert queue.put([item('02/01/2017', '02/28/2017')]) == 1       # a failed job can be queued again
+    assert queue.lease('host-a', 60).attempts == 1
+
+
+def test_coordinator_expands_accounts_sections_and_ranges(tmpdir):
+    clock = FakeClock()
+    queue = make_queue('sqlite', str(tmpdir), clock)
+    coordinator = Coordinator(queue)
+    job = DownloadJob('Agency', 'not stored', ['tweets', 'videos'], '11/01/2016', '01/31/2017',
+                      options={'accounts': ['agency', 'Client'], 'lean': True})
+    assert coordinator.enqueue([job]) == 2 * 2 * 3
+
+    queued = [queue.lease('host', 60) for _ in range(12)]
+    assert [(job.account, job.section, job.from_date) for job in queued[:4]] == [
+        ('agency', 'tweets', '11/01/2016'), ('agency', 'tweets', '12/01/2016'), ('agency', 'tweets', '01/01/2017'),
+        ('agency', 'videos', '11/01/2016')]
+    assert queued[-1][1:6] == ('agency', 'client', 'videos', '01/01/2017', '01/31/2017')
+    assert queued[0].options == {'lean': True}
+    with open(queue.path, 'rb') as content:
+        assert b'not stored' not in content.read()
+
+    for queued_job in queued:
+        queue.complete(queued_job.job_id, 'host', {})
+    # completed on 07/14/2017: final windows are skipped the next night
+    assert coordinator.expand(job) == []
+
+
+def test_worker_publishes_reports_and_completes_jobs(tmpdir, monkeypatch):
+    ran = []
+
+    def fake_run_job(job, download_folder):
+        ran.append(job)
+        os.makedirs(download_folder, exist_ok=True)
+        path = os.path.join(download_folder, '{}_{}_report.csv'.format(job.options['accounts'][0], job.section))
+        with open(path, 'w') as report:
+            report.write('Tweet id\n')
+        error = 'Traceback: export failed' if job.from_date == '02/01/2017' else None
+        return JobResult(job.username, job.section, job.from_date, job.to_date, download_folder, [path], error, 1.0)
+
+    monkeypatch.setattr(workqueue, 'run_job', fake_run_job)
+    queue = make_queue('file', str(tmpdir), FakeClock())
+    queue.put([item('01/01/2017', '01/31/2017', 'client'), item('02/01/2017', '02/28/2017')], max_attempts=1)
+    output = str(tmpdir.join('output'))
+    worker = Worker(queue, output, {'someuser': 'secret'}, worker_id='host-a', work_folder=str(tmpdir),
+                    options={'headless': True})
+    results = worker.run()
+
+    assert [job.password for job in ran] == ['secret', 'secret']
+    assert ran[0].options == {'headless': True, 'accounts': ['client'], 'planner': 31}
+    assert results[0].reports == [os.path.join(output, 'client', 'tweets', 'client_tweets_report.csv')]
+    assert os.path.exists(results[0].reports[0])
+    assert queue.counts() == {'done': 1, 'failed': 1}
+
+
+def test_partial_backend_cannot_be_instantiated():
+    class PutOnlyQueue(workqueue.JobQueue):
+        def put(self, items, max_attempts=3):
+            return len(items)
+
+    with pytest.raises(TypeError):
+        PutOnlyQueue()
@@ -1,2 +1,30 @@
-from twitter_analytics.downloader import ReportDownloader
-from twitter_analytics.calendar import AnalyticsCalendar, DatePicker
+"""
+Twitter analytics reports downloader.
+
+The public names are loaded lazily, on first use: `import twitter_analytics` does not import Selenium, and the pure
+helpers (date ranges, report readers) work without any browser dependency installed.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    'ReportDownloader': 'twitter_analytics.downloader',
+    'AnalyticsCalendar': 'twitter_analytics.calendar',
+    'DatePicker': 'twitter_analytics.calendar',
+    'DownloadJob': 'twitter_analytics.runner',
+    'JobResult': 'twitter_analytics.runner',
+    'WarmBrowser': 'twitter_analytics.session',
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value     # next lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
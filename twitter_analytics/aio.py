@@ -0,0 +1,275 @@
+"""
+asyncio front end: drive many report downloads from one event loop.
+
+Selenium is blocking, so each WebDriver step runs on a thread pool, but everything that only waits (the anti-bot
+pauses and the download watching) happens on the event loop. run_jobs shares a pool of EXECUTOR_WORKERS threads
+between all its browsers, whatever their number. A step which waits for the page (login, navigation, calendar) holds
+its thread while it waits, so the browsers take turns for these steps. The download waits hold no thread.
+"""
+import asyncio
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from twitter_analytics.pacing import get_pacer
+from twitter_analytics.retry import DownloadFailed
+from twitter_analytics.runner import DownloadJob, JobResult
+from twitter_analytics.watcher import DownloadTimeout, DownloadWatcher
+
+# Threads of the pool shared by the browsers of run_jobs
+EXECUTOR_WORKERS = 4
+
+
+class DeferredSleep(object):
+
+    """
+    Sleep function for the pacer of a downloader driven from asyncio: the pauses requested by a blocking step are
+    added up instead of blocking a thread, then awaited on the event loop once the step returns.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, seconds):
+        with self.lock:
+            self.seconds += seconds
+
+    def take(self):
+        with self.lock:
+            seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+
+class AsyncReportDownloader(object):
+
+    """
+    Awaitable version of ReportDownloader.
+
+    downloader = AsyncReportDownloader('username', 'password', from_date='01/01/2017', to_date='03/31/2017')
+    reports = await downloader.arun()
+    """
+
+    def __init__(self, username, password, executor=None, **options):
+        """
+        :param username: Twitter username
+        :param password: Twitter password
+        :param executor (optional): Thread pool running the blocking WebDriver steps. Default is a pool of 1 thread,
+        shut down by quit().
+        :param options: Other keyword arguments of ReportDownloader (from_date, to_date, section, pacing...).
+        """
+        self.username = username
+        self.password = password
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.deferred_sleep = DeferredSleep()
+        self.pacer = get_pacer(options.pop('pacing', None)).for_account(username.lower())
+        self.pacer.sleep = self.deferred_sleep
+        self.options = options
+        self.downloader = None
+
+    async def _call(self, function, *args, **kwargs):
+        """
+        Run a blocking step on the executor, then await the pauses it asked for.
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+        await asyncio.sleep(self.deferred_sleep.take())
+        return result
+
+    async def start(self):
+        """
+        Start the browser (and its virtual display).
+        """
+        from twitter_analytics.downloader import ReportDownloader
+        if self.downloader is None:
+            downloader = await self._call(ReportDownloader, self.username, self.password, pacing=self.pacer,
+                                          **self.options)
+            # The backoffs of the retries made inside a step (e.g. the http exports) can't be deferred: a retry has to
+            # wait before its next try, so they sleep on the executor thread.
+            downloader.retry = downloader.retry.bind(downloader.metrics.wrap_sleep(time.sleep),
+                                                     on_retry=downloader.retry.on_retry)
+            self.downloader = downloader
+        return self.downloader
+
+    async def login(self):
+        await self._call(self.downloader.login)
+
+    async def go_to_analytics(self):
+        await self._call(self.downloader.go_to_analytics)
+
+    async def start_session(self):
+        """
+        Log in (or reuse the saved session) and land on the analytics section.
+        """
+        await self._call(self.downloader.start_session)
+
+    async def go_to_section(self, section=None):
+        if (section or self.downloader.section) == 'videos':
+            await self._call(self.downloader.go_to_video_page)
+        else:
+            await self._call(self.downloader.go_to_report_page)
+
+    async def set_report_period(self, from_date, to_date):
+        await self._call(self.downloader.set_report_period, from_date, to_date)
+
+    async def download_report(self, from_date=None, to_date=None, section=None):
+        """
+        Click the export button and wait for the report without blocking the event loop: inotify events are watched
+        with loop.add_reader where possible, the folder is polled otherwise. The export is clicked again after a server
+        error with the backoff of the export retry policy, like ReportDownloader.download_report.
+        :return: Pathname of the report.
+        """
+        downloader = self.downloader
+        match, rename_to = downloader.expected_report(from_date, to_date, section)
+        attempt = downloader.retry.start('export', downloader.download_timeout)
+        with DownloadWatcher(downloader.download_folder, timeout=downloader.download_timeout) as watcher:
+            download_button = await self._call(downloader.click_export)
+            while True:
+                path = watcher.claim_file(match, rename_to)
+                if path is not None:
+                    return path
+                remaining = attempt.remaining()
+                if remaining <= 0:
+                    raise DownloadTimeout('No report downloaded in {} after {} secs'.format(
+                        downloader.download_folder, attempt.deadline))
+                if not attempt.waiting or attempt.ready():
+                    await self._call(downloader.retry_export_on_error, attempt, download_button)
+                await _wait_for_event(watcher, min(remaining, watcher.poll_frequency))
+
+    async def download_ranges(self, section, ranges):
+        """
+        Awaitable equivalent of ReportDownloader.download_ranges(): the backoffs are awaited on the event loop.
+        :return: List of pathnames of the reports, in the order of the ranges.
+        """
+        downloader = self.downloader
+        queue = downloader.retry.queue(ranges)
+        reports = [None] * len(ranges)
+        on_page = False
+        while queue:
+            item = downloader.next_range(queue)
+            if item is None:
+                await asyncio.sleep(queue.wait_time())
+                continue
+            index, rng = item
+            try:
+                if not on_page:
+                    await downloader.retry.acall('navigation', self.go_to_section, section)
+                    on_page = True
+                if rng[0] is not None:
+                    await downloader.retry.acall('calendar', self.set_report_period, rng[0], rng[1])
+                report = await self.download_report(rng[0], rng[1], section)
+            except Exception as error:
+                on_page = False
+                downloader.range_failed(queue, index, rng, error)
+                continue
+            downloader.range_downloaded(reports, index, rng, report, section)
+        return downloader.ranges_done(section, queue, reports)
+
+    async def quit(self):
+        try:
+            if self.downloader is not None:
+                await self._call(self.downloader.quit)
+        finally:
+            if self.own_executor:
+                self.executor.shutdown(wait=False)
+
+    async def arun(self):
+        """
+        Awaitable equivalent of ReportDownloader.run().
+        :return: List of pathnames of the reports.
+        """
+        downloader = await self.start()
+        try:
+            if downloader.nothing_to_download():
+                return []
+
+            await self.start_session()
+            dates = (downloader.from_date, downloader.to_date) if downloader.has_date_range else (None, None)
+            reports = list()
+            for account, section in downloader.targets():
+                if downloader.export_mode == 'http':
+                    reports += await self._call(downloader.download, section, *dates, account=account)
+                    continue
+                ranges = downloader.section_ranges(section, *dates, account=account)
+                if not ranges:
+                    continue
+                section_reports = await self.download_ranges(section, ranges)
+                await self._call(downloader.store_reports, section, section_reports)
+                reports += section_reports
+            downloader.check_failures(reports)
+            return reports
+        finally:
+            await self.quit()
+
+
+async def _wait_for_event(watcher, seconds):
+    if watcher.fd is None:
+        await asyncio.sleep(seconds)
+        return
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+    try:
+        loop.add_reader(watcher.fd, event.set)
+    except NotImplementedError:     # event loops without add_reader (Windows proactor)
+        await asyncio.sleep(seconds)
+        return
+    try:
+        await asyncio.wait_for(event.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(watcher.fd)
+    if event.is_set():
+        watcher.drain_events()
+
+
+async def run_jobs(jobs, limit=10, download_folder=None, executor=None):
+    """
+    Run many (username, section, from/to) jobs from one event loop, at most `limit` browsers at a time.
+
+    :param jobs: iterable of DownloadJob (or dicts / tuples accepted by DownloadJob.coerce)
+    :param limit: Maximum number of browsers open at once.
+    :param download_folder: root folder for the per-job folders. Default is working directory.
+    :param executor (optional): Thread pool for the blocking WebDriver steps. Default is a pool of EXECUTOR_WORKERS
+    threads shared by all the browsers.
+    :return: list of JobResult, in the same order as the jobs.
+    """
+    jobs = [DownloadJob.coerce(job) for job in jobs]
+    download_folder = download_folder or os.getcwd()
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(index, job):
+        folder = os.path.join(download_folder, job.folder_name(index))
+        async with semaphore:
+            started = time.time()
+            reports = []
+            error = None
+            downloader = None
+            try:
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                downloader = AsyncReportDownloader(job.username, job.password, executor=executor,
+                                                   from_date=job.from_date, to_date=job.to_date,
+                                                   section=job.section, download_folder=folder, **job.options)
+                reports = await downloader.arun()
+            except Exception as exception:
+                error = traceback.format_exc()
+                if isinstance(exception, DownloadFailed):
+                    reports = exception.reports
+            return JobResult(username=job.username, section=job.section, from_date=job.from_date,
+                             to_date=job.to_date, download_folder=folder, reports=reports, error=error,
+                             elapsed=time.time() - started,
+                             metrics=(downloader.downloader.metrics.report()
+                                      if downloader is not None and downloader.downloader is not None else None))
+
+    try:
+        return list(await asyncio.gather(*[run_one(index, job) for index, job in enumerate(jobs)]))
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
@@ -0,0 +1,106 @@
+import os
+import platform
+
+SYST = platform.system().lower()
+
+# Third party trackers and fonts loaded by the analytics pages, not needed to export a report.
+LEAN_BLOCKED_URLS = [
+    '*google-analytics.com*',
+    '*bat.bing.com*',
+    '*pinimg.com*',
+    '*doubleclick.net*',
+    '*/i/adsct*',
+    '*.woff',
+    '*.woff2',
+    '*.ttf',
+]
+
+
+def chrome_options(download_folder, proxy=None, headless=False, lean=False, profile_dir=None, tabs=1):
+    """
+    Chrome settings for a report downloader.
+
+    :param download_folder: Folder where the reports are downloaded.
+    :param proxy (optional): Proxy in the following string form => IP:PORT or HOST:PORT
+    :param headless: Run Chrome without any display (no Xvfb needed).
+    :param lean: Cut the memory used per browser: no images, media, extensions or GPU, small caches.
+    :param profile_dir (optional): Chrome user data dir, to keep the session between runs.
+    :param tabs: Number of tabs downloading at once. With a lean browser of 1 tab, Chrome runs a single renderer.
+    :return: ChromeOptions
+    """
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    prefs = {"download.default_directory": download_folder}
+
+    if proxy is not None:
+        options.add_argument('--proxy-server={}'.format(proxy))
+
+    if profile_dir is not None:
+        options.add_argument('--user-data-dir={}'.format(profile_dir))
+
+    if headless:
+        options.add_argument('--headless=new')
+        options.add_argument('--window-size=1200,1000')
+
+    if lean:
+        prefs.update({
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+        })
+        for argument in ('--blink-settings=imagesEnabled=false', '--autoplay-policy=user-gesture-required',
+                         '--mute-audio', '--disable-extensions', '--disable-gpu', '--disable-software-rasterizer',
+                         '--disable-background-networking', '--disable-sync', '--disable-default-apps',
+                         '--no-first-run', '--disk-cache-size=1048576', '--media-cache-size=1048576'):
+            options.add_argument(argument)
+        if tabs == 1:
+            # Several tabs in one renderer would run their pages on one main thread, one at a time
+            options.add_argument('--renderer-process-limit=1')
+
+    options.add_experimental_option("prefs", prefs)
+    return options
+
+
+def create_browser(options):
+    """
+    Start Chrome with the chromedriver of the platform.
+    """
+    from selenium import webdriver
+
+    if SYST == 'darwin':
+        return webdriver.Chrome(r"/usr/local/bin/chromedriver", chrome_options=options)
+    elif SYST == 'linux':
+        return webdriver.Chrome(r"/usr/lib/chromium-browser/chromedriver", chrome_options=options)
+    else:
+        windriver = os.environ.get('chromedriver')  # get environment variable
+        if 'chromedriver.exe' in os.listdir() or windriver is None:
+            return webdriver.Chrome(chrome_options=options)
+        else:
+            return webdriver.Chrome(windriver, chrome_options=options)
+
+
+def send_devtools_command(browser, command, params):
+    """
+    Send a Chrome DevTools Protocol command, with Selenium 4 (execute_cdp_cmd) or Selenium 3 (chromedriver's
+    send_command endpoint).
+    """
+    if hasattr(browser, 'execute_cdp_cmd'):
+        return browser.execute_cdp_cmd(command, params)
+    browser.command_executor._commands['send_command'] = ('POST', '/session/$sessionId/chromium/send_command')
+    return browser.execute('send_command', {'cmd': command, 'params': params})
+
+
+def enable_downloads(browser, download_folder):
+    """
+    Headless Chrome drops downloads unless they are explicitly allowed through DevTools.
+    """
+    send_devtools_command(browser, 'Page.setDownloadBehavior',
+                          {'behavior': 'allow', 'downloadPath': os.path.abspath(download_folder)})
+
+
+def block_urls(browser, patterns=None):
+    """
+    Stop the browser from loading the resources matching the patterns (default LEAN_BLOCKED_URLS).
+    """
+    send_devtools_command(browser, 'Network.enable', {})
+    send_devtools_command(browser, 'Network.setBlockedURLs', {'urls': list(patterns or LEAN_BLOCKED_URLS)})
@@ -1,23 +1,115 @@
 from datetime import datetime, date as date_
-from dateutil import relativedelta
-from twitter_analytics.utils import random_time_sleep, random_small_time_sleep
+from twitter_analytics.pacing import get_pacer
+from twitter_analytics.pages import ReportPage
+
+# Sets both ends of the range through the daterangepicker jQuery plugin bound to the calendar button, and applies it
+# like the 'Update' button does. Returns the range the picker ended up with, or null if the plugin is not reachable.
+SET_RANGE_SCRIPT = '''
+var button = document.querySelector('.daterange-button');
+if (!window.jQuery || !button) { return null; }
+var picker = window.jQuery(button).data('daterangepicker');
+if (!picker || !picker.setStartDate || !picker.setEndDate) { return null; }
+picker.setStartDate(arguments[0]);
+picker.setEndDate(arguments[1]);
+if (picker.clickApply) {
+    picker.clickApply();
+} else {
+    picker.element.trigger('apply.daterangepicker', picker);
+}
+return [picker.startDate.format('MM/DD/YYYY'), picker.endDate.format('MM/DD/YYYY')];
+'''
+
+# Formats the calendar button may use to display the selected range
+DISPLAY_DATE_FORMATS = ('%m/%d/%Y', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%Y-%m-%d')
 
 
 class AnalyticsCalendar(object):
 
-    def __init__(self, browser, from_date, to_date):
+    # Secs for the page to show the range set through the date picker, before falling back to clicks
+    script_timeout = 10
+
+    def __init__(self, browser, from_date, to_date, pacer=None, strategy='auto', page=None):
         """
         Class that handles the selection of FROM date and TO date in the calendar of twitter analytics.
 
         :param browser: Selenium driver object
         :param from_date: date string in the format 'mm/dd/yyyy'
         :param to_date: date string in the format 'mm/dd/yyyy'
+        :param pacer (optional): twitter_analytics.pacing.Pacer deciding the waits between steps. Default is the
+        'human' profile.
+        :param strategy: 'script' sets the range in one step through the date picker API, whatever the distance to the
+        displayed months. 'click' navigates the calendar month by month. 'auto' (default) tries the script first and
+        falls back to clicks if the page does not show the requested range.
+        :param page (optional): twitter_analytics.pages.ReportPage of the browser tab, sharing its located elements.
         """
         self.from_date = from_date
         self.to_date = to_date
         self.browser = browser
+        self.pacer = get_pacer(pacer)
+        self.page = page or ReportPage(browser, self.pacer)
+        if strategy not in ('auto', 'script', 'click'):
+            raise Exception('Unknown calendar strategy')
+        self.strategy = strategy
+        self.strategy_used = None     # 'script' or 'click' once the period is set
 
     def set_report_period(self):
+        if self.strategy != 'click':
+            if self.set_period_with_script():
+                self.strategy_used = 'script'
+                return 'completed'
+            if self.strategy == 'script':
+                raise Exception('Date range {} - {} could not be set through the date picker'.format(
+                    self.from_date, self.to_date))
+        self.strategy_used = 'click'
+        return self.set_period_with_clicks()
+
+    def set_period_with_script(self):
+        """
+        Set the FROM and TO dates in one step through the daterangepicker API, then check the page shows the range.
+        :return: Boolean: True if the requested range is selected.
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            picked = self.browser.execute_script(SET_RANGE_SCRIPT, self.from_date, self.to_date)
+        except WebDriverException:
+            return False        # script error, e.g. a newer version of the date picker
+        if picked is None or list(picked) != [self.from_date, self.to_date]:
+            return False
+        self.page.calendar_changed()
+
+        try:
+            self.page.wait_for(lambda state: self.range_is_displayed(state['range']), timeout=self.script_timeout)
+        except Exception:
+            return False
+        self.pacer.pause()
+        return True
+
+    def displayed_range(self):
+        """
+        :return: Text of the calendar button, e.g. 'Last 28 Days' or the selected range.
+        """
+        return self.page.displayed_range()
+
+    def range_is_displayed(self, label=None):
+        """
+        :param label (optional): Text of the calendar button, if already known.
+        :return: Boolean: True if the calendar button shows both the FROM and the TO date.
+        """
+        if label is None:
+            label = self.displayed_range()
+        for date_string in (self.from_date, self.to_date):
+            day = datetime.strptime(date_string, '%m/%d/%Y')
+            renderings = set(day.strftime(date_format) for date_format in DISPLAY_DATE_FORMATS)
+            renderings.update(rendering.replace(' 0', ' ') for rendering in list(renderings))
+            if not any(rendering in label for rendering in renderings):
+                return False
+        return True
+
+    def set_period_with_clicks(self):
+        """
+        Pick the FROM and TO dates by navigating the calendar month by month.
+        """
         self.open_calendar()
         self.pick_from_date()
         self.pick_to_date()
@@ -27,35 +119,37 @@ class AnalyticsCalendar(object):
         return 'completed'      # used for unit test
 
     def open_calendar(self):
-        calendar_xpath = '//div[@class="btn daterange-button"]'
-        self.browser.find_element_by_xpath(calendar_xpath).click()
-        random_time_sleep()
+        self.page.click('calendar_button')
+        self.page.calendar_changed()
+        self.page.wait_for(lambda state: state['calendar_visible'])
+        self.pacer.pause()
 
     def pick_from_date(self):
         """
         Update the FROM date in analytics calendar.
         """
         from_calendar_element = 'div[@class="calendar left"]'
-        date_picker = DatePicker(self.browser, from_calendar_element, self.from_date)
+        date_picker = DatePicker(self.browser, from_calendar_element, self.from_date, pacer=self.pacer, page=self.page)
         date_picker.select_date()
-        random_time_sleep()
+        self.pacer.pause()
 
     def pick_to_date(self):
         """
         Update the TO date in analytics calendar.
         """
         to_calendar_element = 'div[@class="calendar right"]'
-        date_picker = DatePicker(self.browser, to_calendar_element, self.to_date)
+        date_picker = DatePicker(self.browser, to_calendar_element, self.to_date, pacer=self.pacer, page=self.page)
         date_picker.select_date()
-        random_time_sleep()
+        self.pacer.pause()
 
     def click_update_date_button(self):
         """
         Click the 'update' button after a date range is selected.
         """
-        update_button = '//button[@class="applyBtn btn btn-sm btn-primary"]'
-        self.browser.find_element_by_xpath(update_button).click()
-        random_time_sleep()
+        self.page.click('apply')
+        self.page.calendar_changed()
+        self.page.wait_for(lambda state: not state['calendar_visible'])
+        self.pacer.pause()
 
 
 class DatePicker(object):
@@ -65,15 +159,20 @@ class DatePicker(object):
     calendar element given as an attribute
     """
 
-    def __init__(self, browser, xpath_calendar, target_date):
+    def __init__(self, browser, xpath_calendar, target_date, pacer=None, page=None):
         """
         :param browser: Selenium driver/browser
         :param element: Xpath Selenium element calendar where we need to pick a date from.
         :param date: Date string in the format 'mm/dd/yyyy'
+        :param pacer (optional): twitter_analytics.pacing.Pacer deciding the waits between clicks.
+        :param page (optional): twitter_analytics.pages.ReportPage of the browser tab.
         """
         self.browser = browser
         self.xpath_calendar = xpath_calendar
+        self.side = 'left' if 'left' in xpath_calendar else 'right'
         self.target_date = target_date
+        self.pacer = get_pacer(pacer)
+        self.page = page or ReportPage(browser, self.pacer)
 
         # date parsing
         self.month, self.day, self.year = self.target_date.split('/')
@@ -95,14 +194,9 @@ class DatePicker(object):
         The result delta can be negative (to trigger click to 'previous' month button) or positive ( to trigger click
         to 'next' month button).
         """
-        month_xpath = '//{}/div[@class="calendar-date"]/table[@class="table-condensed"]/' \
-                      'thead/tr/th[@class="month"]'.format(self.xpath_calendar)
-
-        display_month = datetime.strptime(self.browser.find_element_by_xpath(month_xpath).text, '%b %Y')
+        display_month = datetime.strptime(self.displayed_month(), '%b %Y')
         target_month = datetime.strptime('{} {}'.format(self.month, self.year), '%m %Y')
-        r = relativedelta.relativedelta(target_month, display_month)
-
-        months_delta = r.years * 12 + r.months
+        months_delta = (target_month.year - display_month.year) * 12 + target_month.month - display_month.month
         return months_delta
 
     def pick_month(self, months_delta):
@@ -111,39 +205,50 @@ class DatePicker(object):
 r month targeted.
         :param months_delta: Number of month between the default month displayed in calendar and the targeted month.
         """
-        if months_delta > 0:
-            for i in range(0, months_delta):
+        if months_delta == 0:
+            return
+        # the header read after each click tells the month displayed for the next one
+        displayed_month = self.displayed_month()
+        for i in range(0, abs(months_delta)):
+            if months_delta > 0:
                 self.click_next()
-                random_small_time_sleep()
-        elif months_delta < 0:
-            for i in range(0, abs(months_delta)):
+            else:
                 self.click_previous()
-                random_small_time_sleep()
+            displayed_month = self.wait_for_month_change(displayed_month)
+
+    def displayed_month(self):
+        """
+        Header text of the month displayed in the calendar section, e.g. 'Apr 2017'.
+        """
+        return self.page.displayed_month(self.side)
+
+    def wait_for_month_change(self, previous_month):
+        """
+        Wait for the calendar header to move away from the previously displayed month, then make the small anti-bot
+        pause.
+        :return: Header of the month now displayed.
+        """
+        state = self.page.wait_for(lambda state: state['months'][self.side] != previous_month)
+        self.pacer.pause(small=True)
+        return state['months'][self.side]
 
     def click_previous(self):
         """
         Previous month button click on a calendar section
         """
-        prev_button_xpath = '//{}/div[@class="calendar-date"]/table[@class="table-condensed"]/' \
-                            'thead/tr/th[@class="prev available"]/span[@class="Icon Icon--caretLeft Icon--tiny"]'\
-            .format(self.xpath_calendar)
-        self.browser.find_element_by_xpath(prev_button_xpath).click()
+        self.page.click('prev', self.side)
+        self.page.calendar_changed()
 
     def click_next(self):
         """
         Next month button click on a calendar section
         """
-        next_button_xpath = '//{}/div[@class="calendar-date"]/table[@class="table-condensed"]/' \
-                            'thead/tr/th[@class="next available"]/span[@class="Icon Icon--caretRight Icon--tiny"]' \
-            .format(self.xpath_calendar)
-        self.browser.find_element_by_xpath(next_button_xpath).click()
+        self.page.click('next', self.side)
+        self.page.calendar_changed()
 
     def pick_day(self):
         """
         Method that press the right day in the previously selected month.
         """
-        day_xpath = '//{}/div[@class="calendar-date"]/table[@class="table-condensed"]/' \
-                    'tbody/tr/td[(@class="available" or @class="available in-range" ' \
-                    'or @class="available active start-date" or @class="available active end-date") and text()="{}"]'\
-            .format(self.xpath_calendar, str(int(self.day)))
-        self.browser.find_element_by_xpath(day_xpath).click()
+        self.page.click('day', self.side, str(int(self.day)))
+        self.page.calendar_changed()
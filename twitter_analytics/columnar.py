@@ -0,0 +1,257 @@
+"""
+Columnar store of downloaded reports: compressed Arrow IPC (or Parquet) files partitioned by account, section and
+month, with a small JSON index.
+
+    root/index.json
+    root/account=<account>/section=<section>/month=<yyyy-mm>/data.arrow
+
+Readers memory-map only the partitions and columns they ask for, instead of parsing every CSV again. The layout is
+the usual hive partitioning, so pyarrow.dataset, DuckDB or Spark can read the root directly too.
+
+Requires pyarrow (pip install twitter-analytics[columnar]).
+"""
+import json
+import os
+import time
+
+from twitter_analytics.reports import ID_COLUMN, TIME_COLUMN, ReportTable, is_rate_column
+
+INDEX_FILENAME = 'index.json'
+FORMATS = {'ipc': 'data.arrow', 'parquet': 'data.parquet'}
+
+
+class ColumnarStore(object):
+
+    """
+    Convert tweet activity reports into month partitions and read them back column by column.
+
+    store = ColumnarStore('/data/analytics')
+    store.add_reports('username', 'tweets', reports)
+    impressions = store.read(['time', 'impressions'], account='username', from_month='2017-01', to_month='2017-12')
+    """
+
+    def __init__(self, root, format='ipc', compression='zstd'):
+        """
+        :param root: Folder of the store (created if missing).
+        :param format: 'ipc' (Arrow IPC file, default) or 'parquet'.
+        :param compression: Codec of the files ('zstd', 'lz4' or None). Uncompressed IPC files are read without any
+        copy; compressed ones only decompress the columns read.
+        """
+        if format not in FORMATS:
+            raise Exception('Unknown columnar format')
+        self.root = root
+        self.format = format
+        self.compression = compression
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self.index = self.load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'partitions': {}}
+        with open(self.index_path) as index_file:
+            return json.load(index_file)
+
+    def save_index(self):
+        _write_atomically(self.index_path, lambda path: _dump_json(self.index, path))
+
+    def add_reports(self, account, section, paths):
+        """
+        Add reports to the partitions of an account and section. A tweet appearing in several reports, or already in
+        the store, keeps the values of the newest report.
+
+        :param section: 'tweets': the video reports have other columns (and no tweet id) and can't be stored.
+        :param paths: Pathnames of the reports, as returned by ReportDownloader.run()
+        :return: List of the months updated, e.g. ['2017-01', '2017-02'].
+        """
+        if section != 'tweets':
+            raise Exception('Only tweet activity reports can be stored, not {} reports'.format(section))
+        if not paths:
+            return []
+        table = ReportTable.from_reports(paths, keep_text=True)
+        months = dict()
+        for index, epoch in enumerate(table.column(TIME_COLUMN)):
+            months.setdefault(time.strftime('%Y-%m', time.gmtime(epoch)), []).append(index)
+
+        account = account.lower()
+        for month, indices in sorted(months.items()):
+            new = _to_arrow(table, indices)
+            path = self.partition_path(account, section, month)
+            if os.path.exists(path):
+                new = _newest_rows(_unify([new, self.read_file(path)]))
+            new = new.sort_by(TIME_COLUMN)
+            _write_atomically(path, lambda temporary: self.write_file(new, temporary))
+            entry = self.index['partitions'].setdefault(_key(account, section, month), {'sources': []})
+            entry.update({
+                'account': account,
+                'section': section,
+                'month': month,
+                'path': os.path.relpath(path, self.root),
+                'rows': new.num_rows,
+                'bytes': os.path.getsize(path),
+                'columns': new.schema.names,
+            })
+            entry['sources'] = sorted(set(entry['sources']) | set(os.path.basename(report) for report in paths))
+        self.save_index()
+        return sorted(months)
+
+    def partition_path(self, account, section, month):
+        return os.path.join(self.root, 'account={}'.format(account), 'section={}'.format(section),
+                            'month={}'.format(month), FORMATS[self.format])
+
+    def partitions(self, account=None, section=None, from_month=None, to_month=None):
+        """
+        :param from_month (optional): first month, 'yyyy-mm'
+        :param to_month (optional): last month, 'yyyy-mm'
+        :return: Index entries of the matching partitions, ordered by account, section and month.
+        """
+        entries = list()
+        for key in sorted(self.index['partitions']):
+            entry = self.index['partitions'][key]
+            if account is not None and entry['account'] != account.lower():
+                continue
+            if section is not None and entry['section'] != section:
+                continue
+            if (from_month is not None and entry['month'] < from_month) or \
+                    (to_month is not None and entry['month'] > to_month):
+                continue
+            entries.append(entry)
+        return entries
+
+    def read(self, columns=None, account=None, section=None, from_month=None, to_month=None, with_partitions=False):
+        """
+        Read some columns of some months, memory-mapping only the matching partitions.
+
+        :param columns (optional): Column names. Default is every column.
+        :param with_partitions: Add the 'account', 'section' and 'month' of every row as columns.
+        :return: pyarrow.Table
+        """
+        import pyarrow as pa
+
+        tables = list()
+        for entry in self.partitions(account, section, from_month, to_month):
+            table = self.read_file(os.path.join(self.root, entry['path']), columns)
+            if with_partitions:
+                for name in ('account', 'section', 'month'):
+                    table = table.append_column(name, pa.repeat(entry[name], table.num_rows).cast(pa.string()))
+            tables.append(table)
+        if not tables:
+            return pa.table({name: pa.array([], pa.null()) for name in (columns or [])})
+        return _unify(tables)
+
+    def column(self, name, **partition_filters):
+        """
+        :return: pyarrow.ChunkedArray of a column over the matching partitions, e.g.
+        store.column('impressions', account='username', from_month='2017-01').
+        """
+        return self.read([name], **partition_filters).column(name)
+
+    def read_file(self, path, columns=None):
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.read_table(path, columns=columns, memory_map=True)
+
+        import pyarrow as pa
+        import pyarrow.ipc
+        with pa.memory_map(path) as source:
+            if columns is None:
+                return pa.ipc.open_file(source).read_all()
+            names = pa.ipc.open_file(source).schema.names
+            options = pa.ipc.IpcReadOptions(included_fields=[names.index(name) for name in columns if name in names])
+            return pa.ipc.open_file(source, options=options).read_all()
+
+    def write_file(self, table, path):
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, path, compression=self.compression or 'none')
+            return
+
+        import pyarrow as pa
+        import pyarrow.ipc
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+
+def _key(account, section, month):
+    return '{}/{}/{}'.format(account, section, month)
+
+
+def _to_arrow(table, indices):
+    """
+    Rows `indices` of a ReportTable as a pyarrow.Table: ids and counts as int64, rates as float64, time as a UTC
+    timestamp, text as strings. Missing values are nulls.
+    """
+    import pyarrow as pa
+
+    arrays = dict()
+    for name, values in table.columns.items():
+        selected = [values[index] for index in indices]
+        if name == TIME_COLUMN:
+            # milliseconds: Parquet has no seconds timestamps
+            arrays[name] = pa.array([epoch * 1000 for epoch in selected], pa.timestamp('ms', tz='UTC'))
+        elif values.typecode == 'q':
+            arrays[name] = pa.array(selected, pa.int64())
+        elif is_rate_column(name):
+            arrays[name] = pa.array(selected, pa.float64(), from_pandas=True)     # NaN as null
+        else:
+            # counts with missing values, stored as NaN in the table
+            arrays[name] = pa.array([None if value != value else int(value) for value in selected], pa.int64())
+    for name, values in table.text.items():
+        arrays[name] = pa.array([values[index] for index in indices], pa.string())
+    return pa.table(arrays)
+
+
+def _unify(tables):
+    """
+    Concatenate tables whose columns differ (e.g. promoted metrics), the missing columns being nulls.
+    """
+    import pyarrow as pa
+
+    fields = dict()
+    for table in tables:
+        for field in table.schema:
+            fields.setdefault(field.name, field.type)
+    unified = list()
+    for table in tables:
+        columns = [table.column(name).cast(field_type) if name in table.schema.names
+                   else pa.nulls(table.num_rows, field_type) for name, field_type in fields.items()]
+        unified.append(pa.table(columns, names=list(fields)))
+    return pa.concat_tables(unified)
+
+
+def _newest_rows(table):
+    """
+    Keep the first row of every tweet id: the tables are concatenated newest first.
+    """
+    if ID_COLUMN not in table.schema.names:
+        return table
+    seen = set()
+    keep = list()
+    for index, tweet_id in enumerate(table.column(ID_COLUMN).to_pylist()):
+        if tweet_id not in seen:
+            seen.add(tweet_id)
+            keep.append(index)
+    return table.take(keep)
+
+
+def _dump_json(content, path):
+    with open(path, 'w') as output:
+        json.dump(content, output, indent=2, sort_keys=True)
+
+
+def _write_atomically(path, write):
+    """
+    Write a file through a temporary name, so readers never see a partial partition or index.
+    """
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    temporary = path + '.tmp'
+    write(temporary)
+    os.replace(temporary, path)
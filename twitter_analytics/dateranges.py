@@ -0,0 +1,86 @@
+"""
+Date range helpers. Pure Python: usable without Selenium or a browser.
+"""
+import calendar
+from datetime import datetime, timedelta, date
+
+
+def parse_date(date_string):
+    return datetime.strptime(date_string, '%m/%d/%Y').date()
+
+
+def format_date(day):
+    return day.strftime('%m/%d/%Y')
+
+
+def to_iso(date_string):
+    """
+    :return: 'mm/dd/yyyy' date string as 'yyyy-mm-dd', which sorts (and compares in SQL) in date order.
+    """
+    return parse_date(date_string).isoformat()
+
+
+def parse_iso(iso_string):
+    return datetime.strptime(iso_string, '%Y-%m-%d').date()
+
+
+def from_iso(iso_string):
+    return format_date(parse_iso(iso_string))
+
+
+def is_final(last_day, downloaded_on, refresh_days):
+    """
+    Twitter keeps updating the metrics of recent tweets: a window stops changing `refresh_days` after its last day.
+    :param last_day: Last day of the window (date).
+    :param downloaded_on: Day its report was downloaded (date).
+    :return: True if the report was downloaded once the window stopped changing.
+    """
+    return downloaded_on >= last_day + timedelta(days=refresh_days)
+
+
+def day_windows(start, end, days):
+    """
+    Cut the period from `start` to `end` (dates, both included) into consecutive windows of `days` days, the last one
+    ending on `end`.
+    :return: List of tuples (first day, last day).
+    """
+    windows = list()
+    while start <= end:
+        last = min(end, start + timedelta(days=days - 1))
+        windows.append((start, last))
+        start = last + timedelta(days=1)
+    return windows
+
+
+def month_windows(start, end):
+    """
+    Cut the period from `start` to `end` (dates, both included) at calendar month boundaries.
+    :return: List of tuples (first day, last day).
+    """
+    windows = list()
+    yr, mth = start.year, start.month
+    while (yr, mth) <= (end.year, end.month):
+        dd = calendar.monthrange(yr, mth)[1]
+        windows.append((max(start, date(yr, mth, 1)), min(end, date(yr, mth, dd))))
+        yr, mth = (yr + 1, 1) if mth == 12 else (yr, mth + 1)
+    return windows
+
+
+def split_date_range_into_91(from_date, to_date):
+    """
+    Split the date range into 91 days segment to batch the scraping of the calendar for period longer than 91 days.
+    :return: List of list of 2 items [0] = from and [1] = to.
+    """
+    windows = day_windows(parse_date(from_date), parse_date(to_date), 91)
+    return [[format_date(first), format_date(last)] for first, last in windows]
+
+
+def split_date_range_into_months(from_date, to_date):
+    """
+    Split the date range into month to batch the
+    scraping of the calendar for period longer than
+    28-31 days.
+    :return: List of list of 2 items [0] = from and [1] = to.
+    """
+    windows = month_windows(parse_date(from_date), parse_date(to_date))
+    return [[format_date(first), format_date(last)] for first, last in windows]
@@ -1,25 +1,29 @@
 import os
-import platform
-SYST = platform.system().lower()
-from datetime import datetime, timedelta, date
-from math import ceil
+from twitter_analytics import dateranges
+from twitter_analytics.browser import SYST, block_urls, chrome_options, create_browser, enable_downloads
 from twitter_analytics.calendar import AnalyticsCalendar
-if SYST != 'windows':
-    from pyvirtualdisplay import Display
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
-from twitter_analytics.utils import random_time_sleep
-from dateutil.rrule import rrule, MONTHLY
-import calendar
+from twitter_analytics.instrumentation import Instrumentation, timed
+from twitter_analytics.pacing import get_pacer
+from twitter_analytics.pages import ReportPage
+from twitter_analytics.planner import ExportPlan, RangePlanner, local_report_ranges
+from twitter_analytics.retry import CircuitOpen, DownloadFailed, FailedRange, RetryScheduler
+from twitter_analytics.session import SessionStore
+from twitter_analytics.utils import last_28_days, report_filename
+from twitter_analytics.watcher import DownloadTimeout, DownloadWatcher, report_matcher
 
 
 class ReportDownloader(object):
 
     """ Twitter Analytics report downloader using Selenium browser interaction """
 
+    login_url = "https://twitter.com/login?redirect_after_login=https%3A%2F%2Fanalytics.twitter.com%2Fabout&hide_message=1"
+    analytics_url = "https://analytics.twitter.com/"
+
     def __init__(self, username, password, from_date=None, to_date=None, download_folder=os.getcwd(), proxy=None,
-                 show_browser=False, section='tweets'):
+                 show_browser=False, section='tweets', export_mode='browser', http_workers=4,
+                 pacing=None, download_timeout=300, manifest=None, session_dir=None, calendar_strategy='auto',
+                 headless=False, lean=False, instrumentation=None, accounts=None, tabs=1, planner=None,
+                 columnar_store=None, retry=None, rollup=None):
         """
         Create a browser instance and a fake display. Set up specific preferences for download folder.
         First interaction sent out as visiting the twitter profile of the username given.
@@ -35,7 +39,43 @@ class ReportDownloader(object):
 
         :param download_folder (optional): where the downloaded report must be downloaded to. Default is working
         directory.
+        :param section: 'tweets' or 'videos', or a list of both to download them in the same session.
+        :param accounts (optional): List of account handles managed by the logged-in user (agency logins), downloaded
+        one after the other in the same session. Default is the username only.
+        With several sections or accounts, each section's reports go to their own subfolder of the download folder:
+        '<section>', or '<account>/<section>' with several accounts.
         :param show_browser: Show browser if True (for debugging). Default is False.
+        :param headless: Run Chrome in headless mode instead of inside an Xvfb virtual display. Default is False.
+        :param lean: Block images, media, fonts and trackers, disable extensions and GPU and cap the caches, to cut the
+        memory used per browser. Default is False.
+        :param export_mode: 'browser' clicks the export button for every date range. 'http' only uses the browser to
+        log in, then asks the export endpoint for every date range directly, `http_workers` requests at a time.
+        :param http_workers: Number of export requests in flight at once in 'http' export mode.
+        :param pacing: Anti-bot pacing between steps: 'human' (default, random 4-9 secs pauses), 'fast' (no pauses,
+        only waits for the page to be ready, rate limited per account) or a twitter_analytics.pacing.Pacer instance.
+        :param download_timeout: Maximum secs to wait for a report once the export button is clicked.
+        :param manifest (optional): Pathname of a sync manifest (or a twitter_analytics.manifest.SyncManifest). When
+        given, date ranges already downloaded once they stopped changing are skipped, and every new report is recorded
+        as soon as it is downloaded, so an interrupted run resumes where it stopped.
+        :param session_dir (optional): Folder where the Chrome profile and cookies of the account are kept between
+        runs. The login is skipped while the saved session is valid. A profile can't be used by two browsers at once.
+        :param tabs: Number of tabs of the logged-in browser downloading date ranges at once. While the reports of
+        some tabs are being generated, the calendar of the next tab is set and its export clicked. Default is 1.
+        :param planner (optional): How the period is cut into exports: a twitter_analytics.planner.RangePlanner, or
+        one of its policies ('months', 'largest' for 91 days windows, or a number of days). Default is calendar months.
+        :param columnar_store (optional): Folder of a twitter_analytics.columnar.ColumnarStore (or the store itself).
+        Every downloaded report is also added to its account/section/month partitions. Requires pyarrow.
+        :param rollup (optional): Pathname of a daily rollup index (or a twitter_analytics.rollup.DailyRollup). The
+        metrics of every new tweets report are added to the daily sums of their account.
+        :param retry (optional): twitter_analytics.retry.RetryScheduler: backoff, attempts and deadline of the export,
+        navigation and calendar steps, requeues of the failed date ranges and circuit breaker per account (share one
+        between downloaders to share the breaker). The ranges given up are listed in the `failures` attribute, and
+        run() raises DownloadFailed once the other ranges are downloaded.
+        :param calendar_strategy: How date ranges are picked: 'auto' (default) sets them through the date picker API
+        and falls back to clicking through the calendar, 'script' or 'click' to force one of them.
+        :param instrumentation (optional): twitter_analytics.instrumentation.Instrumentation collecting the timing of
+        every phase and the WebDriver round trips, sleeps and retries (e.g. to add hooks). One is created by default,
+        available as the `metrics` attribute.
         Dates are optional. Without dates, by default it will pull the last 28 days. The range must be maximum 91 days.
         (twitter restriction). The date string for those attributes must follow format 'mm/dd/yyyy'.
 
@@ -44,23 +84,66 @@ class ReportDownloader(object):
 
         self.username = username.lower()
         self.password = password
-
-        # Start creating fake display if not show_browser
+        self.accounts = [account.lower() for account in accounts] if accounts else [self.username]
+        self.account = self.accounts[0]     # account whose analytics pages are browsed
+        self.sections = [section] if isinstance(section, str) else list(section)
+        self.pacer = get_pacer(pacing, account=self.username)
+        self.metrics = instrumentation or Instrumentation()
+        self.labels = {'account': self.account, 'section': self.sections[0]}
+        self.pacer.sleep = self.metrics.wrap_sleep(self.pacer.sleep)
+        self.retry = (retry or RetryScheduler()).bind(self.pacer.sleep,
+                                                       on_retry=lambda step: self.metrics.count(step + '_retries'))
+        self.failures = list()
+
+        # Start creating fake display if not show_browser (headless Chrome doesn't need one)
         self.show_browser = show_browser
-        if not self.show_browser and SYST != 'windows':
-            self.display = Display(visible=0, size=(1200, 1000))
-            self.display.start()
-
-        self.section = section
+        self.headless = headless and not show_browser
+        self.display = None
+        if not self.show_browser and not self.headless and SYST != 'windows':
+            from pyvirtualdisplay import Display
+            with self.metrics.phase('display_start', **self.labels):
+                self.display = Display(visible=0, size=(1200, 1000))
+                self.display.start()
+
+        self.section = self.sections[0]
+        self.calendar_strategy = calendar_strategy
+        if export_mode not in ('browser', 'http'):
+            raise Exception('Unknown export mode')
+        self.export_mode = export_mode
+        self.http_workers = http_workers
+        self.tabs = max(1, tabs)
+        self.pages = dict()     # window handle -> ReportPage of the tab, None outside of download_in_tabs
+        self.tab = None
+        self.planner = planner if isinstance(planner, RangePlanner) else RangePlanner(planner or 'months')
 
         # Chromedriver settings
         self.download_folder = download_folder
-        chrome_options = webdriver.ChromeOptions()
-        prefs = {"download.default_directory": self.download_folder}
-        chrome_options.add_experimental_option("prefs", prefs)
-
-        if proxy is not None:
-            chrome_options.add_argument('--proxy-server={}'.format(proxy))
+        self.download_timeout = download_timeout
+        if manifest is not None:
+            from twitter_analytics.manifest import SyncManifest
+            if not isinstance(manifest, SyncManifest):
+                manifest = SyncManifest(manifest)
+        self.manifest = manifest
+        if columnar_store is not None:
+            from twitter_analytics.columnar import ColumnarStore
+            if not isinstance(columnar_store, ColumnarStore):
+                columnar_store = ColumnarStore(columnar_store)
+        self.columnar_store = columnar_store
+        if rollup is not None:
+            from twitter_analytics.rollup import DailyRollup
+            if not isinstance(rollup, DailyRollup):
+                rollup = DailyRollup(rollup)
+        self.rollup = rollup
+        self.session_store = SessionStore(session_dir) if session_dir is not None else None
+        self.lean = lean
+        options = chrome_options(
+            download_folder=self.download_folder,
+            proxy=proxy,
+            headless=self.headless,
+            lean=lean,
+            tabs=self.tabs,
+            profile_dir=self.session_store.profile_dir(self.username) if self.session_store is not None else None,
+        )
 
         # Some settings if running for a specific date range
         if from_date is not None and to_date is not None:
@@ -71,59 +154,442 @@ class ReportDownloader(object):
             self.has_date_range = False
 
         # Create Chrome Browser
-        if SYST == 'darwin':
-            self.browser = webdriver.Chrome(r"/usr/local/bin/chromedriver", chrome_options=chrome_options)
-        elif SYST == 'linux':
-            self.browser = webdriver.Chrome(r"/usr/lib/chromium-browser/chromedriver",chrome_options=chrome_options)
-        else:
-            windriver = os.environ.get('chromedriver') # get environment variable
-            if 'chromedriver.exe' in os.listdir() or windriver == None:
-                 self.browser = webdriver.Chrome(chrome_options=chrome_options)
-            else:
-                self.browser = webdriver.Chrome(windriver,chrome_options=chrome_options)
-
-        # Login on Twitter
+        with self.metrics.phase('browser_start', **self.labels):
+            self.browser = self.metrics.instrument_browser(create_browser(options))
+            if self.headless:
+                enable_downloads(self.browser, self.download_folder)
+            if lean:
+                block_urls(self.browser)
+
+        # Login on Twitter (with a session store, the saved session is checked first, see start_session)
         # self.browser.get("http://twitter.com/{}".format(self.username))
-        twitter_url = "https://twitter.com/login?redirect_after_login=https%3A%2F%2Fanalytics.twitter.com%2Fabout&hide_message=1"
-        self.browser.get(twitter_url)
+        if self.session_store is None:
+            self.browser.get(self.login_url)
 
     def run(self):
         """
         Main method that will do every interactions necessary to download the report, including picking dates in the
         calendar section.
-        :return: Pathname of the report.
+        With several sections or accounts, the login happens once and every (account, section) is downloaded in the
+        same session.
+        A date range still failing after its retries and requeues doesn't stop the run: DownloadFailed is raised at the
+        end, with the reports of the other ranges.
+        :return: List of pathnames of the reports, one per date range, named after the account, section and dates.
+        """
+        reports_downloaded = list()
+        try:
+            if self.nothing_to_download():
+                return []
+
+            self.start_session()
+            for account, section in self.targets():
+                if self.has_date_range:
+                    reports_downloaded += self.download(section, self.from_date, self.to_date, account=account)
+                else:
+                    reports_downloaded += self.download(section, account=account)
+        finally:
+            self.quit()
+        self.check_failures(reports_downloaded)
+        return reports_downloaded
+
+    def targets(self):
+        """
+        :return: List of (account, section) downloaded by run(), in order.
+        """
+        return [(account, section) for account in self.accounts for section in self.sections]
+
+    def nothing_to_download(self):
         """
+        :return: Boolean: True if every date range of every account and section is already downloaded.
+        """
+        return self.has_date_range and not any(self.planned_ranges(section, account=account)
+                                               for account, section in self.targets())
+
+    def check_failures(self, reports):
+        """
+        Raise DownloadFailed, with the reports downloaded, if some date ranges were given up.
+        """
+        if self.failures:
+            raise DownloadFailed(self.failures, reports)
+
+    @timed('start_session')
+    def start_session(self):
+        """
+        Log in and land on the analytics section. With a session store, the saved session is reused when it is still
+        valid and the login only happens when it has expired.
+        """
+        if self.session_store is not None:
+            if self.has_valid_session():
+                return
+            self.browser.get(self.login_url)
+
         self.login()
         self.go_to_analytics()
 
-        if self.section == 'tweets':
-            self.go_to_report_page()
-        elif self.section == 'videos':
-            self.go_to_video_page()
+        if self.session_store is not None:
+            self.session_store.save_cookies(self.username, self.browser)
+
+    @timed('session_check')
+    def has_valid_session(self):
+        """
+        Check whether the browser profile (or the saved cookies) still holds a logged-in session.
+        :return: Boolean: True if the analytics section opens without login.
+        """
+        self.browser.get(self.analytics_url)
+        if self.is_logged_in():
+            return True
+        if self.session_store.restore_cookies(self.username, self.browser):
+            self.browser.get(self.analytics_url)
+            return self.is_logged_in()
+        return False
+
+    def is_logged_in(self):
+        """
+        Logged-in users are redirected from the analytics root to their own analytics pages, the others to the
+        analytics 'about' page or to the login form.
+        """
+        return '/user/' in self.browser.current_url
+
+    def download(self, section=None, from_date=None, to_date=None, account=None):
+        """
+        Download the reports of one section in the current session, without closing the browser.
+
+        :param section (optional): 'tweets' or 'videos'. Default is the section given to the constructor.
+        :param from_date (optional): date string in the format 'mm/dd/yyyy'. Default is the last 28 days.
+        :param to_date (optional): date string in the format 'mm/dd/yyyy'. Default is the last 28 days.
+        :param account (optional): handle of a managed account. Default is the current account.
+        :return: List of pathnames of the reports. The date ranges given up are added to `failures`.
+        """
+        section = section or self.section
+        ranges = self.section_ranges(section, from_date, to_date, account)
+        if not ranges:
+            return []
+
+        if self.export_mode == 'http':
+            reports_downloaded = self.download_http_export(section, [last_28_days()] if ranges[0][0] is None
+                                                           else ranges)
+        elif self.tabs > 1 and len(ranges) > 1:
+            reports_downloaded = self.download_in_tabs(section, ranges)
         else:
+            reports_downloaded = self.download_ranges(section, ranges)
+        self.store_reports(section, reports_downloaded)
+        return reports_downloaded
+
+    def section_ranges(self, section, from_date=None, to_date=None, account=None):
+        """
+        Switch to an account and section, and plan the date ranges still to download.
+        :return: List of list of 2 items [0] = from and [1] = to, [[None, None]] for the default period (28 days).
+        Empty when everything is downloaded, or when the circuit of the account is open: its ranges are then given up.
+        """
+        if section not in ('tweets', 'videos'):
             raise Exception('Unknown section')
+        if account is not None:
+            self.account = account.lower()
+        self.labels.update(account=self.account, section=section, from_date=from_date, to_date=to_date)
 
-        # Pick date range if needed
-        if self.has_date_range:
-#            ranges = self.split_date_range_into_91(from_date=self.from_date, to_date=self.to_date)
-            ranges = self.split_date_range_into_months(from_date=self.from_date, to_date=self.to_date)
-            for rng in ranges:
-                date_range = AnalyticsCalendar(
-                    from_date=rng[0],
-                    to_date=rng[1],
-                    browser=self.browser
-                )
-                date_range.set_report_period()
-                self.download_report()
+        if from_date is not None and to_date is not None:
+            ranges = self.planned_ranges(section, from_date, to_date)
         else:
-            self.download_report()      # default period download (28 days).
+            ranges = [[None, None]]
+        if ranges and not self.retry.breaker.allows(self.account):
+            self.give_up(section, [(index, rng, self.circuit_open()) for index, rng in enumerate(ranges)])
+            return []
+        return ranges
 
-        random_time_sleep()     # to be sure report is fully downloaded
-        self.quit()
-        reports_downloaded = [os.path.join(self.download_folder,'') + report for report in os.listdir(self.download_folder)
-                              if '.csv' in report]
-        return reports_downloaded
+    def download_ranges(self, section, ranges):
+        """
+        Download the date ranges one after the other in the current tab. A range whose steps gave up is requeued after
+        the others (the section page is then loaded again), and added to `failures` once given up.
+        :param ranges: List of list of 2 items [0] = from and [1] = to, or [None, None] for the default period.
+        :return: List of pathnames of the reports, in the order of the ranges.
+        """
+        queue = self.retry.queue(ranges)
+        reports = [None] * len(ranges)
+        on_page = False
+        while queue:
+            item = self.next_range(queue)
+            if item is None:
+                self.pacer.sleep(queue.wait_time())     # only requeued ranges left, waiting for their backoff
+                continue
+            index, rng = item
+            try:
+                if not on_page:
+                    self.retry.call('navigation', self.go_to_section_page, section)
+                    on_page = True
+                if rng[0] is not None:
+                    self.retry.call('calendar', self.set_report_period, rng[0], rng[1])
+                report = self.download_report(from_date=rng[0], to_date=rng[1], section=section)
+            except Exception as error:
+                on_page = False
+                self.range_failed(queue, index, rng, error)
+                continue
+            self.range_downloaded(reports, index, rng, report, section)
+        return self.ranges_done(section, queue, reports)
+
+    def next_range(self, queue):
+        """
+        Take the next date range of a queue. The ranges of an account whose circuit is open are given up.
+        :return: (index, range), or None when the queue is empty or only holds ranges waiting for their backoff.
+        """
+        while queue:
+            item = queue.pop()
+            if item is None or self.retry.breaker.allows(self.account):
+                return item
+            queue.fail(item[0], item[1], self.circuit_open())
+        return None
+
+    def range_downloaded(self, reports, index, rng, report, section):
+        """
+        Record the report of a date range: in the list of reports, in the manifest, and as a success of the account.
+        """
+        self.retry.breaker.record_success(self.account)
+        if rng[0] is not None:
+            self.record_report(rng, report, section)
+        reports[index] = report
+
+    def ranges_done(self, section, queue, reports):
+        """
+        Give up the ranges the queue failed.
+        :return: List of pathnames of the reports downloaded, in the order of the ranges.
+        """
+        self.give_up(section, queue.failed)
+        return [report for report in reports if report is not None]
+
+    def range_failed(self, queue, index, rng, error):
+        """
+        Count a failure of the current account, and requeue the date range (or give it up).
+        """
+        self.retry.breaker.record_failure(self.account)
+        if queue.requeue(index, rng, error):
+            self.metrics.count('requeued_ranges')
+
+    def give_up(self, section, failed):
+        """
+        Add date ranges given up to `failures`.
+        :param failed: List of (index, range, error).
+        """
+        for index, rng, error in failed:
+            self.failures.append(FailedRange(self.account, section, rng[0], rng[1], error))
+        if failed:
+            self.metrics.count('failed_ranges', len(failed))
 
+    def circuit_open(self):
+        return CircuitOpen('Too many failures for {}, circuit open'.format(self.account))
+
+    def store_reports(self, section, reports):
+        """
+        Add the downloaded tweet reports to the columnar store and the daily rollup, if any. Video reports are only
+        downloaded: they have other columns.
+        """
+        if not reports or section != 'tweets':
+            return
+        if self.columnar_store is not None:
+            with self.metrics.phase('columnar_output', **self.labels):
+                self.columnar_store.add_reports(self.account, section, reports)
+        if self.rollup is not None:
+            with self.metrics.phase('rollup', **self.labels):
+                self.rollup.add_reports(self.account, reports)
+
+    @timed('download_in_tabs')
+    def download_in_tabs(self, section, ranges):
+        """
+        Download the date ranges in several tabs of the logged-in browser, interleaving their calendar selection and
+        download waits: every idle tab gets the next range, then all the tabs wait for their reports together. Each
+        report is attributed to its range by the start date in its file name. Failed ranges are requeued like in
+        download_ranges.
+        :return: List of pathnames of the reports, in the order of the ranges.
+        """
+        handles = self.open_tabs(min(self.tabs, len(ranges)))
+        queue = self.retry.queue(ranges)
+        in_flight = dict()      # window handle -> (index of the range, range, export button, export StepAttempt)
+        ready = set()           # tabs showing the section page
+        reports = [None] * len(ranges)
+        try:
+            with DownloadWatcher(self.download_folder, timeout=self.download_timeout) as watcher:
+                while queue or in_flight:
+                    for handle in handles:
+                        if handle in in_flight:
+                            continue
+                        item = self.next_range(queue)
+                        if item is None:
+                            break
+                        index, rng = item
+                        self.switch_to_tab(handle)
+                        try:
+                            if handle not in ready:
+                                if self.headless:
+                                    enable_downloads(self.browser, self.download_folder)    # set per tab
+                                if self.lean:
+                                    block_urls(self.browser)
+                                self.retry.call('navigation', self.go_to_section_page, section)
+                                ready.add(handle)
+                            self.retry.call('calendar', self.set_report_period, rng[0], rng[1])
+                            in_flight[handle] = (index, rng, self.click_export(),
+                                                 self.retry.start('export', self.download_timeout))
+                        except Exception as error:
+                            ready.discard(handle)
+                            self.range_failed(queue, index, rng, error)
+
+                    claimed = watcher.claim_any(dict(
+                        (handle, self.expected_report(rng[0], rng[1], section))
+                        for handle, (index, rng, button, attempt) in in_flight.items()))
+                    for handle, path in claimed.items():
+                        index, rng = in_flight.pop(handle)[:2]
+                        self.range_downloaded(reports, index, rng, path, section)
+                    if claimed:
+                        continue
+
+                    for handle, (index, rng, button, attempt) in list(in_flight.items()):
+                        if attempt.waiting and not attempt.ready() and not attempt.expired():
+                            continue
+                        try:
+                            if attempt.expired():
+                                raise DownloadTimeout('No report downloaded in {} for {} - {} after {} secs'.format(
+                                    self.download_folder, rng[0], rng[1], attempt.deadline))
+                            self.switch_to_tab(handle)
+                            self.retry_export_on_error(attempt, button)
+                        except Exception as error:
+                            del in_flight[handle]
+                            ready.discard(handle)       # load the page again before the next range of the tab
+                            self.range_failed(queue, index, rng, error)
+                    watcher.wait_for_event(watcher.poll_frequency)
+        finally:
+            self.close_tabs(handles)
+        return self.ranges_done(section, queue, reports)
+
+    def open_tabs(self, count):
+        """
+        Open new tabs in the browser, which share its logged-in session, until there are `count` of them.
+        :return: Window handles of the tabs, the current one first.
+        """
+        current = self.browser.current_window_handle
+        handles = [current] + [handle for handle in self.browser.window_handles if handle != current]
+        while len(handles) < count:
+            known = set(handles)
+            self.browser.execute_script('window.open("about:blank", "_blank");')
+            handles += [handle for handle in self.browser.window_handles if handle not in known]
+        return handles[:count]
+
+    def close_tabs(self, handles):
+        """
+        Close the tabs opened by open_tabs and go back to the first one.
+        """
+        for handle in handles[1:]:
+            self.switch_to_tab(handle)
+            self.browser.close()
+        self.browser.switch_to.window(handles[0])
+        self.pages.clear()
+        self.tab = None
+
+    def switch_to_tab(self, handle):
+        """
+        Switch the browser to a tab. Each tab keeps its own ReportPage, so its located elements stay valid.
+        """
+        self.browser.switch_to.window(handle)
+        self.tab = handle
+
+    @property
+    def page(self):
+        """
+        twitter_analytics.pages.ReportPage of the current tab.
+        """
+        if self.tab not in self.pages:
+            self.pages[self.tab] = ReportPage(self.browser, self.pacer)
+        return self.pages[self.tab]
+
+    def set_report_period(self, from_date, to_date):
+        """
+        Select a date range in the calendar of the current page.
+        """
+        self.labels.update(from_date=from_date, to_date=to_date)
+        date_range = AnalyticsCalendar(
+            from_date=from_date,
+            to_date=to_date,
+            browser=self.browser,
+            pacer=self.pacer,
+            strategy=self.calendar_strategy,
+            page=self.page,
+        )
+        with self.metrics.phase('set_report_period', **self.labels):
+            date_range.set_report_period()
+        if self.calendar_strategy == 'auto' and date_range.strategy_used == 'click':
+            self.metrics.count('calendar_fallbacks')
+
+    @timed('http_export')
+    def download_http_export(self, section, ranges):
+        """
+        Download every date range through the export endpoint, reusing the cookies of the logged-in browser. Each export
+        is retried with the export policy, and the ranges still failing are added to `failures`.
+        :return: List of pathnames of the reports.
+        """
+        from twitter_analytics.export import HttpExporter
+
+        exporter = HttpExporter.from_browser(self.browser, self.account, workers=self.http_workers)
+        folder = os.path.join(self.download_folder, self.report_subfolder(section))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        failed = list()
+
+        def exported(rng, path):
+            self.retry.breaker.record_success(self.account)
+            self.record_report(rng, path, section)
+
+        def export_failed(rng, error):
+            self.retry.breaker.record_failure(self.account)
+            failed.append((ranges.index(rng), rng, error))
+
+        reports = exporter.export_many(section, ranges, folder, on_report=exported, retry=self.retry,
+                                       on_error=export_failed)
+        self.give_up(section, sorted(failed, key=lambda item: item[0]))
+        return reports
+
+    def report_subfolder(self, section, account=None):
+        """
+        Subfolder of the download folder for the reports of a section of an account (default the current one): none
+        when the downloader runs a single section of a single account, '<section>' or '<account>/<section>' otherwise.
+        """
+        if len(self.accounts) > 1:
+            return os.path.join(account or self.account, section)
+        if len(self.sections) > 1:
+            return section
+        return ''
+
+    def planned_ranges(self, section=None, from_date=None, to_date=None, account=None):
+        """
+        Date ranges to download: the requested period cut by the planner (into months by default), minus the windows
+        the manifest (if any) holds a final report for, and the final local reports if the planner skips them.
+        :param account (optional): handle of a managed account. Default is the current account.
+        :return: List of list of 2 items [0] = from and [1] = to. Empty without a date range.
+        """
+        return self.plan(section, from_date, to_date, account).ranges()
+
+    def plan(self, section=None, from_date=None, to_date=None, account=None):
+        """
+        Export plan of a section, with its cost estimate: see planned_ranges.
+        :return: twitter_analytics.planner.ExportPlan
+        """
+        if from_date is None or to_date is None:
+            if not self.has_date_range:
+                return ExportPlan([], 0, 0)
+            from_date, to_date = self.from_date, self.to_date
+        account = account or self.account
+        section = section or self.section
+        covered = list()
+        if self.manifest is not None:
+            covered += self.manifest.final_windows(account, section)
+        if self.planner.skip_local_reports:
+            folder = os.path.join(self.download_folder, self.report_subfolder(section, account))
+            covered += local_report_ranges(folder, account, section, self.planner.refresh_days)
+        return self.planner.plan(from_date, to_date, covered)
+
+    def record_report(self, rng, path, section=None):
+        """
+        Record a downloaded date range in the manifest, if any.
+        """
+        if self.manifest is not None:
+            self.manifest.record(self.account, section or self.section, rng[0], rng[1], path)
+
+    @timed('login')
     def login(self):
         """
         Login to twitter.
@@ -132,15 +598,19 @@ class ReportDownloader(object):
         # element_to_hover_over = self.browser.find_element_by_xpath('//a[@href="/login"]')
         # hover = ActionChains(self.browser).move_to_element(element_to_hover_over)
         # hover.perform()
-        random_time_sleep()
+        username_field = self.pacer.wait_for_element(
+            self.browser, '//input[@class="js-username-field email-input js-initial-focus"]')
+        self.pacer.pause()
 
         # Fills with credentials and click 'Log in'
-        self.browser.find_element_by_xpath(
-            '//input[@class="js-username-field email-input js-initial-focus"]').send_keys(self.username)
+        username_field.send_keys(self.username)
         self.browser.find_element_by_xpath('//input[@class="js-password-field"]').send_keys(self.password)
-        self.browser.find_element_by_xpath('//button[@type="submit"]').click()
+        submit_button = self.browser.find_element_by_xpath('//button[@type="submit"]')
+        submit_button.click()
 
-        random_time_sleep()
+        # The login page is replaced once the credentials are accepted
+        self.pacer.wait_for_staleness(self.browser, submit_button)
+        self.pacer.pause()
 
         # NOT NEEDED ANY MORE
         # =======================================================
@@ -151,14 +621,15 @@ class ReportDownloader(object):
         # self.browser.find_element_by_xpath('//input[@value="Log in"]').click()
         # =======================================================
 
+    @timed('go_to_analytics')
     def go_to_analytics(self):
         """
         Goes to the Analytics section
         """
-        random_time_sleep()
+        self.pacer.pause()
 
         # Going directly to the analytics page
-        self.browser.get("https://analytics.twitter.com/")
+        self.browser.get(self.analytics_url)
 
         # THE FOLLOWING CODE IS NO LONGER NEEDED
         # AS TWITTER HAS CHANGED THEIR PAGE LAYOUT
@@ -178,41 +649,94 @@ class ReportDownloader(object):
         #     '//li[@role="presentation"]/a[@href="https://analytics.twitter.com/"]').click()
         # =======================================================
 
-        random_time_sleep()
+        self.pacer.pause()
+
+    def go_to_section_page(self, section):
+        if section == 'tweets':
+            self.go_to_report_page()
+        else:
+            self.go_to_video_page()
 
+    @timed('go_to_report_page')
     def go_to_report_page(self):
         """
         Goes to the analytics page where we can download the report.
         """
-        self.browser.get('https://analytics.twitter.com/user/{}/tweets'.format(self.username))
-        random_time_sleep()
+        self.browser.get('{}user/{}/tweets'.format(self.analytics_url, self.account))
+        self.page.reset()
+        self.page.wait_for(lambda state: state['export_present'])
+        self.pacer.pause()
 
+    @timed('go_to_video_page')
     def go_to_video_page(self):
         """
         Goes to the page with video statistics
         """
-        self.browser.get('https://analytics.twitter.com/user/{}/videos'.format(self.username))
-        random_time_sleep()
+        self.browser.get('{}user/{}/videos'.format(self.analytics_url, self.account))
+        self.page.reset()
+        self.page.wait_for(lambda state: state['export_present'])
+        self.pacer.pause()
 
-    def download_report(self):
+    @timed('download_report')
+    def download_report(self, from_date=None, to_date=None, section=None):
+        """
+        Click on the button to launch download, then wait for the new report to be written in the download folder.
+        Check routinely if the download bug occurred, and re-click the download button if it is the case, with the
+        backoff of the export retry policy. Raises StepFailed when the policy gives up, and DownloadTimeout when no
+        report arrives before the deadline of the export step (default download_timeout).
+
+        The report is renamed after the account, section and date range, so it can't be mistaken for an older file
+        or for the report of another run using the same folder.
+
+        :param from_date (optional): start of the date range selected in the calendar, format 'mm/dd/yyyy'.
+        :param to_date (optional): end of the date range selected in the calendar, format 'mm/dd/yyyy'.
+        Default is the last 28 days.
+        :param section (optional): section of the page displayed. Default is the section given to the constructor.
+        :return: Pathname of the report.
+        """
+        match, rename_to = self.expected_report(from_date, to_date, section)
+        attempt = self.retry.start('export', self.download_timeout)
+        with DownloadWatcher(self.download_folder, timeout=self.download_timeout) as watcher:
+            download_button = self.click_export()
+            return watcher.wait_for_file(match=match, rename_to=rename_to, timeout=attempt.remaining(),
+                                         on_idle=lambda: self.retry_export_on_error(attempt, download_button))
+
+    def retry_export_on_error(self, attempt, download_button):
+        """
+        Schedule a new click of the export button when the server error shows, and click once the backoff is over. The
+        page isn't checked while a click is scheduled.
+        :param attempt: twitter_analytics.retry.StepAttempt of the export.
         """
-        Click on the button to launch download. Check number of files in download folder first, and then check if
-        number changes to detect when the report is downloaded.
-        Check routinely if the download bug occurred, and re-click the download button if it is the case.
+        if attempt.ready():
+            attempt.retrying()
+            self.metrics.count('export_retries')
+            download_button.click()
+        elif not attempt.waiting and self.report_error_occurred():
+            attempt.failed()
+
+    def expected_report(self, from_date=None, to_date=None, section=None):
+        """
+        How to recognise the report of a date range among the downloaded files, and what to rename it to.
+        :return: Tuple (predicate on the file name, deterministic file name, relative to the download folder).
+        """
+        section = section or self.section
+        if from_date is None or to_date is None:
+            from_date, to_date = last_28_days()
+            match = report_matcher(self.account, section=section)
+        else:
+            match = report_matcher(self.account, from_date, to_date, section)
+        filename = report_filename(self.account, section, from_date, to_date)
+        return match, os.path.join(self.report_subfolder(section), filename)
 
+    def click_export(self):
         """
-        random_time_sleep()
-        len_download_folder = len(os.listdir(self.download_folder))
-        download_button = self.browser.find_element_by_xpath(
-            '//div[@id="export"]/button[@class="btn btn-default ladda-button"]'
-        )
+        Wait for the export button to be enabled and click it.
+        :return: The export button element, to click it again if the export fails.
+        """
+        self.pacer.pause()
+        download_button = self.page.wait_for_export()
         download_button.click()
-
-        while len(os.listdir(self.download_folder)) == len_download_folder:
-            if self.report_error_occurred():
-                download_button.click()
-
-            random_time_sleep()
+        return download_button
 
     def report_error_occurred(self):
         """
@@ -220,11 +744,18 @@ class ReportDownloader(object):
         :return: Boolean: True if bug occurred, False if it did not.
         # error server Callout Callout--danger
         """
-        try:
-            self.browser.find_element_by_xpath('//div[@class="error server Callout Callout--danger"]')
-        except NoSuchElementException:
-            return False
-        return True
+        return self.page.error_occurred()
+
+    @staticmethod
+    def run_many(jobs, workers=None, download_folder=None):
+        """
+        Run many (username, section, from/to) jobs across a pool of worker processes, each worker with its own
+        browser, virtual display and per-job download folder.
+        See twitter_analytics.runner.run_many for the parameters.
+        :return: List of JobResult, one per job, in the order of the jobs.
+        """
+        from twitter_analytics.runner import run_many
+        return run_many(jobs, workers=workers, download_folder=download_folder)
 
     @staticmethod
     def split_date_range_into_91(from_date, to_date):
@@ -232,18 +763,7 @@ class ReportDownloader(object):
         Split the date range into 91 days segment to batch the scraping of the calendar for period longer than 91 days.
         :return: List of list of 2 items [0] = from and [1] = to.
         """
-        from_date = datetime.strptime(from_date, '%m/%d/%Y')
-        to_date = datetime.strptime(to_date, '%m/%d/%Y')
-        delta = to_date - from_date
-        number_of_batch = ceil(float(delta.days) / 90)
-
-        batches = list()
-        start_date = from_date
-        for batch in range(0, int(number_of_batch)):
-            end_date = start_date + timedelta(days=90)
-            batches.append([start_date.strftime('%m/%d/%Y'), end_date.strftime('%m/%d/%Y')])
-            start_date = end_date + timedelta(days=1)
-        return batches
+        return dateranges.split_date_range_into_91(from_date, to_date)
 
     @staticmethod
     def split_date_range_into_months(from_date, to_date):
@@ -253,31 +773,12 @@ class ReportDownloader(object):
         28-31 days.
         :return: List of list of 2 items [0] = from and [1] = to.
         """
-        from_date = datetime.strptime(from_date, '%m/%d/%Y')
-        to_date = datetime.strptime(to_date, '%m/%d/%Y')
-        delta = to_date - from_date
-        batches = list()
-        dates = [dt for dt in rrule(MONTHLY, dtstart=from_date, until=to_date)]
-        num_dates = len(dates)
-        for i, mydate in enumerate(dates):
-            yr = mydate.year
-            mth = mydate.month
-            dd = calendar.monthrange(yr, mth)[1]
-            if i == 0:
-                first = from_date
-            else:
-                first = date(yr, mth, 1)
-            if i == num_dates-1:
-                last = to_date
-            else:
-                last = date(yr, mth, dd)
-            batches.append([first.strftime('%m/%d/%Y'), last.strftime('%m/%d/%Y')])
-        return batches
-
+        return dateranges.split_date_range_into_months(from_date, to_date)
 
+    @timed('quit')
     def quit(self):
-        random_time_sleep()
+        self.pacer.pause()
         self.browser.quit()
 
-        if not self.show_browser and SYST != 'windows':
+        if self.display is not None:
             self.display.stop()
@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlencode, urlsplit
+
+from twitter_analytics.utils import report_filename
+
+
+class ExportError(Exception):
+    """ Raised when the export endpoint refuses a request or never makes the report available. """
+
+
+class HttpExporter(object):
+
+    """
+    Download CSV reports straight from the analytics export endpoint, reusing the cookies of a logged-in browser.
+    Selenium is only needed for the login: every date range is then a couple of HTTP requests, several of them in
+    flight at once over a pool of keep-alive connections.
+    """
+
+    base_url = 'https://analytics.twitter.com'
+
+    def __init__(self, username, cookies, base_url=None, workers=4, user_agent=None, timeout=60, poll_interval=1,
+                 max_polls=60):
+        """
+        :param username: Twitter username
+        :param cookies: Session cookies, either a dict name => value or a list of Selenium cookie dicts.
+        :param base_url (optional): Root of the analytics site. Default is https://analytics.twitter.com
+        :param workers: Number of requests in flight at once.
+        :param user_agent (optional): User agent to send, ideally the one of the browser that logged in.
+        :param timeout: Socket timeout in secs.
+        :param poll_interval: Secs between two checks of a report still being prepared by the server.
+        :param max_polls: Number of checks before giving up on a report.
+        """
+        self.username = username.lower()
+        self.base_url = (base_url or self.base_url).rstrip('/')
+        self.workers = workers
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+
+        if not isinstance(cookies, dict):
+            cookies = dict((cookie['name'], cookie['value']) for cookie in cookies)
+        self.headers = {
+            'Cookie': '; '.join('{}={}'.format(name, value) for name, value in cookies.items()),
+            'Accept': '*/*',
+        }
+        if 'ct0' in cookies:
+            self.headers['x-csrf-token'] = cookies['ct0']
+        if user_agent is not None:
+            self.headers['User-Agent'] = user_agent
+
+        url = urlsplit(self.base_url)
+        self._connection_class = HTTPSConnection if url.scheme == 'https' else HTTPConnection
+        self._host = url.netloc
+        self._path_prefix = url.path
+        self._local = threading.local()
+        self._connections = list()      # keep-alive connections of every thread, closed by close()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_browser(cls, browser, username, **kwargs):
+        """
+        Build an exporter from a Selenium browser which is already logged in.
+        """
+        kwargs.setdefault('user_agent', browser.execute_script('return navigator.userAgent;'))
+        return cls(username, browser.get_cookies(), **kwargs)
+
+    def export(self, section, from_date, to_date):
+        """
+        Ask the export endpoint for the report of one date range and wait until it is available.
+
+        :param section: 'tweets' or 'videos'
+        :param from_date: date string in the format 'mm/dd/yyyy'
+        :param to_date: date string in the format 'mm/dd/yyyy'
+        :return: CSV content as bytes.
+        """
+        query = urlencode({
+            'start_time': _epoch_millis(from_date),
+            'end_time': _epoch_millis(to_date, end_of_day=True),
+            'lang': 'en',
+        })
+        base_path = '{}/user/{}/{}'.format(self._path_prefix, self.username, section)
+
+        for _ in range(self.max_polls):
+            status, body = self._request('POST', '{}/export.json?{}'.format(base_path, query))
+            if status != 200:
+                raise ExportError('Export of {} - {} failed with HTTP {}'.format(from_date, to_date, status))
+            if json.loads(body.decode('utf-8')).get('status') == 'Available':
+                break
+            time.sleep(self.poll_interval)
+        else:
+            raise ExportError('Report {} - {} was never made available'.format(from_date, to_date))
+
+        status, body = self._request('GET', '{}/bundle?{}'.format(base_path, query))
+        if status != 200:
+            raise ExportError('Download of {} - {} failed with HTTP {}'.format(from_date, to_date, status))
+        return body
+
+    def export_many(self, section, ranges, download_folder, on_report=None, retry=None, on_error=None):
+        """
+        Export every date range, `workers` at a time, and write each report in the download folder.
+
+        :param section: 'tweets' or 'videos'
+        :param ranges: List of list of 2 items [0] = from and [1] = to, as returned by split_date_range_into_months.
+        :param download_folder: Folder where the reports are written.
+        :param on_report (optional): Callback called with (range, pathname) as soon as each report is written.
+        :param retry (optional): twitter_analytics.retry.RetryScheduler retrying every export with its 'export' policy.
+        :param on_error (optional): Callback called with (range, exception) for a range which failed. Without it, the
+        first failure is raised.
+        :return: List of pathnames of the reports, in the order of the ranges (the failed ones left out).
+        """
+        def export_one(rng):
+            try:
+                if retry is not None:
+                    content = retry.call('export', self.export, section, rng[0], rng[1])
+                else:
+                    content = self.export(section, rng[0], rng[1])
+            except Exception as error:
+                if on_error is None:
+                    raise
+                on_error(rng, error)
+                return None
+            path = os.path.join(download_folder, report_filename(self.username, section, rng[0], rng[1]))
+            with open(path, 'wb') as report:
+                report.write(content)
+            if on_report is not None:
+                on_report(rng, path)
+            return path
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(ranges))))
+        try:
+            return [path for path in executor.map(export_one, ranges) if path is not None]
+        finally:
+            executor.shutdown()
+            self.close()
+
+    def close(self):
+        """
+        Close the keep-alive connections of every thread. The next request opens a new one.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, list()
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def _request(self, method, path):
+        """
+        Send a request on the keep-alive connection of the current thread, reconnecting once if the server closed it.
+        """
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._connection_class(self._host, timeout=self.timeout)
+                with self._lock:
+                    self._connections.append(connection)
+                    self._local.connection = connection
+            try:
+                connection.request(method, path, headers=self.headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (HTTPException, OSError):
+                connection.close()
+                with self._lock:
+                    if connection in self._connections:
+                        self._connections.remove(connection)
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+def _epoch_millis(date_string, end_of_day=False):
+    day = datetime.strptime(date_string, '%m/%d/%Y')
+    if end_of_day:
+        day += timedelta(days=1)
+    return int((day - datetime(1970, 1, 1)).total_seconds() * 1000)
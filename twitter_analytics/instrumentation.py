@@ -0,0 +1,195 @@
+import functools
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# Counter of the WebDriver commands sent by an instrumented browser
+ROUND_TRIPS = 'webdriver_round_trips'
+
+
+class Instrumentation(object):
+
+    """
+    Collects the timing of every phase of a run (login, navigation, calendar, download wait...), and counters such as
+    WebDriver round trips, sleeps and retries.
+
+    Every phase emits a 'start' and an 'end' event, labelled with the account, section and date range, to the hooks
+    (callables taking the event dict). The whole run can be exported as a JSON run report or as Prometheus text.
+    """
+
+    def __init__(self, hooks=None, clock=time.time):
+        """
+        :param hooks (optional): List of callables called with every event dict.
+        :param clock: Function returning the current time in secs.
+        """
+        self.hooks = list(hooks or [])
+        self.clock = clock
+        self.started = clock()
+        self.phases = list()
+        self.counters = dict()
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+
+    @contextmanager
+    def phase(self, name, **labels):
+        """
+        Time the enclosed block as a phase of the run, and count the WebDriver round trips made during it (nested
+        phases included).
+
+        with instrumentation.phase('login', account='username'):
+            ...
+        """
+        start = self.clock()
+        with self.lock:
+            trips = self.counters.get(ROUND_TRIPS, 0)
+        self.emit(dict(labels, event='start', phase=name, time=start))
+        error = None
+        try:
+            yield
+        except BaseException as exception:
+            error = type(exception).__name__
+            raise
+        finally:
+            end = self.clock()
+            record = dict(labels, phase=name, start=start, end=end, duration=end - start, error=error)
+            with self.lock:
+                record['round_trips'] = self.counters.get(ROUND_TRIPS, 0) - trips
+                self.phases.append(record)
+            self.emit(dict(record, event='end', time=end))
+
+    def count(self, name, value=1):
+        """
+        Increase a counter, e.g. count('export_retries').
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.emit({'event': 'count', 'counter': name, 'value': value, 'time': self.clock()})
+
+    def instrument_browser(self, browser):
+        """
+        Count every WebDriver command sent by the browser (each one is an HTTP round trip to chromedriver).
+        """
+        execute = browser.execute
+
+        @functools.wraps(execute)
+        def counted_execute(driver_command, params=None):
+            self.count(ROUND_TRIPS)
+            return execute(driver_command, params)
+        browser.execute = counted_execute
+        return browser
+
+    def wrap_sleep(self, sleep):
+        """
+        :return: Sleep function counting the sleeps and the secs slept.
+        """
+        @functools.wraps(sleep)
+        def counted_sleep(seconds):
+            self.count('sleeps')
+            self.count('sleep_seconds', seconds)
+            return sleep(seconds)
+        return counted_sleep
+
+    def report(self):
+        """
+        :return: Structured run report: every phase, total time and round trips per phase name and the counters.
+        """
+        with self.lock:
+            phases = list(self.phases)
+            counters = dict(self.counters)
+        totals = dict()
+        for record in phases:
+            total = totals.setdefault(record['phase'], {'count': 0, 'seconds': 0.0, 'errors': 0, 'round_trips': 0})
+            total['count'] += 1
+            total['seconds'] += record['duration']
+            total['errors'] += record['error'] is not None
+            total['round_trips'] += record['round_trips']
+        return {
+            'started': self.started,
+            'elapsed': self.clock() - self.started,
+            'phases': phases,
+            'totals': totals,
+            'counters': counters,
+        }
+
+    def to_json(self, path=None):
+        """
+        :param path (optional): Pathname where the run report is written.
+        :return: Run report as a JSON string.
+        """
+        content = json.dumps(self.report(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as report_file:
+                report_file.write(content)
+        return content
+
+    def prometheus_text(self, prefix='twitter_analytics', labels=None):
+        """
+        Counters and phase totals in the Prometheus text exposition format, e.g. for the node exporter textfile
+        collector.
+        """
+        report = self.report()
+        base_labels = dict(labels or {})
+        lines = []
+        for name, value in sorted(report['counters'].items()):
+            lines.append('{}_{}_total{} {}'.format(prefix, name, _prometheus_labels(base_labels), value))
+        for phase, total in sorted(report['totals'].items()):
+            phase_labels = _prometheus_labels(dict(base_labels, phase=phase))
+            lines.append('{}_phase_seconds_sum{} {}'.format(prefix, phase_labels, total['seconds']))
+            lines.append('{}_phase_seconds_count{} {}'.format(prefix, phase_labels, total['count']))
+            lines.append('{}_phase_errors_total{} {}'.format(prefix, phase_labels, total['errors']))
+            lines.append('{}_phase_round_trips_total{} {}'.format(prefix, phase_labels, total['round_trips']))
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                          for key, value in sorted(labels.items())) + '}'
+
+
+class StatsdHook(object):
+
+    """
+    Hook sending phase timings and counters to a StatsD server over UDP, as they happen.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='twitter_analytics'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, event):
+        if event['event'] == 'end':
+            self.send('{}.phase.{}:{:d}|ms'.format(self.prefix, event['phase'], int(event['duration'] * 1000)))
+            if event['error'] is not None:
+                self.send('{}.phase.{}.errors:1|c'.format(self.prefix, event['phase']))
+        elif event['event'] == 'count':
+            self.send('{}.{}:{}|c'.format(self.prefix, event['counter'], event['value']))
+
+    def send(self, metric):
+        try:
+            self.socket.sendto(metric.encode('utf-8'), self.address)
+        except OSError:
+            pass        # metrics must never break a download
+
+
+def timed(phase_name):
+    """
+    Decorator timing a ReportDownloader method as a phase, labelled with the downloader's current labels.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.phase(phase_name, **self.labels):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from twitter_analytics.dateranges import from_iso, is_final, parse_date, parse_iso, to_iso
+
+
+class SyncManifest(object):
+
+    """
+    Local SQLite record of the report windows already downloaded, per (account, section, from, to).
+
+    A window is final once it was downloaded `refresh_days` or more after its last day: Twitter keeps updating the
+    metrics of recent tweets, so a window downloaded earlier is fetched again until a final copy exists. Windows are
+    recorded as soon as their report is on disk, so a crashed run resumes where it stopped.
+    """
+
+    def __init__(self, path, refresh_days=3):
+        """
+        :param path: Pathname of the SQLite file (created if missing).
+        :param refresh_days: Number of days after its end during which a window is still changing.
+        """
+        self.path = path
+        self.refresh_days = refresh_days
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS windows ('
+                ' account TEXT NOT NULL, section TEXT NOT NULL, from_date TEXT NOT NULL, to_date TEXT NOT NULL,'
+                ' path TEXT, downloaded_on TEXT NOT NULL, downloaded_at REAL NOT NULL,'
+                ' PRIMARY KEY (account, section, from_date, to_date))'
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, account, section, from_date, to_date, path, downloaded_on=None):
+        """
+        Record a downloaded window.
+
+        :param from_date: date string in the format 'mm/dd/yyyy'
+        :param to_date: date string in the format 'mm/dd/yyyy'
+        :param path: Pathname of the report.
+        :param downloaded_on (optional): date of the download. Default is today.
+        """
+        downloaded_on = downloaded_on or date.today()
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (account.lower(), section, to_iso(from_date), to_iso(to_date), path, downloaded_on.isoformat(),
+                 time.time())
+            )
+
+    def is_final(self, account, section, from_date, to_date):
+        """
+        :return: True if the window was downloaded once it stopped changing.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT downloaded_on FROM windows WHERE account = ? AND section = ? AND from_date = ? AND to_date = ?',
+                (account.lower(), section, to_iso(from_date), to_iso(to_date))
+            ).fetchone()
+        if row is None:
+            return False
+        return is_final(parse_date(to_date), parse_iso(row[0]), self.refresh_days)
+
+    def pending(self, account, section, ranges):
+        """
+        Filter the planned date ranges down to the ones still to download: never downloaded, or only downloaded while
+        they were still changing.
+
+        :param ranges: List of list of 2 items [0] = from and [1] = to, as returned by split_date_range_into_months.
+        :return: List of the ranges to download, in the same order.
+        """
+        return [rng for rng in ranges if not self.is_final(account, section, rng[0], rng[1])]
+
+    def final_windows(self, account, section):
+        """
+        :return: List of list of 2 items [0] = from and [1] = to, of the windows downloaded once they stopped changing.
+        """
+        return [[from_date, to_date] for from_date, to_date, path, downloaded_on in self.downloaded(account, section)
+                if is_final(parse_date(to_date), parse_date(downloaded_on), self.refresh_days)]
+
+    def downloaded(self, account, section):
+        """
+        :return: List of (from_date, to_date, path, downloaded_on) of the recorded windows, dates as 'mm/dd/yyyy'.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT from_date, to_date, path, downloaded_on FROM windows WHERE account = ? AND section = ? '
+                'ORDER BY from_date', (account.lower(), section)
+            ).fetchall()
+        return [(from_iso(row[0]), from_iso(row[1]), row[2], from_iso(row[3])) for row in rows]
@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+
+
+class TokenBucket(object):
+
+    """
+    Token bucket rate limiter: allows bursts of `capacity` actions, refilled at `rate` actions per second.
+    Thread safe, so one bucket can be shared by every browser driving the same account in a process.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.time):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of tokens stored (size of a burst).
+        :param clock: Function returning the current time in secs.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take one token, borrowing it from the future if the bucket is empty.
+        :return: Number of secs to wait before acting.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+_account_buckets = {}
+_account_buckets_lock = threading.Lock()
+
+
+def account_bucket(account, rate, capacity=1):
+    """
+    Token bucket shared by every pacer of the same account (and rate) in this process.
+    """
+    key = (account, rate, capacity)
+    with _account_buckets_lock:
+        if key not in _account_buckets:
+            _account_buckets[key] = TokenBucket(rate, capacity)
+        return _account_buckets[key]
+
+
+class Pacer(object):
+
+    """
+    Decides how long the browser waits between two steps.
+
+    Waits are split in two: readiness waits block only until the page is actually ready (element present, calendar
+    header changed, export button enabled...), and the anti-bot policy (random jitter plus an optional per-account
+    token bucket) adds a human-looking pause on top of it.
+    """
+
+    def __init__(self, jitter=(4, 9), small_jitter=(0.3, 0.8), rate=None, burst=1, timeout=30, poll_frequency=0.2,
+                 account=None, sleep=time.sleep):
+        """
+        :param jitter: (min, max) secs of random pause after a page level step (login, navigation, export).
+        :param small_jitter: (min, max) secs of random pause after a small step (calendar arrow click).
+        :param rate (optional): Maximum number of steps per second for an account. None means no rate limit.
+        :param burst: Number of steps allowed in a burst by the rate limiter.
+        :param timeout: Maximum secs to wait for the page to be ready.
+        :param poll_frequency: Secs between two readiness checks.
+        :param account (optional): Account whose token bucket is used when a rate is given.
+        :param sleep: Sleep function, can be replaced for tests and benchmarks.
+        """
+        self.jitter = jitter
+        self.small_jitter = small_jitter
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.account = account
+        self.sleep = sleep
+        self.bucket = account_bucket(account, rate, burst) if rate else None
+
+    def for_account(self, account):
+        """
+        Copy of this pacer bound to the token bucket of the given account.
+        """
+        return Pacer(jitter=self.jitter, small_jitter=self.small_jitter, rate=self.rate, burst=self.burst,
+                     timeout=self.timeout, poll_frequency=self.poll_frequency, account=account, sleep=self.sleep)
+
+    def delay(self, small=False):
+        """
+        Secs to pause before the next step: random jitter, plus the wait imposed by the rate limiter.
+        """
+        low, high = self.small_jitter if small else self.jitter
+        seconds = random.uniform(low, high) if high > 0 else 0.0
+        if self.bucket is not None:
+            seconds = max(seconds, self.bucket.reserve())
+        return seconds
+
+    def pause(self, small=False):
+        """
+        Anti-bot pause between two steps.
+        """
+        seconds = self.delay(small)
+        if seconds > 0:
+            self.sleep(seconds)
+
+    def poll(self):
+        """
+        Sleep between two checks of a condition polled by hand.
+        """
+        self.sleep(self.poll_frequency)
+
+    def wait_until(self, browser, condition, timeout=None):
+        """
+        Block until condition(browser) returns something truthy, and return it.
+        Raises selenium TimeoutException after `timeout` secs.
+        """
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        wait = WebDriverWait(browser, self.timeout if timeout is None else timeout,
+                             poll_frequency=self.poll_frequency)
+        return wait.until(condition)
+
+    @staticmethod
+    def _conditions():
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        return By, expected_conditions
+
+    def wait_for_element(self, browser, xpath, timeout=None):
+        """
+        Wait for an element to be present in the page.
+        """
+        By, expected_conditions = self._conditions()
+        return self.wait_until(browser, expected_conditions.presence_of_element_located((By.XPATH, xpath)), timeout)
+
+    def wait_for_visible(self, browser, xpath, timeout=None):
+        """
+        Wait for an element to be displayed.
+        """
+        By, expected_conditions = self._conditions()
+        return self.wait_until(browser, expected_conditions.visibility_of_element_located((By.XPATH, xpath)), timeout)
+
+    def wait_for_invisible(self, browser, xpath, timeout=None):
+        """
+        Wait for an element to be hidden or removed from the page.
+        """
+        By, expected_conditions = self._conditions()
+        return self.wait_until(browser, expected_conditions.invisibility_of_element_located((By.XPATH, xpath)),
+                               timeout)
+
+    def wait_for_clickable(self, browser, xpath, timeout=None):
+        """
+        Wait for an element to be displayed and enabled (e.g. the export button).
+        """
+        By, expected_conditions = self._conditions()
+        return self.wait_until(browser, expected_conditions.element_to_be_clickable((By.XPATH, xpath)), timeout)
+
+    def wait_for_text_change(self, browser, xpath, old_text, timeout=None):
+        """
+        Wait for the text of an element to differ from `old_text` (e.g. the calendar header after an arrow click).
+        """
+        By, _ = self._conditions()
+
+        def text_changed(driver):
+            text = driver.find_element(By.XPATH, xpath).text
+            return text if text != old_text else False
+        return self.wait_until(browser, text_changed, timeout)
+
+    def wait_for_staleness(self, browser, element, timeout=None):
+        """
+        Wait for an element to be detached from the page, i.e. for the page to be replaced after a form submit.
+        """
+        By, expected_conditions = self._conditions()
+        return self.wait_until(browser, expected_conditions.staleness_of(element), timeout)
+
+
+PROFILES = {
+    # Same pauses as the former fixed random sleeps, now on top of readiness waits.
+    'human': dict(jitter=(4, 9), small_jitter=(0.3, 0.8)),
+    # For trusted environments: no jitter, only what the page needs, capped at 2 steps per second per account.
+    'fast': dict(jitter=(0, 0), small_jitter=(0, 0), rate=2, burst=5),
+}
+
+
+def get_pacer(pacing=None, account=None):
+    """
+    Build a pacer from a profile name ('human' or 'fast'), or bind an existing Pacer to the account.
+
+    :param pacing: Profile name, Pacer instance or None (default 'human' profile).
+    :param account (optional): Account used for the rate limiter.
+    :return: Pacer
+    """
+    if pacing is None:
+        pacing = 'human'
+    if isinstance(pacing, Pacer):
+        return pacing.for_account(account) if account is not None else pacing
+    if pacing not in PROFILES:
+        raise Exception('Unknown pacing profile')
+    return Pacer(account=account, **PROFILES[pacing])
@@ -0,0 +1,179 @@
+"""
+Page object of the analytics report page (tweets or videos section).
+
+Every find_element and every read of an element's text is a WebDriver round trip. The page object answers the checks
+of the downloader and the calendar (server error callout, export button enabled, selected range, calendar open,
+months displayed) with a single execute_script, and locates the elements to click with one script each, keeping them
+until the page or the calendar changes.
+"""
+from twitter_analytics.pacing import get_pacer
+
+# Shared by the scripts: first element matching a CSS selector whose class attribute is exactly `className`, like
+# the XPath tests [@class="..."] of the page.
+_FIND_EXACT = '''
+function exact(selector, className, root) {
+  var found = (root || document).querySelectorAll(selector);
+  for (var i = 0; i < found.length; i++) {
+    if (found[i].className === className) { return found[i]; }
+  }
+  return null;
+}
+'''
+
+# State of the page in one round trip.
+PROBE_SCRIPT = _FIND_EXACT + '''
+function visible(element) {
+  return !!element && element.getClientRects().length > 0 && window.getComputedStyle(element).visibility !== 'hidden';
+}
+function text(element) { return element ? element.textContent.replace(/\\s+/g, ' ').trim() : null; }
+var box = document.getElementById('export');
+var exportButton = box ? exact('button', 'btn btn-default ladda-button', box) : null;
+var rangeButton = exact('div', 'btn daterange-button');
+var months = {};
+['left', 'right'].forEach(function (side) {
+  var calendar = exact('div', 'calendar ' + side);
+  months[side] = calendar ? text(calendar.querySelector('th.month')) : null;
+});
+return {
+  error: !!exact('div', 'error server Callout Callout--danger'),
+  export_present: !!exportButton,
+  export_enabled: visible(exportButton) && !exportButton.disabled,
+  range: rangeButton ? text(exact('span', 'daterange-selected', rangeButton)) : null,
+  calendar_visible: visible(document.querySelector('div.daterangepicker')),
+  months: months
+};
+'''
+
+# Element to click, by name: 'export', 'calendar_button', 'apply', or 'prev', 'next' and 'day' of a calendar side.
+LOCATE_SCRIPT = _FIND_EXACT + '''
+var name = arguments[0], side = arguments[1], day = arguments[2];
+if (name === 'export') {
+  var box = document.getElementById('export');
+  return box ? exact('button', 'btn btn-default ladda-button', box) : null;
+}
+if (name === 'calendar_button') { return exact('div', 'btn daterange-button'); }
+if (name === 'apply') { return exact('button', 'applyBtn btn btn-sm btn-primary'); }
+var calendar = exact('div', 'calendar ' + side);
+if (!calendar) { return null; }
+if (name === 'prev' || name === 'next') {
+  var arrow = exact('th', name + ' available', calendar);
+  var icon = 'Icon Icon--' + (name === 'prev' ? 'caretLeft' : 'caretRight') + ' Icon--tiny';
+  return arrow ? exact('span', icon, arrow) : null;
+}
+var classes = ['available', 'available in-range', 'available active start-date', 'available active end-date'];
+var cells = calendar.querySelectorAll('tbody td');
+for (var i = 0; i < cells.length; i++) {
+  if (classes.indexOf(cells[i].className) >= 0 && cells[i].textContent.trim() === day) { return cells[i]; }
+}
+return null;
+'''
+
+# Elements redrawn when the calendar changes month or selection.
+CALENDAR_ELEMENTS = ('prev', 'next', 'day', 'apply')
+
+
+class ReportPage(object):
+
+    """
+    Checks and clicks on the report page of the current tab, in as few WebDriver round trips as possible.
+
+    page = ReportPage(browser)
+    state = page.probe()        # {'error': False, 'export_enabled': True, 'range': 'Apr 4, 2017 - May 1, 2017', ...}
+    page.click('next', 'left')
+    """
+
+    def __init__(self, browser, pacer=None):
+        """
+        :param browser: Selenium driver object
+        :param pacer (optional): twitter_analytics.pacing.Pacer deciding the timeout and the frequency of the waits.
+        """
+        self.browser = browser
+        self.pacer = get_pacer(pacer)
+        self.elements = dict()
+
+    def reset(self):
+        """
+        Forget the located elements: a new page was loaded.
+        """
+        self.elements.clear()
+
+    def calendar_changed(self):
+        """
+        Forget the calendar elements, redrawn after a month change or a selection.
+        """
+        for key in [key for key in self.elements if key[0] in CALENDAR_ELEMENTS]:
+            del self.elements[key]
+
+    def probe(self):
+        """
+        :return: dict with the state of the page: 'error' (server error callout shown), 'export_present',
+        'export_enabled', 'range' (text of the calendar button), 'calendar_visible' and 'months' (dict side -> header
+        of the calendar side, e.g. 'Apr 2017').
+        """
+        return self.browser.execute_script(PROBE_SCRIPT)
+
+    def wait_for(self, condition, timeout=None):
+        """
+        Probe the page until condition(state) is true. Raises selenium TimeoutException after `timeout` secs.
+        :return: The state satisfying the condition.
+        """
+        def probed(browser):
+            state = self.probe()
+            return state if condition(state) else False
+        return self.pacer.wait_until(self.browser, probed, timeout)
+
+    def element(self, name, *args):
+        """
+        Locate an element by name (see LOCATE_SCRIPT), or return it from the cache.
+        """
+        key = (name,) + args
+        if key not in self.elements:
+            element = self.browser.execute_script(LOCATE_SCRIPT, name, *args)
+            if element is None:
+                from selenium.common.exceptions import NoSuchElementException
+                raise NoSuchElementException('No {} element on the page'.format(' '.join((name,) + args)))
+            self.elements[key] = element
+        return self.elements[key]
+
+    def click(self, name, *args):
+        """
+        Click an element, locating it again if the page redrew it since it was cached.
+        :return: The element clicked.
+        """
+        from selenium.common.exceptions import StaleElementReferenceException
+
+        try:
+            element = self.element(name, *args)
+            element.click()
+        except StaleElementReferenceException:
+            self.elements.pop((name,) + args, None)
+            element = self.element(name, *args)
+            element.click()
+        return element
+
+    def error_occurred(self):
+        """
+        :return: Boolean: True if the server error callout is shown (see twitter_bug_screenshot.png).
+        """
+        return self.probe()['error']
+
+    def wait_for_export(self, timeout=None):
+        """
+        Wait for the export button to be displayed and enabled.
+        :return: The export button element.
+        """
+        self.wait_for(lambda state: state['export_enabled'], timeout)
+        return self.element('export')
+
+    def displayed_range(self):
+        """
+        :return: Text of the calendar button, e.g. 'Last 28 Days' or the selected range.
+        """
+        return self.probe()['range']
+
+    def displayed_month(self, side):
+        """
+        :param side: 'left' (FROM date) or 'right' (TO date) calendar.
+        :return: Header of the month displayed, e.g. 'Apr 2017'.
+        """
+        return self.probe()['months'][side]
@@ -0,0 +1,200 @@
+"""
+Export planning: the date ranges to ask the analytics site for, in as few exports as possible.
+
+Every export costs a calendar selection, a click and a report generation, whatever its length, so a backfill takes
+time roughly in proportion to its number of exports. The planner cuts the requested period with a policy (calendar
+months, fixed windows or the largest window the site accepts), skips what is already downloaded, and merges gaps
+separated by a few downloaded days when that saves an export.
+"""
+import os
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from twitter_analytics.dateranges import day_windows, format_date, is_final, month_windows, parse_date
+
+# Longest date range the analytics site exports at once.
+MAX_WINDOW_DAYS = 91
+
+
+def fixed_days(days):
+    """
+    :return: Policy cutting periods into windows of `days` days.
+    """
+    if not 1 <= days <= MAX_WINDOW_DAYS:
+        raise Exception('Windows must be between 1 and {} days long'.format(MAX_WINDOW_DAYS))
+
+    def policy(start, end):
+        return day_windows(start, end, days)
+    return policy
+
+
+# Policies: functions cutting a period (first day, last day) into a list of windows (first day, last day).
+POLICIES = {
+    'months': month_windows,
+    'largest': fixed_days(MAX_WINDOW_DAYS),
+}
+
+
+def get_policy(policy):
+    """
+    :param policy: Policy name ('months' or 'largest'), window length in days, or function.
+    """
+    if callable(policy):
+        return policy
+    if isinstance(policy, int):
+        return fixed_days(policy)
+    if policy not in POLICIES:
+        raise Exception('Unknown range policy')
+    return POLICIES[policy]
+
+
+PlannedExport = namedtuple('PlannedExport', 'from_date to_date days seconds')
+
+
+class ExportPlan(object):
+
+    """
+    Ordered list of exports covering a requested period, with its cost estimate.
+    """
+
+    def __init__(self, exports, requested_days, covered_days):
+        self.exports = exports
+        self.requested_days = requested_days
+        self.covered_days = covered_days
+
+    def __len__(self):
+        return len(self.exports)
+
+    def __iter__(self):
+        return iter(self.exports)
+
+    @property
+    def estimated_seconds(self):
+        return sum(export.seconds for export in self.exports)
+
+    @property
+    def downloaded_days(self):
+        """
+        Days exported by the plan, including the already downloaded days re-exported to save an export.
+        """
+        return sum(export.days for export in self.exports)
+
+    def ranges(self):
+        """
+        :return: List of list of 2 items [0] = from and [1] = to, like split_date_range_into_months.
+        """
+        return [[export.from_date, export.to_date] for export in self.exports]
+
+
+class RangePlanner(object):
+
+    """
+    Plan the exports of a period.
+
+    planner = RangePlanner('largest', skip_local_reports=True)
+    plan = planner.plan('01/01/2015', '12/31/2017', covered=[['01/01/2016', '03/31/2016']])
+    """
+
+    def __init__(self, policy='months', max_redownload_days=7, export_seconds=30.0, day_seconds=0.1,
+                 skip_local_reports=False, refresh_days=3):
+        """
+        :param policy: How periods are cut: 'months' (calendar months), 'largest' (91 days windows, the maximum of
+        the site), a number of days, or a function (first day, last day) -> list of (first day, last day).
+        :param max_redownload_days: Maximum number of already downloaded days exported again to merge two gaps, when
+        merging them saves an export.
+        :param export_seconds: Estimated fixed cost of an export (calendar, click, report generation).
+        :param day_seconds: Estimated cost of every day of an export.
+        :param skip_local_reports: Count the reports of the download folder as downloaded (see local_report_ranges).
+        :param refresh_days: Number of days after its end during which a local report is still changing.
+        """
+        self.policy = get_policy(policy)
+        self.max_redownload_days = max_redownload_days
+        self.export_seconds = export_seconds
+        self.day_seconds = day_seconds
+        self.skip_local_reports = skip_local_reports
+        self.refresh_days = refresh_days
+
+    def estimate(self, days):
+        """
+        :return: Estimated secs to export a window of `days` days.
+        """
+        return self.export_seconds + self.day_seconds * days
+
+    def plan(self, from_date, to_date, covered=()):
+        """
+        :param from_date: date string in the format 'mm/dd/yyyy'
+        :param to_date: date string in the format 'mm/dd/yyyy'
+        :param covered: Date ranges already downloaded, as lists of 2 date strings [0] = from and [1] = to.
+        :return: ExportPlan
+        """
+        start, end = parse_date(from_date), parse_date(to_date)
+        gaps = subtract(start, end, [(parse_date(rng[0]), parse_date(rng[1])) for rng in covered])
+        exports = list()
+        for gap in self.merge_gaps(gaps):
+            for first, last in self.policy(*gap):
+                days = (last - first).days + 1
+                exports.append(PlannedExport(format_date(first), format_date(last), days, self.estimate(days)))
+        requested_days = max(0, (end - start).days + 1)
+        missing_days = sum((last - first).days + 1 for first, last in gaps)
+        return ExportPlan(exports, requested_days, requested_days - missing_days)
+
+    def merge_gaps(self, gaps):
+        """
+        Merge consecutive gaps when the policy then needs fewer exports, and the days between them (downloaded
+        again) are at most `max_redownload_days`.
+        """
+        merged = list()
+        for gap in gaps:
+            if merged:
+                previous = merged[-1]
+                bridge_days = (gap[0] - previous[1]).days - 1
+                if bridge_days <= self.max_redownload_days and \
+                        len(self.policy(previous[0], gap[1])) < len(self.policy(*previous)) + len(self.policy(*gap)):
+                    merged[-1] = (previous[0], gap[1])
+                    continue
+            merged.append(gap)
+        return merged
+
+
+def subtract(start, end, covered):
+    """
+    :param covered: List of (first day, last day) already downloaded.
+    :return: Ordered list of (first day, last day) of the period from `start` to `end` not covered.
+    """
+    gaps = list()
+    cursor = start
+    for first, last in sorted(covered):
+        if last < cursor:
+            continue
+        if first > end:
+            break
+        if first > cursor:
+            gaps.append((cursor, first - timedelta(days=1)))
+        cursor = max(cursor, last + timedelta(days=1))
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def local_report_ranges(folder, account, section, refresh_days=3):
+    """
+    Date ranges of the final reports of an account and section in a download folder, recognised by their
+    deterministic names (see utils.report_filename). A report is final when it was written `refresh_days` or more
+    after its last day, like in the sync manifest.
+
+    :return: List of list of 2 items [0] = from and [1] = to.
+    """
+    if not os.path.isdir(folder):
+        return []
+    pattern = re.compile(r'^{}_{}_(\d{{8}})_(\d{{8}})\.csv$'.format(re.escape(account.lower()), re.escape(section)))
+    ranges = list()
+    for name in sorted(os.listdir(folder)):
+        match = pattern.match(name)
+        if match is None:
+            continue
+        first, last = (datetime.strptime(day, '%Y%m%d').date() for day in match.groups())
+        written_on = date.fromtimestamp(os.path.getmtime(os.path.join(folder, name)))
+        if is_final(last, written_on, refresh_days):
+            ranges.append([format_date(first), format_date(last)])
+    return ranges
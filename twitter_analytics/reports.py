@@ -0,0 +1,211 @@
+import csv
+import os
+from array import array
+from calendar import timegm
+from datetime import date, datetime
+
+
+ID_COLUMN = 'Tweet id'
+TIME_COLUMN = 'time'
+
+# Metric columns of the tweet activity reports, parsed into numbers. Each one also comes as a promoted metric
+# ('promoted impressions'...), '-' for the organic tweets.
+METRIC_COLUMNS = frozenset(('impressions', 'engagements', 'engagement rate', 'retweets', 'replies', 'likes',
+                            'user profile clicks', 'url clicks', 'hashtag clicks', 'detail expands',
+                            'permalink clicks', 'app opens', 'app installs', 'follows', 'email tweet', 'dial phone',
+                            'media views', 'media engagements'))
+PROMOTED_PREFIX = 'promoted '
+NAN = float('nan')
+
+# Time format of the tweet activity reports, e.g. '2017-04-14 17:53 +0000'
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def is_metric_column(name):
+    """ Known metric columns are parsed into numbers, the other columns are kept as text. """
+    name = name.lower()
+    if name.startswith(PROMOTED_PREFIX):
+        name = name[len(PROMOTED_PREFIX):]
+    return name in METRIC_COLUMNS
+
+
+def is_rate_column(name):
+    """ Rate columns ('engagement rate'...) hold floats, every other metric holds counts. """
+    return 'rate' in name.lower()
+
+
+def parse_count(value):
+    """
+    Counts are '-' (or empty) when Twitter has no value, e.g. the promoted metrics of organic tweets.
+    :return: int, or None for a missing value.
+    """
+    if value in ('', '-'):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def parse_rate(value):
+    if value in ('', '-'):
+        return NAN
+    return float(value)
+
+
+def parse_time(value):
+    """
+    :return: Epoch secs (UTC) of a report time such as '2017-04-14 17:53 +0000'.
+    """
+    try:
+        # Sliced by hand: strptime is the slowest part of reading a report
+        day = date(int(value[0:4]), int(value[5:7]), int(value[8:10])).toordinal() - EPOCH_ORDINAL
+        return day * 86400 + int(value[11:13]) * 3600 + int(value[14:16]) * 60
+    except ValueError:
+        return timegm(datetime.strptime(value[:16], TIME_FORMAT).timetuple())
+
+
+def newest_first(paths):
+    """
+    Order report files from the most recent snapshot to the oldest (modification time, then name).
+    """
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), path), reverse=True)
+
+
+def read_rows(paths, dedupe=True, keep_text=True):
+    """
+    Stream the rows of tweet activity reports, one file open at a time, with metrics parsed into numbers.
+
+    When a tweet appears in several reports (overlapping windows, re-downloads), only the row of the newest report is
+    kept: files are read newest first and the ids already seen are skipped. Only the set of ids stays in memory.
+
+    :param paths: Pathnames of the reports, as returned by ReportDownloader.run()
+    :param dedupe: Skip the older snapshots of a tweet. Default is True.
+    :param keep_text: Include the text columns: permalink, text, and any column which isn't a known metric. Default
+    is True.
+    :return: Generator of dicts: 'Tweet id' as int, 'time' as epoch secs, rates as floats (NaN when missing), other
+    metrics as ints (None when missing), text columns as str.
+    """
+    seen = set()
+    for path in (newest_first(paths) if dedupe else paths):
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            try:
+                header = next(reader)
+            except StopIteration:
+                continue
+            parsers = [_parser(name, keep_text) for name in header]
+            id_index = header.index(ID_COLUMN) if ID_COLUMN in header else None
+            for values in reader:
+                if not values:
+                    continue
+                if dedupe and id_index is not None:
+                    tweet_id = int(values[id_index])
+                    if tweet_id in seen:
+                        continue
+                    seen.add(tweet_id)
+                row = dict()
+                for name, parser, value in zip(header, parsers, values):
+                    if parser is not None:
+                        row[name] = parser(value)
+                yield row
+
+
+def _parser(name, keep_text):
+    if name == ID_COLUMN:
+        return int
+    if name == TIME_COLUMN:
+        return parse_time
+    if is_metric_column(name):
+        return parse_rate if is_rate_column(name) else parse_count
+    return str if keep_text else None
+
+
+def _is_text_column(name):
+    return name not in (ID_COLUMN, TIME_COLUMN) and not is_metric_column(name)
+
+
+class ReportTable(object):
+
+    """
+    Compact columnar table of tweet activity reports: one typed array per metric instead of one dict per row.
+    Ids, times and counts are stored as 64 bits integers ('q' arrays), rates as doubles ('d' arrays). A count column
+    with missing values is stored as doubles, NaN standing for the missing values.
+    """
+
+    def __init__(self, columns, text=None):
+        """
+        :param columns: dict column name => array
+        :param text (optional): dict column name => list of str
+        """
+        self.columns = columns
+        self.text = text or dict()
+
+    @classmethod
+    def from_reports(cls, paths, dedupe=True, keep_text=False):
+        """
+        Build the table by streaming the reports (see read_rows).
+        """
+        columns = dict()
+        text = dict()
+        count = 0
+        for row in read_rows(paths, dedupe=dedupe, keep_text=keep_text):
+            # Reports don't all have the same columns (e.g. promoted metrics): missing values are padded so every
+            # array keeps one item per row.
+            for name in row:
+                if _is_text_column(name):
+                    if name not in text:
+                        text[name] = [''] * count
+                elif name not in columns:
+                    columns[name] = array('d' if is_rate_column(name) or count else 'q', [NAN] * count)
+            for name, values in list(columns.items()):
+                value = row.get(name)
+                if value is None:
+                    if values.typecode == 'q':
+                        values = columns[name] = array('d', values)
+                    value = NAN
+                values.append(value)
+            for name, values in text.items():
+                values.append(row.get(name, ''))
+            count += 1
+        return cls(columns, text)
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def column(self, name):
+        """
+        :return: Array (or list of str for the text columns) of a column.
+        """
+        if name in self.text:
+            return self.text[name]
+        return self.columns[name]
+
+    def total(self, name):
+        """
+        :return: Sum of a metric over every tweet, e.g. table.total('impressions'). Missing values are skipped.
+        """
+        values = self.columns[name]
+        if values.typecode == 'q':
+            return sum(values)
+        return sum(value for value in values if value == value)
+
+    def rows(self):
+        """
+        Iterate over the table as dicts, one per tweet.
+        """
+        names = list(self.columns) + list(self.text)
+        for i in range(len(self)):
+            yield dict((name, self.column(name)[i]) for name in names)
+
+    def to_numpy(self):
+        """
+        Zero-copy view of the numeric columns as NumPy arrays (requires numpy).
+        :return: dict column name => numpy.ndarray
+        """
+        import numpy
+        return dict((name, numpy.frombuffer(values, dtype='int64' if values.typecode == 'q' else 'float64'))
+                    for name, values in self.columns.items())
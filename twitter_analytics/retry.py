@@ -0,0 +1,351 @@
+"""
+Bounded retries of the browser steps, requeueing of the failed date ranges and a circuit breaker per account.
+
+A failing step is retried with exponential backoff and jitter, within a number of attempts and a deadline of its own
+(export, navigation or calendar). A date range whose steps gave up goes back to the end of the queue of its section,
+so the other ranges are downloaded first, and is given up after a few requeues. After repeated failures of an account
+its circuit opens: its remaining ranges fail at once instead of hammering the site, and the other accounts go on.
+"""
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+
+class StepFailed(Exception):
+    """ Raised when a step still fails after the attempts or the deadline of its retry policy. """
+
+
+class CircuitOpen(StepFailed):
+    """ Raised instead of running a step for an account whose circuit breaker is open. """
+
+
+class DownloadFailed(Exception):
+    """
+    Raised at the end of a run when some date ranges could not be downloaded. The reports of the other ranges are
+    available in `reports`, the ranges given up in `failures` (list of FailedRange).
+    """
+
+    def __init__(self, failures, reports):
+        super(DownloadFailed, self).__init__('{} date range(s) failed: {}'.format(len(failures), '; '.join(
+            '{} {} {} - {}: {}'.format(failure.account, failure.section, failure.from_date, failure.to_date,
+                                       failure.error) for failure in failures)))
+        self.failures = failures
+        self.reports = reports
+
+
+FailedRange = namedtuple('FailedRange', 'account section from_date to_date error')
+
+
+class RetryPolicy(namedtuple('RetryPolicy', 'attempts base_delay factor max_delay jitter deadline')):
+
+    """
+    How a step is retried: at most `attempts` tries, waiting base_delay * factor ** (retry - 1) secs (capped at
+    max_delay) between two of them, minus a random part of up to `jitter` of it, and never past `deadline` secs
+    after the first try.
+    """
+
+    def __new__(cls, attempts=3, base_delay=2.0, factor=2.0, max_delay=60.0, jitter=0.5, deadline=None):
+        """
+        :param attempts: Maximum number of tries, the first one included.
+        :param base_delay: Secs before the first retry.
+        :param factor: Multiplier of the delay at every retry.
+        :param max_delay: Maximum secs between two tries.
+        :param jitter: Fraction of every delay drawn at random, so browsers failing together don't retry together.
+        :param deadline (optional): Maximum secs from the first try to the last retry. None means no deadline, or the
+        default deadline of the step (the download timeout for exports).
+        """
+        return super(RetryPolicy, cls).__new__(cls, attempts, base_delay, factor, max_delay, jitter, deadline)
+
+    def delay(self, retry):
+        """
+        :param retry: Number of the retry, from 1.
+        :return: Secs to wait before it.
+        """
+        delay = min(self.max_delay, self.base_delay * self.factor ** (retry - 1))
+        return random.uniform(delay * (1 - self.jitter), delay)
+
+
+DEFAULT_POLICIES = {
+    # Re-clicks of the export button while the server error callout shows. The deadline defaults to the download
+    # timeout of the downloader.
+    'export': RetryPolicy(attempts=5, base_delay=2.0, max_delay=30.0),
+    # Loading of the analytics page of a section.
+    'navigation': RetryPolicy(attempts=3, base_delay=2.0, max_delay=30.0, deadline=120),
+    # Selection of a date range in the calendar.
+    'calendar': RetryPolicy(attempts=3, base_delay=1.0, max_delay=10.0, deadline=60),
+}
+
+
+class CircuitBreaker(object):
+
+    """
+    Counts the consecutive failures of every account. After `threshold` of them the circuit of the account opens for
+    `cooldown` secs, then lets one more try through: a success closes it, a failure opens it again.
+    Thread safe, so one breaker can be shared by every downloader of a process.
+    """
+
+    def __init__(self, threshold=3, cooldown=900, clock=time.time):
+        """
+        :param threshold: Consecutive failures opening the circuit of an account.
+        :param cooldown: Secs before an open circuit lets a try through.
+        :param clock: Function returning the current time in secs.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = dict()
+        self.opened = dict()
+        self.lock = threading.Lock()
+
+    def allows(self, account):
+        """
+        :return: Boolean: False while the circuit of the account is open.
+        """
+        with self.lock:
+            opened = self.opened.get(account)
+            return opened is None or self.clock() >= opened + self.cooldown
+
+    def is_open(self, account):
+        return not self.allows(account)
+
+    def record_success(self, account):
+        with self.lock:
+            self.failures.pop(account, None)
+            self.opened.pop(account, None)
+
+    def record_failure(self, account):
+        with self.lock:
+            self.failures[account] = self.failures.get(account, 0) + 1
+            if self.failures[account] >= self.threshold:
+                self.opened[account] = self.clock()
+
+
+class RetryScheduler(object):
+
+    """
+    Retry policies of the steps of a downloader, the requeueing of its failed date ranges and its circuit breaker.
+
+    retry = RetryScheduler({'export': RetryPolicy(attempts=8, deadline=600)}, max_requeues=3)
+    reports = ReportDownloader('username', 'password', from_date='01/01/2017', to_date='12/31/2017', retry=retry).run()
+    """
+
+    def __init__(self, policies=None, max_requeues=2, breaker=None, sleep=time.sleep, clock=time.time,
+                 on_retry=None):
+        """
+        :param policies (optional): dict of step name ('export', 'navigation' or 'calendar') -> RetryPolicy, replacing
+        the default policy of these steps.
+        :param max_requeues: Number of times a failed date range goes back to the queue before it is given up.
+        :param breaker (optional): CircuitBreaker, possibly shared between downloaders. Default is a breaker of its own.
+        :param sleep: Sleep function, can be replaced for tests.
+        :param clock: Function returning the current time in secs.
+        :param on_retry (optional): Callback called with the step name before every retry.
+        """
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.max_requeues = max_requeues
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.sleep = sleep
+        self.clock = clock
+        self.on_retry = on_retry
+
+    def bind(self, sleep, on_retry=None):
+        """
+        Copy of this scheduler sleeping with `sleep` (e.g. the instrumented sleep of a pacer), sharing its policies and
+        circuit breaker.
+        """
+        return RetryScheduler(self.policies, self.max_requeues, self.breaker, sleep, self.clock, on_retry)
+
+    def policy(self, step):
+        if step not in self.policies:
+            raise Exception('Unknown step')
+        return self.policies[step]
+
+    def backoff(self, step, failures, started, deadline=None):
+        """
+        :param failures: Number of failed tries of the step so far.
+        :param started: Time of the first try.
+        :param deadline (optional): Deadline of the step when its policy has none.
+        :return: Secs to wait before the next try. Raises StepFailed when the policy gives up.
+        """
+        policy = self.policy(step)
+        if failures >= policy.attempts:
+            raise StepFailed('{} failed {} times'.format(step, failures))
+        delay = policy.delay(failures)
+        deadline = policy.deadline if policy.deadline is not None else deadline
+        if deadline is not None and self.clock() + delay > started + deadline:
+            raise StepFailed('{} did not succeed within {} secs'.format(step, deadline))
+        return delay
+
+    def call(self, step, function, *args, **kwargs):
+        """
+        Call function(*args, **kwargs), retrying it with the policy of the step when it raises.
+        :return: What the function returns. Raises StepFailed (from the last error) when the policy gives up.
+        """
+        started = self.clock()
+        failures = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except StepFailed:
+                raise
+            except Exception as error:
+                failures += 1
+                try:
+                    delay = self.backoff(step, failures, started)
+                except StepFailed as failure:
+                    raise failure from error
+            if self.on_retry is not None:
+                self.on_retry(step)
+            self.sleep(delay)
+
+    async def acall(self, step, function, *args, **kwargs):
+        """
+        Awaitable equivalent of call(), for a coroutine function: the backoff is awaited on the event loop.
+        """
+        import asyncio
+
+        started = self.clock()
+        failures = 0
+        while True:
+            try:
+                return await function(*args, **kwargs)
+            except StepFailed:
+                raise
+            except Exception as error:
+                failures += 1
+                try:
+                    delay = self.backoff(step, failures, started)
+                except StepFailed as failure:
+                    raise failure from error
+            if self.on_retry is not None:
+                self.on_retry(step)
+            await asyncio.sleep(delay)
+
+    def start(self, step, deadline=None):
+        """
+        :param deadline (optional): Deadline of the step when its policy has none.
+        :return: StepAttempt, for a step which is polled rather than called (the export).
+        """
+        return StepAttempt(self, step, deadline)
+
+    def queue(self, ranges):
+        return RangeQueue(ranges, self.max_requeues, self.policy('export'), self.clock)
+
+
+class StepAttempt(object):
+
+    """
+    Retry state of a step polled in a wait loop, like an export re-clicked while the error callout shows: the loop
+    keeps watching for the report between the retries instead of sleeping.
+    """
+
+    def __init__(self, scheduler, step, deadline=None):
+        self.scheduler = scheduler
+        self.step = step
+        policy = scheduler.policy(step)
+        self.deadline = policy.deadline if policy.deadline is not None else deadline
+        self.started = scheduler.clock()
+        self.failures = 0
+        self.next_retry = None
+
+    @property
+    def waiting(self):
+        """
+        True while a retry is scheduled.
+        """
+        return self.next_retry is not None
+
+    def remaining(self):
+        """
+        :return: Secs left before the deadline of the step, None without deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.started + self.deadline - self.scheduler.clock())
+
+    def expired(self):
+        return self.deadline is not None and self.remaining() <= 0
+
+    def failed(self):
+        """
+        Schedule a retry after the backoff of the step. Raises StepFailed when the policy gives up.
+        """
+        self.failures += 1
+        self.next_retry = self.scheduler.clock() + self.scheduler.backoff(self.step, self.failures, self.started,
+                                                                          self.deadline)
+
+    def ready(self):
+        """
+        :return: Boolean: True when the scheduled retry can run.
+        """
+        return self.next_retry is not None and self.scheduler.clock() >= self.next_retry
+
+    def retrying(self):
+        """
+        Clear the scheduled retry, which is running.
+        """
+        self.next_retry = None
+
+
+class RangeQueue(object):
+
+    """
+    Date ranges of a section still to download. A failed range goes back to the end of the queue and is not taken
+    again before a backoff delay, so the next ranges are downloaded in the meantime.
+    """
+
+    def __init__(self, ranges, max_requeues=2, policy=None, clock=time.time):
+        """
+        :param ranges: List of list of 2 items [0] = from and [1] = to.
+        :param max_requeues: Number of times a range is requeued before it is given up.
+        :param policy (optional): RetryPolicy whose delays space the tries of a range. Default is no delay.
+        """
+        self.pending = deque((index, rng, 0.0) for index, rng in enumerate(ranges))
+        self.max_requeues = max_requeues
+        self.policy = policy
+        self.clock = clock
+        self.requeues = dict()
+        self.failed = list()        # (index, range, error) of the ranges given up
+
+    def __len__(self):
+        return len(self.pending)
+
+    def pop(self):
+        """
+        :return: (index, range) of the first range which can be tried now, or None.
+        """
+        now = self.clock()
+        for item in self.pending:
+            if item[2] <= now:
+                self.pending.remove(item)
+                return item[:2]
+        return None
+
+    def wait_time(self):
+        """
+        :return: Secs until a range can be tried.
+        """
+        if not self.pending:
+            return 0.0
+        return max(0.0, min(item[2] for item in self.pending) - self.clock())
+
+    def requeue(self, index, rng, error):
+        """
+        Put a failed range back at the end of the queue, or give it up after `max_requeues` requeues.
+        :return: Boolean: True if the range was requeued.
+        """
+        count = self.requeues.get(index, 0) + 1
+        if count > self.max_requeues:
+            self.fail(index, rng, error)
+            return False
+        self.requeues[index] = count
+        delay = self.policy.delay(count) if self.policy is not None else 0.0
+        self.pending.append((index, rng, self.clock() + delay))
+        return True
+
+    def fail(self, index, rng, error):
+        """
+        Give a range up.
+        """
+        self.failed.append((index, rng, error))
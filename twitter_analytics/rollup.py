@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from twitter_analytics.dateranges import from_iso, to_iso
+from twitter_analytics.reports import ID_COLUMN, TIME_COLUMN, is_metric_column, is_rate_column, newest_first, read_rows
+
+# Daily count of tweets, stored next to the summed metrics.
+TWEETS_METRIC = 'tweets'
+
+# Maximum number of parameters of a SQLite query
+_BATCH_SIZE = 500
+
+
+class DailyRollup(object):
+
+    """
+    Local SQLite index of the metrics of an account summed per day, for dashboards and range queries which don't read
+    the reports again.
+
+    The index keeps the newest snapshot of every tweet and the daily sums of its count metrics (impressions,
+    engagements, retweets...). Adding reports only reads the files never seen before, recognised by the hash of their
+    content, and applies to the days the difference between the new snapshots of their tweets and the ones already
+    indexed: the cost of a refresh depends on the new reports, not on the whole history.
+
+    rollup = DailyRollup('/data/rollup.sqlite')
+    rollup.add_reports('username', reports)
+    impressions = rollup.total('username', 'impressions', '01/01/2017', '03/31/2017')
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Pathname of the SQLite file (created if missing).
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                ' hash TEXT PRIMARY KEY, account TEXT NOT NULL, path TEXT, rows INTEGER NOT NULL,'
+                ' added_at REAL NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS tweets ('
+                ' account TEXT NOT NULL, tweet_id INTEGER NOT NULL, day TEXT NOT NULL, snapshot REAL NOT NULL,'
+                ' metrics TEXT NOT NULL, PRIMARY KEY (account, tweet_id))'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS daily ('
+                ' account TEXT NOT NULL, day TEXT NOT NULL, metric TEXT NOT NULL, value INTEGER NOT NULL,'
+                ' PRIMARY KEY (account, metric, day))'
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def is_indexed(self, path):
+        """
+        :return: True if a file with the same content as the report was already added.
+        """
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM files WHERE hash = ?', (file_hash(path),)).fetchone() \
+                is not None
+
+    def add_reports(self, account, paths):
+        """
+        Add the tweet activity reports of an account to the index. Reports already added (same content) are skipped.
+        A tweet only updates the index when its report is at least as recent (modification time) as the snapshot
+        indexed.
+
+        :param paths: Pathnames of the reports, as returned by ReportDownloader.run()
+        :return: Number of new reports read.
+        """
+        account = account.lower()
+        with self.lock, self.connection:
+            new = list()
+            for path in newest_first(paths):
+                digest = file_hash(path)
+                if digest in (known for known, _ in new):
+                    continue
+                if self.connection.execute('SELECT 1 FROM files WHERE hash = ?', (digest,)).fetchone() is None:
+                    new.append((digest, path))
+
+            seen = set()        # tweets of this batch, read newest first
+            for digest, path in new:
+                rows = [row for row in read_rows([path], dedupe=False, keep_text=False)
+                        if ID_COLUMN in row and TIME_COLUMN in row and row[ID_COLUMN] not in seen]
+                seen.update(row[ID_COLUMN] for row in rows)
+                self._apply(account, rows, os.path.getmtime(path))
+                self.connection.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                                        (digest, account, os.path.abspath(path), len(rows), time.time()))
+        return len(new)
+
+    def _apply(self, account, rows, snapshot):
+        """
+        Replace the indexed snapshot of the tweets of a report by their new one, when it isn't older, and add the
+        difference of their metrics to their day.
+        """
+        indexed = dict()
+        ids = [row[ID_COLUMN] for row in rows]
+        for start in range(0, len(ids), _BATCH_SIZE):
+            batch = ids[start:start + _BATCH_SIZE]
+            indexed.update((tweet_id, (old_snapshot, json.loads(metrics))) for tweet_id, old_snapshot, metrics in
+                           self.connection.execute(
+                               'SELECT tweet_id, snapshot, metrics FROM tweets WHERE account = ? AND tweet_id IN ({})'
+                               .format(', '.join('?' * len(batch))), [account] + batch))
+
+        deltas = dict()     # (day, metric) -> difference
+        tweets = list()
+        for row in rows:
+            tweet_id = row[ID_COLUMN]
+            old_snapshot, old_metrics = indexed.get(tweet_id, (None, None))
+            if old_snapshot is not None and old_snapshot > snapshot:
+                continue
+            metrics = dict((name, value) for name, value in row.items()
+                           if is_metric_column(name) and not is_rate_column(name) and value is not None)
+            day = time.strftime('%Y-%m-%d', time.gmtime(row[TIME_COLUMN]))
+            if old_metrics is None:
+                deltas[(day, TWEETS_METRIC)] = deltas.get((day, TWEETS_METRIC), 0) + 1
+                old_metrics = dict()
+            for name in set(metrics) | set(old_metrics):
+                delta = metrics.get(name, 0) - old_metrics.get(name, 0)
+                if delta:
+                    deltas[(day, name)] = deltas.get((day, name), 0) + delta
+            tweets.append((account, tweet_id, day, snapshot, json.dumps(metrics, sort_keys=True)))
+
+        self.connection.executemany('INSERT OR REPLACE INTO tweets VALUES (?, ?, ?, ?, ?)', tweets)
+        # no upsert (ON CONFLICT ... DO UPDATE): it needs SQLite 3.24
+        self.connection.executemany('INSERT OR IGNORE INTO daily VALUES (?, ?, ?, 0)',
+                                    [(account, day, metric) for day, metric in deltas])
+        self.connection.executemany(
+            'UPDATE daily SET value = value + ? WHERE account = ? AND metric = ? AND day = ?',
+            [(delta, account, metric, day) for (day, metric), delta in deltas.items()])
+
+    def daily(self, account, metric, from_date=None, to_date=None):
+        """
+        :param metric: Count column of the reports ('impressions', 'engagements'...) or 'tweets'.
+        :param from_date (optional): date string in the format 'mm/dd/yyyy'
+        :param to_date (optional): date string in the format 'mm/dd/yyyy'
+        :return: List of (day as 'mm/dd/yyyy', value), for the days with tweets, in date order.
+        """
+        query, parameters = _range_query('SELECT day, value FROM daily', account, metric, from_date, to_date)
+        with self.lock:
+            rows = self.connection.execute(query + ' ORDER BY day', parameters).fetchall()
+        return [(from_iso(day), value) for day, value in rows]
+
+    def total(self, account, metric, from_date=None, to_date=None):
+        """
+        :return: Sum of a metric of an account over a date range (see daily), e.g. the impressions of a quarter.
+        """
+        query, parameters = _range_query('SELECT COALESCE(SUM(value), 0) FROM daily', account, metric, from_date,
+                                         to_date)
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchone()[0]
+
+    def metrics(self, account):
+        """
+        :return: Names of the metrics indexed for an account.
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT DISTINCT metric FROM daily WHERE account = ? ORDER BY metric',
+                                           (account.lower(),)).fetchall()
+        return [row[0] for row in rows]
+
+
+def file_hash(path):
+    """
+    :return: SHA-256 of the content of a file, read by chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as content:
+        for chunk in iter(lambda: content.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _range_query(select, account, metric, from_date, to_date):
+    query = select + ' WHERE account = ? AND metric = ?'
+    parameters = [account.lower(), metric]
+    if from_date is not None:
+        query += ' AND day >= ?'
+        parameters.append(to_iso(from_date))
+    if to_date is not None:
+        query += ' AND day <= ?'
+        parameters.append(to_iso(to_date))
+    return query, parameters
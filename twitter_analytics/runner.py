@@ -0,0 +1,144 @@
+import os
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+from twitter_analytics.retry import DownloadFailed
+
+
+class DownloadJob(namedtuple('DownloadJob', 'username password section from_date to_date options')):
+
+    """
+    One unit of work for the batch runner: a single account, a single section and an optional date range.
+    """
+
+    def __new__(cls, username, password, section='tweets', from_date=None, to_date=None, options=None):
+        """
+        :param username: Twitter username
+        :param password: Twitter password
+        :param section: 'tweets' or 'videos', or a list of both
+        :param from_date (optional): date string in the format 'mm/dd/yyyy'
+        :param to_date (optional): date string in the format 'mm/dd/yyyy'
+        :param options (optional): dict of extra keyword arguments given to ReportDownloader (proxy, show_browser...)
+        """
+        return super(DownloadJob, cls).__new__(cls, username, password, section, from_date, to_date,
+                                               dict(options or {}))
+
+    @classmethod
+    def coerce(cls, job):
+        """
+        Accept a DownloadJob, a dict of its fields or a tuple in the field order.
+        """
+        if isinstance(job, cls):
+            return job
+        if isinstance(job, dict):
+            return cls(**job)
+        return cls(*job)
+
+    def folder_name(self, index):
+        """
+        Name of the per-job download folder. The index keeps two identical jobs from sharing a folder.
+        """
+        if self.from_date is not None and self.to_date is not None:
+            period = '{}_{}'.format(_compact_date(self.from_date), _compact_date(self.to_date))
+        else:
+            period = 'last28days'
+        section = self.section if isinstance(self.section, str) else '-'.join(self.section)
+        return '{:04d}_{}_{}_{}'.format(index, self.username.lower(), section, period)
+
+
+JobResult = namedtuple('JobResult', 'username section from_date to_date download_folder reports error elapsed metrics',
+                       defaults=(None,))
+
+
+def _compact_date(date_string):
+    return datetime.strptime(date_string, '%m/%d/%Y').strftime('%Y%m%d')
+
+
+def run_job(job, download_folder):
+    """
+    Run a single job in the current process, with its own browser and virtual display.
+    Never raises: any failure is reported in the `error` field of the result, along with the reports downloaded
+    anyway when only some date ranges failed.
+
+    :param job: DownloadJob
+    :param download_folder: folder dedicated to this job
+    :return: JobResult
+    """
+    # Imported here so the worker processes only pay for Selenium when they actually run a job.
+    from twitter_analytics.downloader import ReportDownloader
+
+    started = time.time()
+    downloader = None
+    running = False
+    reports = []
+    error = None
+    try:
+        if not os.path.isdir(download_folder):
+            os.makedirs(download_folder)
+        downloader = ReportDownloader(
+            username=job.username,
+            password=job.password,
+            from_date=job.from_date,
+            to_date=job.to_date,
+            download_folder=download_folder,
+            section=job.section,
+            **job.options
+        )
+        running = True
+        reports = downloader.run()
+    except Exception as exception:
+        error = traceback.format_exc()
+        if isinstance(exception, DownloadFailed):
+            reports = exception.reports
+        if downloader is not None and not running:     # run() quits the browser itself
+            try:
+                downloader.quit()
+            except Exception:
+                pass
+    return JobResult(
+        username=job.username,
+        section=job.section,
+        from_date=job.from_date,
+        to_date=job.to_date,
+        download_folder=download_folder,
+        reports=reports,
+        error=error,
+        elapsed=time.time() - started,
+        metrics=downloader.metrics.report() if downloader is not None else None,
+    )
+
+
+def _run_job_star(args):
+    return run_job(*args)
+
+
+def run_many(jobs, workers=None, download_folder=None):
+    """
+    Spread jobs across a pool of worker processes. Each job runs in its own browser with its own download folder,
+    created under `download_folder`.
+
+    :param jobs: iterable of DownloadJob (or dicts / tuples accepted by DownloadJob.coerce)
+    :param workers: number of worker processes. Default is the number of cores.
+    :param download_folder: root folder for the per-job folders. Default is working directory.
+    :return: list of JobResult, in the same order as the jobs.
+    """
+    jobs = [DownloadJob.coerce(job) for job in jobs]
+    if not jobs:
+        return []
+
+    download_folder = download_folder or os.getcwd()
+    workers = min(workers or cpu_count(), len(jobs))
+    tasks = [(job, os.path.join(download_folder, job.folder_name(i))) for i, job in enumerate(jobs)]
+
+    if workers == 1:
+        return [run_job(*task) for task in tasks]
+
+    pool = Pool(processes=workers)
+    try:
+        return list(pool.imap(_run_job_star, tasks, chunksize=1))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,144 @@
+import json
+import os
+
+from twitter_analytics.retry import DownloadFailed
+
+
+class SessionStore(object):
+
+    """
+    Keeps a Chrome profile and a copy of the session cookies per account, so a new browser can reuse the session of
+    the previous run instead of logging in again.
+
+    Layout: <root>/<account>/profile (Chrome user data dir) and <root>/<account>/cookies.json
+    """
+
+    def __init__(self, root):
+        """
+        :param root: Folder holding the sessions of every account (created if missing).
+        """
+        self.root = root
+
+    def account_dir(self, account):
+        """
+        :return: Folder of the account, only readable by the current user since it holds the session cookies.
+        """
+        path = os.path.join(self.root, account.lower())
+        if not os.path.isdir(path):
+            os.makedirs(path, 0o700)
+        return path
+
+    def profile_dir(self, account):
+        """
+        :return: Chrome user data dir of the account, given to Chrome with --user-data-dir.
+        """
+        return os.path.join(self.account_dir(account), 'profile')
+
+    def cookies_path(self, account):
+        return os.path.join(self.account_dir(account), 'cookies.json')
+
+    def save_cookies(self, account, browser):
+        """
+        Save the cookies of the current page, merged with the ones saved before for other domains.
+        """
+        cookies = dict(((cookie.get('domain'), cookie['name']), cookie) for cookie in self.load_cookies(account))
+        for cookie in browser.get_cookies():
+            cookies[(cookie.get('domain'), cookie['name'])] = cookie
+        path = self.cookies_path(account)
+        # Created readable by the current user only: the cookies log in to the account
+        with os.fdopen(os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as cookies_file:
+            json.dump(list(cookies.values()), cookies_file)
+        os.replace(path + '.tmp', path)
+
+    def load_cookies(self, account):
+        """
+        :return: List of Selenium cookie dicts saved for the account (empty if none).
+        """
+        path = self.cookies_path(account)
+        if not os.path.exists(path):
+            return []
+        with open(path) as cookies_file:
+            return json.load(cookies_file)
+
+    def restore_cookies(self, account, browser):
+        """
+        Add the saved cookies matching the domain of the page currently loaded in the browser.
+        :return: Number of cookies added.
+        """
+        host = browser.current_url.split('/')[2] if '://' in browser.current_url else ''
+        added = 0
+        for cookie in self.load_cookies(account):
+            # '.twitter.com' cookies are shared with subdomains, 'twitter.com' ones are host-only
+            domain = cookie.get('domain', '')
+            if domain.startswith('.'):
+                if not (host == domain[1:] or host.endswith(domain)):
+                    continue
+            elif domain and host != domain:
+                continue
+            cookie = dict((key, value) for key, value in cookie.items() if key != 'sameSite')
+            if 'expiry' in cookie:
+                cookie['expiry'] = int(cookie['expiry'])
+            try:
+                browser.add_cookie(cookie)
+            except Exception:
+                continue
+            added += 1
+        return added
+
+    def clear(self, account):
+        """
+        Forget the saved cookies of an account (e.g. after its session was revoked).
+        """
+        path = self.cookies_path(account)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class WarmBrowser(object):
+
+    """
+    Long-lived logged-in browser running several report downloads in a row, without relaunching Chrome or logging in
+    again between them.
+
+    with WarmBrowser('username', 'password', session_dir='/data/sessions') as browser:
+        tweets = browser.run('tweets', from_date='01/01/2017', to_date='03/31/2017')
+        videos = browser.run('videos')
+    """
+
+    def __init__(self, username, password, session_dir=None, **options):
+        """
+        :param username: Twitter username
+        :param password: Twitter password
+        :param session_dir (optional): Folder where the session is persisted between processes (see SessionStore).
+        :param options: Other keyword arguments of ReportDownloader (download_folder, proxy, pacing...).
+        """
+        from twitter_analytics.downloader import ReportDownloader
+        self.downloader = ReportDownloader(username, password, session_dir=session_dir, **options)
+        self.started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, section='tweets', from_date=None, to_date=None, account=None):
+        """
+        Download the reports of a section, for a date range or the last 28 days, keeping the browser open afterwards.
+        :param account (optional): handle of an account managed by the logged-in user. Default is the username.
+        :return: List of pathnames of the reports. Raises DownloadFailed, with the other reports, when some date
+        ranges of this call were given up.
+        """
+        if not self.started:
+            self.downloader.start_session()
+            self.started = True
+        known_failures = len(self.downloader.failures)
+        reports = self.downloader.download(section=section, from_date=from_date, to_date=to_date,
+                                           account=account or self.downloader.username)
+        failures = self.downloader.failures[known_failures:]
+        if failures:
+            raise DownloadFailed(failures, reports)
+        return reports
+
+    def close(self):
+        self.downloader.quit()
@@ -1,5 +1,6 @@
 import random
 import time
+from datetime import date, datetime, timedelta
 
 
 def random_time_sleep(minim=4, maxim=9):
@@ -28,3 +29,29 @@ def random_small_time_sleep(minim=3, maxim=8):
     choices = [float(x) / 10 for x in range(minim, maxim)]
     return time.sleep(random.choice(choices))
 
+
+def report_filename(account, section, from_date, to_date):
+    """
+    Deterministic file name for a downloaded report.
+
+    :param account: Twitter username
+    :param section: 'tweets' or 'videos'
+    :param from_date: date string in the format 'mm/dd/yyyy'
+    :param to_date: date string in the format 'mm/dd/yyyy'
+    :return: File name such as 'username_tweets_20170101_20170131.csv'
+    """
+    return '{}_{}_{}_{}.csv'.format(
+        account.lower(),
+        section,
+        datetime.strptime(from_date, '%m/%d/%Y').strftime('%Y%m%d'),
+        datetime.strptime(to_date, '%m/%d/%Y').strftime('%Y%m%d'),
+    )
+
+
+def last_28_days():
+    """
+    Date range of the default 'Last 28 Days' period of twitter analytics.
+    :return: List of 2 items [0] = from and [1] = to, in the format 'mm/dd/yyyy'.
+    """
+    today = date.today()
+    return [(today - timedelta(days=28)).strftime('%m/%d/%Y'), (today - timedelta(days=1)).strftime('%m/%d/%Y')]
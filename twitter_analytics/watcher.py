@@ -0,0 +1,227 @@
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import sys
+import time
+from datetime import datetime
+
+
+# Chrome (and Firefox) write downloads under a temporary name and rename the file once it is complete.
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp', '.download')
+
+# Start of the file names of the exports of each section
+EXPORT_PREFIXES = {'tweets': 'tweet_activity_metrics', 'videos': 'video_activity_metrics'}
+
+# inotify(7) constants
+IN_CREATE = 0x00000100
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class DownloadTimeout(Exception):
+    """ Raised when no matching report is downloaded before the timeout. """
+
+
+def _load_inotify():
+    """
+    :return: libc handle exposing inotify_init1 and inotify_add_watch, or None if inotify is not available.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def report_matcher(account, from_date=None, to_date=None, section=None):
+    """
+    Build a predicate telling whether a downloaded file name is the report of an account (and date range).
+
+    Twitter names its exports like 'tweet_activity_metrics_<account>_<yyyymmdd>_<yyyymmdd>_en.csv' (videos:
+    'video_activity_metrics_...'). The account must be the whole token after the prefix, and when the name holds
+    dates, the first one must be the start of the expected range. Reports already renamed by a watcher (see
+    utils.report_filename) never match, so several watchers can share a folder.
+
+    :param account: Twitter username
+    :param from_date (optional): date string in the format 'mm/dd/yyyy'
+    :param to_date (optional): date string in the format 'mm/dd/yyyy'
+    :param section (optional): 'tweets' or 'videos'. Default matches the exports of both sections.
+    :return: Function taking a file name and returning a boolean.
+    """
+    prefixes = [EXPORT_PREFIXES[section]] if section is not None else list(EXPORT_PREFIXES.values())
+    pattern = re.compile(r'^(?:{})_{}(?:_(\d{{8}})_\d{{8}})?(?:_[a-z-]+)?(?: \(\d+\))?\.csv$'.format(
+        '|'.join(prefixes), re.escape(account.lower())))
+    start = datetime.strptime(from_date, '%m/%d/%Y').strftime('%Y%m%d') if from_date else None
+
+    def match(name):
+        found = pattern.match(name.lower())
+        if found is None:
+            return False
+        return start is None or found.group(1) is None or found.group(1) == start
+    return match
+
+
+class DownloadWatcher(object):
+
+    """
+    Watch a download folder and return the new report as soon as the browser finishes writing it.
+
+    Uses inotify where available (Linux) and falls back to polling the folder. Files already present when the
+    watcher takes its snapshot are never returned, and partial downloads are ignored until they are renamed.
+    """
+
+    def __init__(self, folder, timeout=300, poll_frequency=1.0, use_inotify=True):
+        """
+        :param folder: Download folder to watch.
+        :param timeout: Default maximum secs to wait for a download.
+        :param poll_frequency: Secs between two scans of the folder without inotify. With inotify, maximum secs
+        between two calls of the `on_idle` callback while no file event arrives.
+        :param use_inotify: Set to False to force the polling fallback.
+        """
+        self.folder = folder
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.known = set()
+        self.fd = None
+
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                mask = IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO
+                if libc.inotify_add_watch(fd, os.fsencode(folder), mask) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        self.snapshot()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def uses_inotify(self):
+        return self.fd is not None
+
+    def snapshot(self):
+        """
+        Remember the files currently in the folder, so only files created afterwards are returned.
+        """
+        self.known = set(os.listdir(self.folder))
+
+    def finished_files(self):
+        """
+        :return: Names of the complete files which appeared since the last snapshot (folders are left out).
+        """
+        return sorted(name for name in os.listdir(self.folder)
+                      if name not in self.known and not name.endswith(PARTIAL_SUFFIXES) and not name.startswith('.')
+                      and os.path.isfile(os.path.join(self.folder, name)))
+
+    def wait_for_file(self, match=None, rename_to=None, timeout=None, on_idle=None):
+        """
+        Block until a new complete file matching `match` appears in the folder.
+
+        :param match (optional): Predicate on the file name. Default accepts any new file.
+        :param rename_to (optional): New file name for the report, possibly in a subfolder of the watched folder
+        (created if needed). The rename is atomic, so when several watchers
+        share a folder only one of them gets the file.
+        :param timeout (optional): Maximum secs to wait. Default is the timeout of the watcher.
+        :param on_idle (optional): Callback called every time the watcher wakes up without finding the report (e.g.
+        to re-click the export button after a server error).
+        :return: Pathname of the report.
+        """
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            path = self.claim_file(match, rename_to)
+            if path is not None:
+                return path
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise DownloadTimeout('No report downloaded in {} after {} secs'.format(
+                    self.folder, self.timeout if timeout is None else timeout))
+            if on_idle is not None:
+                on_idle()
+            self.wait_for_event(min(remaining, self.poll_frequency))
+
+    def claim_file(self, match=None, rename_to=None):
+        """
+        Non-blocking check for the report: see wait_for_file.
+        :return: Pathname of the report, or None if it is not downloaded yet.
+        """
+        for name in self.finished_files():
+            self.known.add(name)
+            if match is not None and not match(name):
+                continue
+            path = self._take(name, rename_to)
+            if path is not None:
+                return path
+        return None
+
+    def claim_any(self, expected):
+        """
+        Non-blocking check for several reports downloaded in the same folder at once (e.g. by several tabs). Each new
+        file goes to the first expectation it matches; files matching none of them are ignored from then on.
+
+        :param expected: dict of key -> tuple (predicate on the file name, rename_to or None)
+        :return: dict of key -> pathname, for the reports which arrived.
+        """
+        claimed = dict()
+        for name in self.finished_files():
+            self.known.add(name)
+            for key, (match, rename_to) in expected.items():
+                if key not in claimed and match(name):
+                    path = self._take(name, rename_to)
+                    if path is not None:
+                        claimed[key] = path
+                    break
+        return claimed
+
+    def _take(self, name, rename_to):
+        path = os.path.join(self.folder, name)
+        if rename_to is None:
+            return path
+        target = os.path.join(self.folder, rename_to)
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            return None         # claimed by another watcher of the same folder
+        self.known.add(os.path.normpath(rename_to).split(os.sep)[0])
+        return target
+
+    def drain_events(self):
+        """
+        Discard the pending inotify events: they only tell the folder changed, which is scanned again anyway.
+        """
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait_for_event(self, seconds):
+        """
+        Sleep until something happens in the folder (with inotify) or for `seconds`.
+        """
+        if self.fd is None:
+            time.sleep(seconds)
+            return
+        readable, _, _ = select.select([self.fd], [], [], seconds)
+        if readable:
+            self.drain_events()
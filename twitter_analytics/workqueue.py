@@ -0,0 +1,535 @@
+"""
+Durable queue of downloads shared by workers on several machines.
+
+A coordinator expands download jobs into one queued job per (account, section, planned date range). Workers lease
+the queued jobs one at a time, renew their lease while the browser downloads, and publish the reports under a shared
+output root ('<output root>/<account>/<section>/'). A job whose lease expires (dead or stuck worker) goes back to the
+queue, and is given up after `max_attempts` leases.
+
+The queue lives in a SQLite file (SQLiteQueue) or in a JSON file guarded by a file lock (FileQueue), on a file system
+every host can lock (local disk for a single host, NFSv4 or SMB otherwise). Other stores implement JobQueue.
+
+Passwords are never written to the queue: every worker is given the credentials of the logins it may use.
+"""
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from datetime import date
+
+from twitter_analytics.dateranges import is_final, parse_date, parse_iso
+from twitter_analytics.planner import MAX_WINDOW_DAYS, RangePlanner
+from twitter_analytics.runner import DownloadJob, run_job
+
+# States of a queued job
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+QueuedJob = namedtuple('QueuedJob', 'job_id username account section from_date to_date options attempts')
+
+
+def job_key(account, section, from_date, to_date):
+    """
+    Identity of a queued job: the same window enqueued again by the next run of the coordinator is the same job.
+    """
+    return '/'.join([account, section, from_date or '-', to_date or '-'])
+
+
+class JobQueue(ABC):
+
+    """
+    Interface of the queue backends: a backend missing a method can't be instantiated. A job moves from 'pending' to
+    'leased' (lease), then to 'done' (complete), or back to 'pending' (fail, or lease expired) until it has been leased
+    `max_attempts` times, then to 'failed'.
+    """
+
+    @abstractmethod
+    def put(self, items, max_attempts=3):
+        """
+        Add jobs to the queue. A job already pending or leased is left as it is; a job done or failed is queued again.
+
+        :param items: List of dicts with the keys username, account, section, from_date, to_date, options.
+        :param max_attempts: Number of leases of a job before it is given up.
+        :return: Number of jobs queued.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def lease(self, worker, seconds):
+        """
+        Take the oldest pending job for `seconds`, after putting the jobs whose lease expired back in the queue.
+        :return: QueuedJob, or None if no job is pending.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew(self, job_id, worker, seconds):
+        """
+        Extend the lease of a job by `seconds` from now.
+        :return: Boolean: False if the worker doesn't hold the lease any more.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, job_id, worker, result):
+        """
+        Mark a leased job done.
+        :param result: JSON serialisable summary of the job (reports, elapsed...).
+        :return: Boolean: False if the worker doesn't hold the lease any more.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, job_id, worker, error):
+        """
+        Give a leased job back to the queue after an error, or give it up after its last attempt.
+        :return: Boolean: False if the worker doesn't hold the lease any more.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def counts(self):
+        """
+        :return: dict state -> number of jobs.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def completed(self, account, section):
+        """
+        :return: List of (from_date, to_date, completed_on) of the done jobs with a date range, dates 'mm/dd/yyyy'.
+        """
+        raise NotImplementedError
+
+
+class SQLiteQueue(JobQueue):
+
+    """
+    Queue in a SQLite file. Every change runs in an immediate transaction, so concurrent workers never lease the same
+    job.
+    """
+
+    def __init__(self, path, clock=time.time, timeout=30):
+        """
+        :param path: Pathname of the SQLite file (created if missing).
+        :param clock: Function returning the current time in secs.
+        :param timeout: Secs to wait for the lock of another worker.
+        """
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, username TEXT NOT NULL,'
+            ' account TEXT NOT NULL, section TEXT NOT NULL, from_date TEXT, to_date TEXT, options TEXT NOT NULL,'
+            ' state TEXT NOT NULL, worker TEXT, lease_until REAL, attempts INTEGER NOT NULL,'
+            ' max_attempts INTEGER NOT NULL, result TEXT, error TEXT, completed_on TEXT)'
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def _execute(self, *statements):
+        """
+        Run (query, parameters) statements in one immediate transaction.
+        :return: Cursor of the last statement.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                for query, parameters in statements:
+                    cursor = self.connection.execute(query, parameters)
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+        return cursor
+
+    def put(self, items, max_attempts=3):
+        statements = list()
+        for item in items:
+            key = job_key(item['account'], item['section'], item['from_date'], item['to_date'])
+            options = json.dumps(item['options'], sort_keys=True)
+            # reset a finished job, else add it (no upsert: ON CONFLICT ... DO UPDATE needs SQLite 3.24)
+            statements.append((
+                'UPDATE jobs SET state = ?, username = ?, options = ?, attempts = 0, max_attempts = ?, worker = NULL,'
+                ' lease_until = NULL, result = NULL, error = NULL WHERE key = ? AND state IN (?, ?)',
+                (PENDING, item['username'], options, max_attempts, key, DONE, FAILED)))
+            statements.append((
+                'INSERT OR IGNORE INTO jobs (key, username, account, section, from_date, to_date, options, state,'
+                ' attempts, max_attempts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)',
+                (key, item['username'], item['account'], item['section'], item['from_date'], item['to_date'],
+                 options, PENDING, max_attempts)))
+        if not statements:
+            return 0
+        before = self.connection.total_changes
+        self._execute(*statements)
+        return self.connection.total_changes - before
+
+    def lease(self, worker, seconds):
+        now = self.clock()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.execute(
+                    "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, worker = NULL,"
+                    " lease_until = NULL, error = 'lease expired' WHERE state = ? AND lease_until < ?",
+                    (FAILED, PENDING, LEASED, now))
+                row = self.connection.execute(
+                    'SELECT id, username, account, section, from_date, to_date, options, attempts FROM jobs '
+                    'WHERE state = ? ORDER BY id LIMIT 1', (PENDING,)).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        'UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?',
+                        (LEASED, worker, now + seconds, row[0]))
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+        if row is None:
+            return None
+        return QueuedJob(row[0], row[1], row[2], row[3], row[4], row[5], json.loads(row[6]), row[7] + 1)
+
+    def renew(self, job_id, worker, seconds):
+        return self._execute((
+            'UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = ?',
+            (self.clock() + seconds, job_id, worker, LEASED))).rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        return self._execute((
+            'UPDATE jobs SET state = ?, result = ?, completed_on = ?, lease_until = NULL '
+            'WHERE id = ? AND worker = ? AND state = ?',
+            (DONE, json.dumps(result, sort_keys=True), _today(self.clock), job_id, worker, LEASED))).rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        return self._execute((
+            'UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, error = ?, worker = NULL,'
+            ' lease_until = NULL WHERE id = ? AND worker = ? AND state = ?',
+            (FAILED, PENDING, error, job_id, worker, LEASED))).rowcount == 1
+
+    def counts(self):
+        with self.lock:
+            return dict(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def completed(self, account, section):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT from_date, to_date, completed_on FROM jobs WHERE account = ? AND section = ? AND state = ? '
+                'AND from_date IS NOT NULL ORDER BY id', (account, section, DONE)).fetchall()
+
+
+class FileQueue(JobQueue):
+
+    """
+    Queue in a JSON file, read and rewritten under an exclusive lock (fcntl.flock) of a lock file next to it. Meant
+    for small queues (a nightly pull) on a shared folder where SQLite locking isn't reliable. Unix only.
+    """
+
+    def __init__(self, folder, clock=time.time):
+        """
+        :param folder: Folder of the queue file and its lock file (created if missing).
+        :param clock: Function returning the current time in secs.
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.path = os.path.join(folder, 'queue.json')
+        self.lock_path = os.path.join(folder, 'queue.lock')
+        self.clock = clock
+
+    def _update(self, change):
+        """
+        Apply change(jobs) to the list of jobs under the lock, and save it when it returns (result, True).
+        :return: result
+        """
+        import fcntl
+
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                jobs = list()
+                if os.path.exists(self.path):
+                    with open(self.path) as queue_file:
+                        jobs = json.load(queue_file)
+                result, changed = change(jobs)
+                if changed:
+                    temporary = self.path + '.tmp'
+                    with open(temporary, 'w') as queue_file:
+                        json.dump(jobs, queue_file, indent=1, sort_keys=True)
+                        queue_file.flush()
+                        os.fsync(queue_file.fileno())
+                    os.replace(temporary, self.path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put(self, items, max_attempts=3):
+        def change(jobs):
+            by_key = dict((job['key'], job) for job in jobs)
+            queued = 0
+            for item in items:
+                key = job_key(item['account'], item['section'], item['from_date'], item['to_date'])
+                job = by_key.get(key)
+                if job is not None and job['state'] in (PENDING, LEASED):
+                    continue
+                if job is None:
+                    job = {'id': len(jobs) + 1, 'key': key, 'completed_on': None}
+                    jobs.append(job)
+                    by_key[key] = job
+                job.update(item, state=PENDING, attempts=0, max_attempts=max_attempts, worker=None,
+                           lease_until=None, result=None, error=None)
+                queued += 1
+            return queued, queued > 0
+        return self._update(change)
+
+    def lease(self, worker, seconds):
+        now = self.clock()
+
+        def change(jobs):
+            leased = None
+            for job in jobs:
+                if job['state'] == LEASED and job['lease_until'] < now:
+                    job.update(state=FAILED if job['attempts'] >= job['max_attempts'] else PENDING, worker=None,
+                               lease_until=None, error='lease expired')
+                if leased is None and job['state'] == PENDING:
+                    job.update(state=LEASED, worker=worker, lease_until=now + seconds, attempts=job['attempts'] + 1)
+                    leased = QueuedJob(job['id'], job['username'], job['account'], job['section'], job['from_date'],
+                                       job['to_date'], job['options'], job['attempts'])
+            return leased, True
+        return self._update(change)
+
+    def _held(self, job_id, worker, update):
+        def change(jobs):
+            for job in jobs:
+                if job['id'] == job_id and job['worker'] == worker and job['state'] == LEASED:
+                    update(job)
+                    return True, True
+            return False, False
+        return self._update(change)
+
+    def renew(self, job_id, worker, seconds):
+        return self._held(job_id, worker, lambda job: job.update(lease_until=self.clock() + seconds))
+
+    def complete(self, job_id, worker, result):
+        return self._held(job_id, worker, lambda job: job.update(
+            state=DONE, result=result, completed_on=_today(self.clock), lease_until=None))
+
+    def fail(self, job_id, worker, error):
+        return self._held(job_id, worker, lambda job: job.update(
+            state=FAILED if job['attempts'] >= job['max_attempts'] else PENDING, error=error, worker=None,
+            lease_until=None))
+
+    def counts(self):
+        def change(jobs):
+            counts = dict()
+            for job in jobs:
+                counts[job['state']] = counts.get(job['state'], 0) + 1
+            return counts, False
+        return self._update(change)
+
+    def completed(self, account, section):
+        return self._update(lambda jobs: ([
+            (job['from_date'], job['to_date'], job['completed_on']) for job in jobs
+            if job['account'] == account and job['section'] == section and job['state'] == DONE and job['from_date']
+        ], False))
+
+
+class Coordinator(object):
+
+    """
+    Expand download jobs into queued jobs, one per (account, section, planned date range).
+
+    coordinator = Coordinator(SQLiteQueue('/shared/queue.sqlite'), planner='largest')
+    coordinator.enqueue([DownloadJob('agency', None, ['tweets', 'videos'], '01/01/2017', '12/31/2017',
+                                     options={'accounts': ['agency', 'client']})])
+    """
+
+    def __init__(self, queue, planner=None, max_attempts=3):
+        """
+        :param queue: JobQueue
+        :param planner (optional): twitter_analytics.planner.RangePlanner or policy name. Default is calendar months.
+        :param max_attempts: Number of leases of a job before it is given up.
+        """
+        self.queue = queue
+        self.planner = planner if isinstance(planner, RangePlanner) else RangePlanner(planner or 'months')
+        self.max_attempts = max_attempts
+
+    def expand(self, job):
+        """
+        :param job: DownloadJob (or dict / tuple accepted by DownloadJob.coerce). Its password isn't used, and its
+        options must be JSON serialisable.
+        :return: List of items for JobQueue.put, skipping the windows completed once they stopped changing.
+        """
+        job = DownloadJob.coerce(job)
+        options = dict(job.options)
+        accounts = [account.lower() for account in options.pop('accounts', None) or [job.username]]
+        sections = [job.section] if isinstance(job.section, str) else list(job.section)
+        items = list()
+        for account in accounts:
+            for section in sections:
+                if job.from_date is None or job.to_date is None:
+                    ranges = [[None, None]]
+                else:
+                    ranges = self.planner.plan(job.from_date, job.to_date,
+                                               covered=self.final_windows(account, section)).ranges()
+                for from_date, to_date in ranges:
+                    items.append({'username': job.username.lower(), 'account': account, 'section': section,
+                                  'from_date': from_date, 'to_date': to_date, 'options': options})
+        return items
+
+    def enqueue(self, jobs):
+        """
+        :return: Number of jobs queued.
+        """
+        return self.queue.put([item for job in jobs for item in self.expand(job)], self.max_attempts)
+
+    def final_windows(self, account, section):
+        """
+        Windows completed once they stopped changing (see dateranges.is_final), like SyncManifest.final_windows.
+        """
+        return [[from_date, to_date] for from_date, to_date, completed_on in self.queue.completed(account, section)
+                if is_final(parse_date(to_date), parse_iso(completed_on), self.planner.refresh_days)]
+
+
+class LeaseKeeper(object):
+
+    """
+    Context manager renewing the lease of a job from a background thread while the job runs.
+    """
+
+    def __init__(self, queue, job_id, worker, seconds):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.seconds = seconds
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._renew, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _renew(self):
+        while not self.stopped.wait(self.seconds / 3.0):
+            if not self.queue.renew(self.job_id, self.worker, self.seconds):
+                self.lost = True
+                return
+
+
+class Worker(object):
+
+    """
+    Lease queued jobs and run them one after the other, each in its own browser.
+
+    worker = Worker(SQLiteQueue('/shared/queue.sqlite'), '/shared/reports', {'agency': '<password>'},
+                    options={'headless': True, 'pacing': 'fast'})
+    results = worker.run()
+    """
+
+    def __init__(self, queue, output_root, credentials, worker_id=None, lease_seconds=600, work_folder=None,
+                 options=None):
+        """
+        :param queue: JobQueue
+        :param output_root: Shared folder where the reports are published, under '<account>/<section>/'.
+        :param credentials: dict login -> password, or function login -> password.
+        :param worker_id (optional): Name of the worker in the queue. Default is '<host name>-<process id>'.
+        :param lease_seconds: Duration of a lease, renewed every third of it while the job runs.
+        :param work_folder (optional): Local folder of the browser downloads. Default is the temporary folder.
+        :param options (optional): dict of extra keyword arguments given to ReportDownloader (headless, pacing...).
+        """
+        self.queue = queue
+        self.output_root = output_root
+        self.credentials = credentials
+        self.worker_id = worker_id or '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.lease_seconds = lease_seconds
+        self.work_folder = work_folder
+        self.options = dict(options or {})
+
+    def password(self, username):
+        if callable(self.credentials):
+            return self.credentials(username)
+        return self.credentials[username]
+
+    def run(self, max_jobs=None, wait=False, poll_interval=30):
+        """
+        :param max_jobs (optional): Stop after this number of jobs.
+        :param wait: Keep polling the queue when it is empty instead of returning.
+        :param poll_interval: Secs between two polls of an empty queue.
+        :return: List of JobResult of the jobs run.
+        """
+        results = list()
+        while max_jobs is None or len(results) < max_jobs:
+            queued = self.queue.lease(self.worker_id, self.lease_seconds)
+            if queued is None:
+                if not wait:
+                    break
+                time.sleep(poll_interval)
+                continue
+            results.append(self.run_one(queued))
+        return results
+
+    def run_one(self, queued):
+        """
+        Download a leased job in a local folder, publish its reports under the output root, then complete (or fail)
+        the job in the queue.
+        :return: JobResult, with the published reports.
+        """
+        folder = tempfile.mkdtemp(prefix='twitter_analytics_', dir=self.work_folder)
+        options = dict(self.options)
+        options.update(queued.options)
+        options['accounts'] = [queued.account]
+        if queued.from_date is not None:
+            # the coordinator planned the range: download it as a single export
+            days = (parse_date(queued.to_date) - parse_date(queued.from_date)).days + 1
+            options['planner'] = min(days, MAX_WINDOW_DAYS)
+        job = DownloadJob(queued.username, self.password(queued.username), queued.section, queued.from_date,
+                          queued.to_date, options)
+        try:
+            with LeaseKeeper(self.queue, queued.job_id, self.worker_id, self.lease_seconds) as keeper:
+                result = run_job(job, folder)
+                target = os.path.join(self.output_root, queued.account, queued.section)
+                result = result._replace(download_folder=target,
+                                         reports=[self.publish(path, target) for path in result.reports])
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        if keeper.lost:
+            error = 'lease lost by {}'.format(self.worker_id)
+            return result._replace(error=result.error or error)
+        if result.error is None:
+            self.queue.complete(queued.job_id, self.worker_id, {'reports': result.reports, 'elapsed': result.elapsed})
+        else:
+            self.queue.fail(queued.job_id, self.worker_id, result.error)
+        return result
+
+    @staticmethod
+    def publish(path, folder):
+        """
+        Copy a report to a folder of the output root under a temporary name, then rename it, so readers of the shared
+        folder never see a partial report.
+        :return: Pathname of the published report.
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        target = os.path.join(folder, os.path.basename(path))
+        temporary = '{}.{}.tmp'.format(target, os.getpid())
+        shutil.copyfile(path, temporary)
+        os.replace(temporary, target)
+        return target
+
+
+def _today(clock):
+    return date.fromtimestamp(clock()).isoformat()